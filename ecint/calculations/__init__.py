@@ -0,0 +1,4 @@
+from ecint.calculations.dpmd import DPPackCalculation
+from ecint.calculations.lammps import LammpsPackCalculation
+
+__all__ = ['DPPackCalculation', 'LammpsPackCalculation']
@@ -0,0 +1,107 @@
+import json
+import os
+import shlex
+
+from aiida.orm import Dict, Int, SinglefileData, Str
+
+from ecint.calculations.pack import get_pack_script, PackCalculation
+
+__all__ = ['DPPackCalculation', 'get_pack_train_script']
+
+INPUT_NAME = 'input.json'
+MODEL_NAME = 'model.pb'
+LCURVE_NAME = 'lcurve.out'
+LOG_NAME = 'train.log'
+INIT_MODEL_NAME = 'init_model.pb'
+
+
+def get_pack_train_script(members, ngpu=1, dp_command='dp',
+                          init_members=()):
+    """Script to train and freeze models of members concurrently
+
+    Every member runs `dp train` and `dp freeze` in its own directory in
+    background, members are assigned to visible GPUs in turn, so there are
+    several members on one GPU if members are more than GPUs
+
+    Args:
+        members (list): directory of each member, contains `input.json`
+        ngpu (int): number of GPUs, used if `CUDA_VISIBLE_DEVICES` is not
+            set by scheduler
+        dp_command (str): command of deepmd-kit
+        init_members (list): members initialised from `init_model.pb` in
+            their directories by `dp train --init-frz-model`,
+            deepmd-kit >= 2.1 is required
+
+    Returns:
+        str: content of bash script, see `get_pack_script`
+
+    """
+    commands = []
+    for member in members:
+        init = (f'--init-frz-model {INIT_MODEL_NAME} '
+                if member in init_members else '')
+        commands.append(f'cd {shlex.quote(member)} && '
+                        f'{{ $dp train {init}{INPUT_NAME} && '
+                        f'$dp freeze -o {MODEL_NAME}; }} > {LOG_NAME} 2>&1')
+    return get_pack_script(commands, ngpu,
+                           header=[f'dp={shlex.quote(dp_command)}'])
+
+
+class DPPackCalculation(PackCalculation):
+    """Train several deepmd models in one job
+
+    Use a shell code (e.g. bash) as `code`, deepmd-kit is called by
+    `dp_command` in the generated script. Each member in namespace
+    `parameters` is trained in directory with the same name, and
+    `member/model.pb`, `member/lcurve.out` are retrieved. Members in
+    namespace `init_models` are initialised from their frozen models
+    """
+    SCRIPT_NAME = 'pack_train.sh'
+    STDOUT_NAME = 'pack_train.log'
+
+    @classmethod
+    def define(cls, spec):
+        super(DPPackCalculation, cls).define(spec)
+        # {member: input parameters of deepmd}
+        spec.input_namespace('parameters', valid_type=Dict, dynamic=True)
+        spec.input('datadirs', valid_type=list, non_db=True)
+        # {member: frozen model to initialise training from}
+        spec.input_namespace('init_models', valid_type=SinglefileData,
+                             dynamic=True, required=False)
+        spec.input('ngpu', default=lambda: Int(1),
+                   valid_type=Int, required=False)
+        spec.input('dp_command', default=lambda: Str('dp'),
+                   valid_type=Str, required=False)
+        spec.inputs['metadata']['options']['parser_name'].default = \
+            'ecint.dp_pack'
+
+        spec.exit_code(300, 'ERROR_MEMBER_FAILED',
+                       message='Some members are not trained or frozen')
+
+    def prepare_for_submission(self, folder):
+        members = sorted(self.inputs.parameters)
+        init_models = self.inputs.get('init_models', {})
+        # datadirs are shared by members
+        for datadir in self.inputs.datadirs:
+            datadir = os.path.abspath(datadir)
+            folder.insert_path(datadir, os.path.basename(datadir))
+        for member in members:
+            parameters = self.inputs.parameters[member].get_dict()
+            parameters['training']['systems'] = [
+                os.path.join('..', system)
+                for system in parameters['training']['systems']]
+            member_folder = folder.get_subfolder(member, create=True)
+            with member_folder.open(INPUT_NAME, 'w') as f:
+                json.dump(parameters, f, indent=2)
+        with folder.open(self.SCRIPT_NAME, 'w') as f:
+            f.write(get_pack_train_script(members, self.inputs.ngpu.value,
+                                          self.inputs.dp_command.value,
+                                          sorted(init_models)))
+        # models are copied from repository, not loaded in memory
+        local_copy_list = [
+            (model.uuid, model.filename, f'{member}/{INIT_MODEL_NAME}')
+            for member, model in init_models.items()]
+        # keep `member/` in retrieved
+        retrieve_list = [(f'*/{filename}', '.', 2) for filename in
+                         [MODEL_NAME, LCURVE_NAME, LOG_NAME]]
+        return self.get_calcinfo(local_copy_list, retrieve_list)
@@ -0,0 +1,167 @@
+import shlex
+from itertools import product
+
+from aiida.orm import Dict, Int, SinglefileData, Str, StructureData
+from ase import Atoms
+from ase.io import read, write
+
+from ecint.calculations.pack import get_pack_script, PackCalculation
+
+__all__ = ['LammpsPackCalculation', 'get_conditions',
+           'get_pack_lammps_script', 'render_lammps_input']
+
+INPUT_NAME = 'input.in'
+STRUCTURE_NAME = 'input.data'
+LOG_NAME = 'lammps.out'
+# line in stdout of script, parsed by LammpsPackParser
+FAILED_TASK_MARK = 'failed task:'
+
+
+def get_conditions(variables):
+    """Conditions of lammps tasks, product of values of variables
+
+    Order of conditions follows order of `variables`, task
+    `c + s * len(conditions)` runs structure `s` under condition `c`
+
+    Args:
+        variables (dict): {name: [values]}
+
+    Returns:
+        list[dict]: {name: value} of each condition
+
+    """
+    return [dict(zip(variables.keys(), v))
+            for v in product(*variables.values())]
+
+
+def render_lammps_input(template, condition):
+    """Define variables of condition before lammps template
+
+    Args:
+        template (str): content of lammps input, use variables like ${TEMP}
+        condition (dict): {name: value} of variables
+
+    Returns:
+        str: content of lammps input
+
+    """
+    lines = []
+    for name, value in condition.items():
+        value = str(value)
+        # quote value with spaces, e.g. graphs of pair_style deepmd
+        if (not value) or any(c.isspace() for c in value):
+            value = f'"{value}"'
+        lines.append(f'variable        {name} string {value}')
+    return '\n'.join(lines + [template])
+
+
+def get_pack_lammps_script(tasks, ngpu=1, parallelism=1, lmp_command='lmp'):
+    """Script to run lammps tasks concurrently, `parallelism` tasks per GPU
+
+    `ngpu * parallelism` workers run in background, each worker is pinned
+    to one GPU and runs its share of tasks one by one
+
+    Args:
+        tasks (list): directory of each task, contains `input.in`
+        ngpu (int): number of GPUs, used if `CUDA_VISIBLE_DEVICES` is not
+            set by scheduler
+        parallelism (int): number of tasks run on one GPU at the same time
+        lmp_command (str): command of lammps
+
+    Returns:
+        str: content of bash script, see `get_pack_script`,
+            failed tasks are also printed to stdout
+
+    """
+    nworkers = max(1, min(ngpu * parallelism, len(tasks)))
+    header = [f'lmp={shlex.quote(lmp_command)}',
+              'run_task() {',
+              f'    (cd "$1" && $lmp -in {INPUT_NAME} > {LOG_NAME} 2>&1)',
+              '}']
+    commands = []
+    for worker in range(nworkers):
+        worker_tasks = ' '.join(shlex.quote(task)
+                                for task in tasks[worker::nworkers])
+        commands.append(f'status=0; for task in {worker_tasks}; do '
+                        f'run_task "$task" || '
+                        f'{{ echo "{FAILED_TASK_MARK} $task"; status=1; }}; '
+                        f'done; exit $status')
+    return get_pack_script(commands, ngpu, header=header)
+
+
+class LammpsPackCalculation(PackCalculation):
+    """Run lammps of structures x conditions concurrently in one job
+
+    Task directories are the same as BatchTemplateCalculation, the task of
+    structure `s` and condition `c` is in directory `c + s * n_c`, and files
+    are copied to the parent directory of tasks. Use a shell code (e.g. bash)
+    as `code`, lammps is called by `lmp_command` in the generated script
+    """
+    SCRIPT_NAME = 'pack_lammps.sh'
+    STDOUT_NAME = 'pack_lammps.log'
+
+    @classmethod
+    def define(cls, spec):
+        super(LammpsPackCalculation, cls).define(spec)
+        spec.input('structures', valid_type=list, non_db=True)
+        spec.input('kinds', valid_type=list, non_db=True)
+        spec.input('template', valid_type=Str)
+        # {name: [values]}, conditions are product of values
+        spec.input('variables', valid_type=Dict)
+        spec.input_namespace('file', valid_type=SinglefileData,
+                             required=False, dynamic=True)
+        spec.input('settings', valid_type=Dict, required=False)
+        spec.input('ngpu', default=lambda: Int(1),
+                   valid_type=Int, required=False)
+        spec.input('parallelism', default=lambda: Int(1),
+                   valid_type=Int, required=False)
+        spec.input('lmp_command', default=lambda: Str('lmp'),
+                   valid_type=Str, required=False)
+        spec.inputs['metadata']['options']['parser_name'].default = \
+            'ecint.lammps_pack'
+
+        spec.exit_code(300, 'ERROR_TASK_FAILED',
+                       message='Some lammps tasks failed')
+        spec.exit_code(310, 'ERROR_INTERRUPTED',
+                       message='Job is stopped before all tasks finished, '
+                               'e.g. out of walltime')
+
+    def get_atoms(self, structure):
+        if isinstance(structure, StructureData):
+            return structure.get_ase()
+        elif isinstance(structure, Atoms):
+            return structure
+        return read(structure)
+
+    def prepare_for_submission(self, folder):
+        conditions = get_conditions(self.inputs.variables.get_dict())
+        template = self.inputs.template.value
+        local_copy_list = []
+        for name, singlefile in self.inputs.get('file', {}).items():
+            local_copy_list.append((singlefile.uuid, singlefile.filename,
+                                    f'{name}.pb'))
+        tasks = []
+        for s, structure in enumerate(self.inputs.structures):
+            atoms = self.get_atoms(structure)
+            for c, condition in enumerate(conditions):
+                task = str(c + s * len(conditions))
+                task_folder = folder.get_subfolder(task, create=True)
+                with task_folder.open(STRUCTURE_NAME, 'w') as f:
+                    # Masses section is required by `atom_style atomic`
+                    write(f, atoms, format='lammps-data',
+                          specorder=self.inputs.kinds, atom_style='atomic',
+                          masses=True)
+                with task_folder.open(INPUT_NAME, 'w') as f:
+                    f.write(render_lammps_input(template, condition))
+                tasks.append(task)
+        with folder.open(self.SCRIPT_NAME, 'w') as f:
+            f.write(get_pack_lammps_script(tasks, self.inputs.ngpu.value,
+                                           self.inputs.parallelism.value,
+                                           self.inputs.lmp_command.value))
+
+        settings = (self.inputs.settings.get_dict()
+                    if 'settings' in self.inputs else {})
+        # keep relative path, e.g. `0/model_devi.out`
+        retrieve_list = [(pattern, '.', pattern.count('/') + 1) for pattern
+                         in settings.get('additional_retrieve_list', [])]
+        return self.get_calcinfo(local_copy_list, retrieve_list)
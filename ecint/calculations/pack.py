@@ -0,0 +1,83 @@
+from aiida.common.datastructures import CalcInfo, CodeInfo
+from aiida.engine import CalcJob
+
+__all__ = ['PackCalculation', 'get_pack_script']
+
+# last line in stdout of pack script
+EXIT_STATUS_MARK = 'exit status:'
+
+
+def get_pack_script(commands, ngpu=1, header=()):
+    """Script to run commands concurrently in background
+
+    Command `i` runs in a subshell with `CUDA_VISIBLE_DEVICES` set to
+    visible GPU `i` in turn, so there are several commands on one GPU if
+    commands are more than GPUs. The script waits for all commands
+
+    Args:
+        commands (list[str]): shell commands
+        ngpu (int): number of GPUs, used if `CUDA_VISIBLE_DEVICES` is not
+            set by scheduler
+        header (list[str]): lines before commands, e.g. variables
+
+    Returns:
+        str: content of bash script, exit with 1 if any command failed,
+            the exit status is printed to stdout at last
+
+    """
+    lines = ['#!/bin/bash', *header,
+             f'IFS=, read -r -a gpus <<< '
+             f'"${{CUDA_VISIBLE_DEVICES:-$(seq -s , 0 {ngpu - 1})}}"']
+    if len(commands) > ngpu:
+        # commands sharing one GPU must not allocate all memory of it
+        lines.append('export TF_FORCE_GPU_ALLOW_GROWTH=true')
+    lines.append('pids=()')
+    for i, command in enumerate(commands):
+        lines.append(
+            f'(export CUDA_VISIBLE_DEVICES=${{gpus[{i} % ${{#gpus[@]}}]}}; '
+            f'{command}) &')
+        lines.append('pids+=($!)')
+    lines.extend(['status=0',
+                  'for pid in "${pids[@]}"; do wait "$pid" || status=1; done',
+                  f'echo "{EXIT_STATUS_MARK} $status"',
+                  'exit $status'])
+    return '\n'.join(lines) + '\n'
+
+
+class PackCalculation(CalcJob):
+    """Run a script of `get_pack_script` by a shell code (e.g. bash)
+
+    Subclasses write `SCRIPT_NAME` in `prepare_for_submission` and
+    return `get_calcinfo`, stdout of the script is always retrieved
+    """
+    SCRIPT_NAME = 'pack.sh'
+    STDOUT_NAME = 'pack.log'
+
+    @classmethod
+    def define(cls, spec):
+        super(PackCalculation, cls).define(spec)
+        spec.inputs['metadata']['options']['withmpi'].default = False
+
+    def get_calcinfo(self, local_copy_list=(), retrieve_list=()):
+        """CalcInfo to run the script
+
+        Args:
+            local_copy_list (list): see `aiida.common.CalcInfo`
+            retrieve_list (list): retrieved besides stdout
+
+        Returns:
+            aiida.common.CalcInfo
+
+        """
+        codeinfo = CodeInfo()
+        codeinfo.code_uuid = self.inputs.code.uuid
+        codeinfo.cmdline_params = [self.SCRIPT_NAME]
+        codeinfo.stdout_name = self.STDOUT_NAME
+        codeinfo.withmpi = False
+
+        calcinfo = CalcInfo()
+        calcinfo.codes_info = [codeinfo]
+        calcinfo.local_copy_list = list(local_copy_list)
+        calcinfo.remote_copy_list = []
+        calcinfo.retrieve_list = [self.STDOUT_NAME, *retrieve_list]
+        return calcinfo
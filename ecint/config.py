@@ -1,4 +1,5 @@
 RESULT_NAME = 'results.dat'
+RESULT_INDEX_NAME = 'results.jsonl'
 default_cp2k_machine = {
     'code@computer': 'cp2k@aiida_test',
     'nnode': 1,
@@ -15,8 +16,20 @@ default_dpmd_gpu_machine = {
     'nprocs': 1,
     'queue': 'gpu', 'ngpu': 1
 }
+# shell code, deepmd-kit is called in script of DPPackCalculation
+default_dpmd_pack_machine = {
+    'code@computer': 'bash@vanadium',
+    'nprocs': 4,
+    'queue': 'gpu', 'ngpu': 4
+}
 default_lmp_gpu_machine = {
     'code@computer': 'lammps_local@vanadium',
     'nprocs': 1,
     'queue': 'gpu', 'ngpu': 1
 }
+# shell code, lammps is called in script of LammpsPackCalculation
+default_lmp_pack_machine = {
+    'code@computer': 'bash@vanadium',
+    'nprocs': 1,
+    'queue': 'gpu', 'ngpu': 1
+}
@@ -11,7 +11,9 @@ from ase.io.formats import UnknownFileTypeError
 from tqdm import tqdm
 
 from ecint.config import RESULT_NAME
-from ecint.postprocessor.utils import notification_in_dingtalk
+from ecint.postprocessor.notify import get_notifier, \
+    validate_notification
+from ecint.postprocessor.utils import get_job_info
 from ecint.preprocessor.kind import KindSection
 from ecint.preprocessor.utils import load_config, load_kind, \
     load_machine, load_structure
@@ -30,6 +32,8 @@ load_profile()
 class BaseUserInput(object, metaclass=ABCMeta):
     workflow: str
     webhook: str = None
+    # settings of DingtalkNotifier, e.g. {'digest_size': 10}
+    notification: dict = field(default_factory=dict)
     resdir: str = field(default=os.getcwd())
     # metadata: SubData and other special paras
     metadata: dict = field(default_factory=dict)
@@ -305,6 +309,8 @@ class Ecint(WorkChain):
         super(Ecint, cls).define(spec)
         spec.input('webhook', valid_type=(str, type(None)), required=False,
                    non_db=True)
+        spec.input('notification', valid_type=dict, required=False,
+                   non_db=True, validator=validate_notification)
         spec.input('workflow', valid_type=str, required=True, non_db=True)
         spec.input('workflow_inp', valid_type=dict, required=False, non_db=True)
 
@@ -330,7 +336,10 @@ class Ecint(WorkChain):
         assert self.ctx.workchain.is_terminated
 
     def notification(self):
-        notification_in_dingtalk(self.inputs.webhook, self.ctx.workchain)
+        # queue message, do not block daemon worker by slow webhook
+        notifier = get_notifier(self.inputs.webhook,
+                                **self.inputs.get('notification', {}))
+        notifier.notify(*get_job_info(self.ctx.workchain))
 
 
 def check_webhook(webhook):
@@ -348,7 +357,7 @@ def check_webhook(webhook):
         warn('You have not set webhook, so no notification will send', Warning)
 
 
-def _submit_ecint(resdir, webhook, workflow, workflow_inp):
+def _submit_ecint(resdir, webhook, workflow, workflow_inp, notification=None):
     """
 
     Args:
@@ -358,6 +367,8 @@ def _submit_ecint(resdir, webhook, workflow, workflow_inp):
         workflow_inp (dict): workflow input,
             e.g. {'structure':, 'resdir':, 'config':,
                   'kind_section':, 'machine':}
+        notification (dict): settings of notifier,
+            e.g. {'digest_size': 10, 'digest_interval': 600}
 
     Returns:
         None
@@ -381,6 +392,7 @@ def _submit_ecint(resdir, webhook, workflow, workflow_inp):
             for structure in settings['structures']:
                 structure.store()
     node = submit(Ecint, **{'webhook': webhook,
+                            'notification': notification or {},
                             'workflow': workflow,
                             'workflow_inp': workflow_inp})
     with open(os.path.join(resdir, RESULT_NAME), 'a') as f:
@@ -415,6 +427,7 @@ def submit_from_file(input_file):
     # submit...
     resdir = userinput.resdir
     webhook = userinput.webhook
+    notification = userinput.notification
     workflow = userinput.workflow
     workflow_inp = userinput.get_workflow_inp()
     if isinstance(workflow_inp, dict):
@@ -423,7 +436,8 @@ def submit_from_file(input_file):
         _submit_ecint(resdir=resdir,
                       webhook=webhook,
                       workflow=workflow,
-                      workflow_inp=workflow_inp)
+                      workflow_inp=workflow_inp,
+                      notification=notification)
         print('END SUBMIT')
     elif isinstance(workflow_inp, list):
         print('START SUBMIT MULTI STRUCTURES...')
@@ -431,7 +445,8 @@ def submit_from_file(input_file):
             _submit_ecint(resdir=os.path.join(resdir, str(i)),
                           webhook=webhook,
                           workflow=workflow,
-                          workflow_inp=one_workflow_inp)
+                          workflow_inp=one_workflow_inp,
+                          notification=notification)
         print('END SUBMIT MULTI STRUCTURES')
     # return userinput.get_workflow_inp()
 
@@ -0,0 +1,4 @@
+from ecint.parsers.dpmd import DPPackParser
+from ecint.parsers.lammps import LammpsPackParser
+
+__all__ = ['DPPackParser', 'LammpsPackParser']
@@ -0,0 +1,30 @@
+from aiida.parsers import Parser
+
+from ecint.calculations.dpmd import LCURVE_NAME, LOG_NAME, MODEL_NAME
+
+__all__ = ['DPPackParser']
+
+
+class DPPackParser(Parser):
+    """Check that every member of DPPackCalculation is trained and frozen
+
+    Exit code of the script is not known, a member is failed if its
+    `model.pb` or `lcurve.out` is not retrieved
+    """
+
+    def parse(self, **kwargs):
+        links = self.node.get_incoming(
+            link_label_filter='parameters__%').all()
+        members = sorted(link.link_label.split('__', 1)[1] for link in links)
+        failed = []
+        for member in members:
+            try:
+                filenames = self.retrieved.list_object_names(member)
+            except OSError:
+                filenames = []
+            if not {MODEL_NAME, LCURVE_NAME} <= set(filenames):
+                failed.append(member)
+        if failed:
+            self.logger.error(f'Members {failed} failed, see {LOG_NAME} '
+                              f'in their directories')
+            return self.exit_codes.ERROR_MEMBER_FAILED
@@ -0,0 +1,29 @@
+from aiida.parsers import Parser
+
+from ecint.calculations.lammps import FAILED_TASK_MARK, LOG_NAME, \
+    LammpsPackCalculation
+from ecint.calculations.pack import EXIT_STATUS_MARK
+
+__all__ = ['LammpsPackParser']
+
+
+class LammpsPackParser(Parser):
+    """Check that every task of LammpsPackCalculation is finished
+
+    Failed tasks and exit status are read from stdout of the script
+    """
+
+    def parse(self, **kwargs):
+        try:
+            with self.retrieved.open(LammpsPackCalculation.STDOUT_NAME) as f:
+                lines = f.read().splitlines()
+        except OSError:
+            lines = []
+        failed = [line[len(FAILED_TASK_MARK):].strip() for line in lines
+                  if line.startswith(FAILED_TASK_MARK)]
+        if failed:
+            self.logger.error(f'Tasks {failed} failed, see {LOG_NAME} '
+                              f'in their directories')
+            return self.exit_codes.ERROR_TASK_FAILED
+        if not any(line.startswith(EXIT_STATUS_MARK) for line in lines):
+            return self.exit_codes.ERROR_INTERRUPTED
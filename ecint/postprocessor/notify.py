@@ -0,0 +1,208 @@
+import atexit
+import json
+import logging
+import threading
+import time
+from collections import deque
+from queue import Empty, Queue
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+# max seconds a message waits in digest by default
+DIGEST_INTERVAL = 300
+
+
+class DingtalkNotifier(object):
+    def __init__(self, webhook, timeout=10, max_retries=3, backoff=2.0,
+                 rate_limit=20, rate_period=60,
+                 digest_size=1, digest_interval=DIGEST_INTERVAL):
+        """Send messages to dingtalk in a background thread
+
+        Messages are queued by `notify` and never block the caller,
+        posts have timeout, are retried with exponential backoff
+        and rate limited. In digest mode, messages are merged into one
+        summary every `digest_size` messages or every `digest_interval`
+        seconds, whichever comes first
+
+        Args:
+            webhook (str): url webhook of dingtalk robot
+            timeout (float): timeout of each post in seconds
+            max_retries (int): max retry times of a failed post
+            backoff (float): wait backoff * 2 ** n seconds before n-th retry
+            rate_limit (int): max posts in `rate_period`,
+                dingtalk robot accepts 20 messages per minute
+            rate_period (float): period of rate limit in seconds
+            digest_size (int): number of messages merged into one post,
+                1 means no digest
+            digest_interval (float): max seconds a message waits in digest,
+                required if `digest_size` > 1, so a partial digest is
+                always sent in long running daemon
+
+        """
+        if (digest_size > 1) and not (digest_interval and
+                                      digest_interval > 0):
+            raise ValueError('digest_interval should be a positive number '
+                             'if digest_size > 1')
+        self.webhook = webhook
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self.digest_size = digest_size
+        self.digest_interval = digest_interval
+        self._queue = Queue()
+        self._post_times = deque()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        with self._lock:
+            if (self._thread is None) or (not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run,
+                                                name='DingtalkNotifier',
+                                                daemon=True)
+                self._thread.start()
+
+    def notify(self, title, text):
+        """Queue a markdown message, return immediately
+
+        Args:
+            title (str): title of message
+            text (str): markdown text of message
+
+        Returns:
+            None
+
+        """
+        self._ensure_thread()
+        self._queue.put((title, text))
+
+    def flush(self, timeout=None):
+        """Send all queued messages and stop background thread
+
+        Args:
+            timeout (float): max seconds to wait
+
+        Returns:
+            bool: True if all messages are handled
+
+        """
+        if (self._thread is None) or (not self._thread.is_alive()):
+            return self._queue.empty()
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _run(self):
+        pending, deadline = [], None
+        while True:
+            wait = (None if deadline is None
+                    else max(deadline - time.monotonic(), 0))
+            try:
+                item = self._queue.get(timeout=wait)
+            except Empty:
+                item = None
+            if item is _STOP:
+                self._send_digest(pending)
+                return
+            if item is not None:
+                pending.append(item)
+                if (deadline is None) and self.digest_interval:
+                    deadline = time.monotonic() + self.digest_interval
+            if (len(pending) >= self.digest_size or
+                    (deadline is not None and time.monotonic() >= deadline)):
+                self._send_digest(pending)
+                pending, deadline = [], None
+
+    def _send_digest(self, messages):
+        if not messages:
+            return
+        if len(messages) == 1:
+            title, text = messages[0]
+        else:
+            title = f'{len(messages)} Jobs Info'
+            text = '\n\n---\n\n'.join(text for _, text in messages)
+        self._post(title, text)
+
+    def _wait_rate_limit(self):
+        while len(self._post_times) >= self.rate_limit:
+            wait = self._post_times[0] + self.rate_period - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._post_times.popleft()
+        self._post_times.append(time.monotonic())
+
+    def _post(self, title, text):
+        headers = {'Content-Type': 'application/json'}
+        data = {'msgtype': 'markdown',
+                'markdown': {'title': title, 'text': text}}
+        for retry in range(self.max_retries + 1):
+            if retry:
+                time.sleep(self.backoff * 2 ** (retry - 1))
+            self._wait_rate_limit()
+            try:
+                response = requests.post(url=self.webhook, headers=headers,
+                                         data=json.dumps(data),
+                                         timeout=self.timeout)
+                response.raise_for_status()
+                # dingtalk returns errcode 0 if succeed
+                try:
+                    errcode = response.json().get('errcode', 0)
+                except ValueError:
+                    errcode = 0
+                if errcode == 0:
+                    return response
+                error = response.text
+            except requests.RequestException as e:
+                error = repr(e)
+            logger.warning(f'Failed to send notification '
+                           f'(try {retry + 1}): {error}')
+        return None
+
+
+def validate_notification(value, _=None):
+    """Check settings of `DingtalkNotifier` before workchain runs
+
+    Args:
+        value (dict): settings of `DingtalkNotifier` except webhook
+
+    Returns:
+        str or None: error message if settings are invalid
+
+    """
+    if value is None:
+        return None
+    try:
+        DingtalkNotifier(None, **value)
+    except (TypeError, ValueError) as e:
+        return f'Invalid notification settings {value}: {e}'
+
+
+_notifiers = {}
+
+
+def get_notifier(webhook, **kwargs):
+    """Get notifier shared by workchains in this process
+
+    Args:
+        webhook (str): url webhook of dingtalk robot
+        **kwargs: settings of `DingtalkNotifier`,
+            only used when the notifier of `webhook` is created
+
+    Returns:
+        DingtalkNotifier: notifier of `webhook`
+
+    """
+    if webhook not in _notifiers:
+        _notifiers[webhook] = DingtalkNotifier(webhook, **kwargs)
+    return _notifiers[webhook]
+
+
+@atexit.register
+def flush_notifiers(timeout=30):
+    for notifier in _notifiers.values():
+        notifier.flush(timeout)
@@ -1,6 +1,14 @@
+import os
 import re
 
 import numpy as np
+from ase import Atoms
+from ase.data import atomic_numbers
+
+# columns of model_devi.out kept by `load_model_devi`
+MODEL_DEVI_COLUMNS = ('step', 'max_devi_e', 'max_devi_f')
+_MODEL_DEVI_USECOLS = [0, 1, 4]
+MODEL_DEVI_CACHE_SUFFIX = '.npy'
 
 
 def parse_band_convergence_like_info(str_info):
@@ -13,12 +21,174 @@ def parse_band_convergence_like_info(str_info):
     return band_convergence_like_info_dict
 
 
+class BandConvergenceParser(object):
+    KEYS = {'RMS DISPLACEMENT': 'rms_displacement',
+            'MAX DISPLACEMENT': 'max_displacement',
+            'RMS FORCE': 'rms_force',
+            'MAX FORCE': 'max_force'}
+    _REGEX = re.compile(r'(RMS|MAX) (DISPLACEMENT|FORCE).*')
+
+    def __init__(self):
+        """Parse convergence information of BAND.out incrementally
+
+        Text can be fed piece by piece while BAND.out is still growing,
+        an iteration is recorded once all of RMS/MAX displacement
+        and force are read
+
+        """
+        self.iterations = []
+        self._current = {}
+        self._buffer = ''
+
+    def feed(self, text):
+        """Parse new text appended to BAND.out
+
+        Args:
+            text (str): new content, may end with an incomplete line
+
+        Returns:
+            int: number of new iterations
+
+        """
+        lines = (self._buffer + text).split('\n')
+        # keep incomplete line until next feed
+        self._buffer = lines.pop()
+        n_iterations = len(self.iterations)
+        for line in lines:
+            match = self._REGEX.search(line)
+            if not match:
+                continue
+            key = self.KEYS[f'{match.group(1)} {match.group(2)}']
+            if key in self._current:
+                self._finish_iteration()
+            self._current[key] = \
+                parse_band_convergence_like_info(match.group(0))
+            if len(self._current) == len(self.KEYS):
+                self._finish_iteration()
+        return len(self.iterations) - n_iterations
+
+    def _finish_iteration(self):
+        self.iterations.append(self._current)
+        self._current = {}
+
+    def get_convergence_info(self):
+        """
+
+        Returns:
+            dict: e.g. {'rms_force': [{'step_value': ,
+                                       'convergence_criteria': ,
+                                       'is_converged': }, ...], ...}
+
+        """
+        return {key: [iteration[key] for iteration in self.iterations
+                      if key in iteration]
+                for key in self.KEYS.values()}
+
+    @property
+    def is_converged(self):
+        return bool(self.iterations) and all(
+            info['is_converged'] == 'YES'
+            for info in self.iterations[-1].values())
+
+    def is_stalled(self, window=20, tolerance=0.05):
+        """Whether MAX FORCE stops decreasing
+
+        Args:
+            window (int): number of latest iterations to check
+            tolerance (float): relative decrease of the minimal MAX FORCE
+                in the latest `window` iterations regarded as progress
+
+        Returns:
+            bool: True if the band is not converged and MAX FORCE
+                does not decrease in the latest `window` iterations
+
+        """
+        max_force = [info['step_value'] for info in
+                     self.get_convergence_info()['max_force']]
+        if self.is_converged or len(max_force) <= window:
+            return False
+        best_before = min(max_force[:-window])
+        best_latest = min(max_force[-window:])
+        return best_latest > best_before * (1 - tolerance)
+
+    def get_progress(self, window=20, tolerance=0.05):
+        """Summary of convergence progress
+
+        Returns:
+            dict: number of iterations, whether converged or stalled,
+                and step_value / convergence_criteria of the last iteration
+
+        """
+        last_iteration = self.iterations[-1] if self.iterations else {}
+        return {
+            'iterations': len(self.iterations),
+            'is_converged': self.is_converged,
+            'is_stalled': self.is_stalled(window, tolerance),
+            'ratio_to_criteria': {
+                key: info['step_value'] / info['convergence_criteria']
+                for key, info in last_iteration.items()}
+        }
+
+
+def _read_model_devi_text(filename):
+    """Parse all columns of model_devi.out in one pass
+
+    Args:
+        filename (str): path of model_devi.out
+
+    Returns:
+        numpy.ndarray: 2d array of model_devi.out
+
+    """
+    with open(filename) as f:
+        content = f.read()
+    # header may appear several times if lammps is restarted
+    if '#' in content:
+        content = '\n'.join(line for line in content.splitlines()
+                            if not line.lstrip().startswith('#'))
+    lines = content.split('\n', 1)
+    ncols = len(lines[0].split()) if lines[0].strip() else 0
+    if ncols == 0:
+        return np.empty((0, max(_MODEL_DEVI_USECOLS) + 1))
+    return np.fromstring(content, sep=' ').reshape(-1, ncols)
+
+
+def load_model_devi(filename, cache=True):
+    """Load step, max_devi_e and max_devi_f of model_devi.out
+
+    model_devi.out is parsed only once, the needed columns are cached
+    as a `.npy` sidecar next to it, and later calls memory-map the sidecar
+    unless model_devi.out is newer
+
+    Args:
+        filename (str): path of model_devi.out
+        cache (bool): whether to read and write the `.npy` sidecar
+
+    Returns:
+        numpy.ndarray: shape (n, 3), columns are `MODEL_DEVI_COLUMNS`
+
+    """
+    cache_name = filename + MODEL_DEVI_CACHE_SUFFIX
+    if (cache and os.path.exists(cache_name) and
+            os.path.getmtime(cache_name) >= os.path.getmtime(filename)):
+        return np.load(cache_name, mmap_mode='r')
+    model_devi_array = np.ascontiguousarray(
+        _read_model_devi_text(filename)[:, _MODEL_DEVI_USECOLS])
+    if cache:
+        # write to temporary file first, other processes may read it
+        tmp_name = f'{cache_name}.{os.getpid()}.tmp'
+        with open(tmp_name, 'wb') as f:
+            np.save(f, model_devi_array)
+        os.replace(tmp_name, cache_name)
+    return model_devi_array
+
+
 def parse_model_devi_index(filename, skip_images,
                            force_low_limit, force_high_limit,
                            energy_low_limit, energy_high_limit):
-    model_devi_array = np.loadtxt(filename, usecols=[0, 4, 1])
+    model_devi_array = load_model_devi(filename)
     valid_model_devi = model_devi_array[model_devi_array[:, 0] >= skip_images]
-    traj_step, force_devi, energy_devi = valid_model_devi.T
+    traj_step, energy_devi, force_devi = valid_model_devi.T
     # TODO: now only consider cluster_cutoff is None, to consider
     #  other situations when needed
     candidate_index = np.union1d(np.argwhere((force_low_limit <= force_devi) &
@@ -30,6 +200,83 @@ def parse_model_devi_index(filename, skip_images,
     accurate_index = np.intersect1d(np.argwhere(force_devi < force_low_limit),
                                     np.argwhere(energy_devi < energy_low_limit))
     traj_step = traj_step.astype(int)
-    return {'candidate': traj_step[candidate_index],
-            'failed': traj_step[failed_index],
-            'accurate': traj_step[accurate_index]}
+    # sorted unique steps, the first row of a repeated step is kept
+    candidate, first = np.unique(traj_step[candidate_index],
+                                 return_index=True)
+    return {'candidate': candidate,
+            # max_devi_f of each candidate, used to weight candidate selection
+            'candidate_devi_f': force_devi[candidate_index][first],
+            'failed': np.unique(traj_step[failed_index]),
+            'accurate': np.unique(traj_step[accurate_index])}
+
+
+# position columns of lammps dump, and whether they are scaled
+_DUMP_POSITION_COLUMNS = [(('x', 'y', 'z'), False),
+                          (('xu', 'yu', 'zu'), False),
+                          (('xs', 'ys', 'zs'), True),
+                          (('xsu', 'ysu', 'zsu'), True)]
+
+
+def read_lammps_dump_text(filename, specorder):
+    """Read single frame of lammps text dump, e.g. `100.lammpstrj`
+
+    Faster than `ase.io.read(format='lammps-dump-text')`, atoms section is
+    parsed by numpy in one pass. Only types and positions are read
+
+    Args:
+        filename (str or file): lammps dump of one frame
+        specorder (list): element of each lammps type, type 1 is specorder[0]
+
+    Returns:
+        ase.Atoms: atoms sorted by id
+
+    """
+    if isinstance(filename, str):
+        with open(filename) as f:
+            content = f.read()
+    else:
+        content = filename.read()
+    header, atoms_section = content.split('ITEM: ATOMS', 1)
+    columns_line, atoms_section = atoms_section.split('\n', 1)
+    columns = columns_line.split()
+    natoms, bounds, pbc = None, None, None
+    header_lines = header.splitlines()
+    for i, line in enumerate(header_lines):
+        if line.startswith('ITEM: NUMBER OF ATOMS'):
+            natoms = int(header_lines[i + 1])
+        elif line.startswith('ITEM: BOX BOUNDS'):
+            pbc = [flag == 'pp' for flag in line.split()[-3:]]
+            bounds = np.array([header_lines[i + j].split()
+                               for j in range(1, 4)], dtype=float)
+    if (natoms is None) or (bounds is None):
+        raise ValueError(f'Incomplete header of lammps dump: {header}')
+    # triclinic box, see `How to triclinic` of lammps documents
+    xy, xz, yz = bounds[:, 2] if bounds.shape[1] == 3 else (0., 0., 0.)
+    xlo = bounds[0, 0] - min(0., xy, xz, xy + xz)
+    xhi = bounds[0, 1] - max(0., xy, xz, xy + xz)
+    ylo = bounds[1, 0] - min(0., yz)
+    yhi = bounds[1, 1] - max(0., yz)
+    zlo, zhi = bounds[2, :2]
+    cell = np.array([[xhi - xlo, 0., 0.],
+                     [xy, yhi - ylo, 0.],
+                     [xz, yz, zhi - zlo]])
+    celldisp = np.array([xlo, ylo, zlo])
+
+    data = np.fromstring(atoms_section, sep=' ')
+    if data.size != natoms * len(columns):
+        raise ValueError(f'Expect {natoms} atoms with columns {columns}, '
+                         f'got {data.size} values')
+    data = data.reshape(natoms, len(columns))
+    data = data[np.argsort(data[:, columns.index('id')])]
+    for position_columns, scaled in _DUMP_POSITION_COLUMNS:
+        if set(position_columns).issubset(columns):
+            positions = data[:, [columns.index(c) for c in position_columns]]
+            if scaled:
+                positions = positions @ cell + celldisp
+            break
+    else:
+        raise ValueError(f'No positions in columns {columns}')
+    types = data[:, columns.index('type')].astype(int)
+    numbers = np.array([atomic_numbers[s] for s in specorder])[types - 1]
+    return Atoms(numbers=numbers, positions=positions, cell=cell, pbc=pbc,
+                 celldisp=celldisp)
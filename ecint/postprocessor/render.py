@@ -0,0 +1,92 @@
+import atexit
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+logger = logging.getLogger(__name__)
+
+
+def _init_render_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+class FigureRenderer(object):
+    def __init__(self, max_workers=1):
+        """Render figures in background processes
+
+        Figures are queued to a process pool, so workchain steps do not
+        wait for matplotlib, and errors of plotting are only logged
+
+        Args:
+            max_workers (int): number of rendering processes
+
+        """
+        self.max_workers = max_workers
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            # `spawn` avoids forking threads of daemon worker
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=get_context('spawn'),
+                initializer=_init_render_worker)
+        return self._executor
+
+    def submit(self, plot_func, *args, **kwargs):
+        """Queue a plot function
+
+        Args:
+            plot_func (Callable): module level function,
+                `args` and `kwargs` should be picklable
+            *args: args of `plot_func`
+            **kwargs: kwargs of `plot_func`
+
+        Returns:
+            concurrent.futures.Future or None: None if failed to queue
+
+        """
+        try:
+            future = self.executor.submit(plot_func, *args, **kwargs)
+        except (BrokenProcessPool, RuntimeError) as e:
+            logger.warning(f'Failed to queue {plot_func.__name__}: {e!r}')
+            self._executor = None
+            return None
+        future.add_done_callback(self._log_failure)
+        return future
+
+    @staticmethod
+    def _log_failure(future):
+        if future.cancelled():
+            return
+        exception = future.exception()
+        if exception is not None:
+            logger.warning(f'Failed to render figure: {exception!r}')
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+_renderer = FigureRenderer()
+atexit.register(_renderer.shutdown)
+
+
+def render_in_background(plot_func, *args, **kwargs):
+    """Queue a plot function to the renderer shared in this process
+
+    Args:
+        plot_func (Callable): module level function,
+            e.g. functions in `ecint.postprocessor.visualization`
+        *args: args of `plot_func`, paths should be absolute
+        **kwargs: kwargs of `plot_func`
+
+    Returns:
+        concurrent.futures.Future or None: None if failed to queue
+
+    """
+    return _renderer.submit(plot_func, *args, **kwargs)
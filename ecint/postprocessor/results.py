@@ -0,0 +1,170 @@
+import csv
+import fcntl
+import json
+import os
+import sys
+import time
+from warnings import warn
+
+import click
+
+from ecint.config import RESULT_INDEX_NAME
+
+
+def _to_json(obj):
+    # numpy scalars and arrays
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    raise TypeError(f'Object of type {type(obj).__name__} '
+                    f'is not JSON serializable')
+
+
+def record_result(resdir, workflow, node=None, label='', **fields):
+    """Append one record to results index in `resdir`
+
+    Index is a json lines file, each record is written by one locked
+    `write` of one line, so it is safe for concurrent workchains
+
+    Args:
+        resdir (str): results directory
+        workflow (str): name of workflow step, e.g. 'Energy'
+        node (aiida.orm.ProcessNode): node of calculation,
+            provides pk and timing
+        label (str): label of structure
+        **fields: other results, e.g. energy=-1.0, structure_file='a.xyz'
+
+    Returns:
+        dict: record
+
+    """
+    record = {'workflow': workflow, 'label': label, 'time': time.time()}
+    if node is not None:
+        record.update({'pk': node.pk,
+                       'ctime': node.ctime,
+                       'mtime': node.mtime,
+                       'walltime': (node.mtime - node.ctime).total_seconds()})
+    record.update(fields)
+    line = json.dumps(record, sort_keys=True, default=_to_json) + '\n'
+    with open(os.path.join(resdir, RESULT_INDEX_NAME), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.write(line)
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    return record
+
+
+def find_result_indexes(path, recursive=True):
+    """Find results index files
+
+    Args:
+        path (str): results index file or results directory
+        recursive (bool): also search sub directories of `path`
+
+    Returns:
+        list[str]: paths of results index files
+
+    """
+    if os.path.isfile(path):
+        return [path]
+    if not recursive:
+        index = os.path.join(path, RESULT_INDEX_NAME)
+        return [index] if os.path.isfile(index) else []
+    indexes = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        if RESULT_INDEX_NAME in filenames:
+            indexes.append(os.path.join(dirpath, RESULT_INDEX_NAME))
+    return indexes
+
+
+def iter_results(path, recursive=True):
+    """Iterate records in results indexes
+
+    Args:
+        path (str): results index file or results directory
+        recursive (bool): also search sub directories of `path`
+
+    Yields:
+        dict: record, with 'resdir' where the index is
+
+    """
+    for index in find_result_indexes(path, recursive=recursive):
+        resdir = os.path.dirname(os.path.abspath(index))
+        with open(index) as f:
+            for lineno, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # e.g. line truncated by a killed process
+                    warn(f'Skip broken record in {index}, line {lineno}',
+                         Warning)
+                    continue
+                record.setdefault('resdir', resdir)
+                yield record
+
+
+def load_results(path, recursive=True, **filters):
+    """Load records in results indexes
+
+    Args:
+        path (str): results index file or results directory
+        recursive (bool): also search sub directories of `path`
+        **filters: only keep records with these values,
+            e.g. workflow='Energy'
+
+    Returns:
+        list[dict]: records
+
+    """
+    return [record for record in iter_results(path, recursive=recursive)
+            if all(record.get(k) == v for k, v in filters.items())]
+
+
+def get_result_values(records, key):
+    """Get values of `key` in records, skip records without it
+
+    Args:
+        records (list[dict]): records from `load_results`
+        key (str): e.g. 'energy'
+
+    Returns:
+        list: values
+
+    """
+    return [record[key] for record in records if key in record]
+
+
+@click.command()
+@click.argument('path', type=click.Path(exists=True), default='.')
+@click.option('--workflow', '-w', help='only show records of workflow')
+@click.option('--label', '-l', help='only show records of label')
+@click.option('--keys', '-k', default='resdir,workflow,label,pk,energy',
+              help='comma separated keys to show')
+@click.option('--recursive/--no-recursive', default=True,
+              help='search sub directories of PATH or not')
+@click.option('--format', '-f', 'fm', default='tsv',
+              type=click.Choice(['tsv', 'csv', 'jsonl']), help='output format')
+def query_results(path, workflow, label, keys, recursive, fm):
+    filters = {}
+    if workflow is not None:
+        filters['workflow'] = workflow
+    if label is not None:
+        filters['label'] = label
+    keys = keys.split(',')
+    records = load_results(path, recursive=recursive, **filters)
+    if fm == 'jsonl':
+        for record in records:
+            print(json.dumps({k: record.get(k) for k in keys}))
+        return
+    writer = csv.writer(sys.stdout, delimiter='\t' if fm == 'tsv' else ',',
+                        lineterminator='\n')
+    writer.writerow(keys)
+    for record in records:
+        writer.writerow(['' if record.get(k) is None else record[k]
+                         for k in keys])
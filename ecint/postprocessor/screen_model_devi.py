@@ -0,0 +1,99 @@
+"""Screen model_devi.out next to the data on remote computer
+
+This file is uploaded and run as a script on remote computer,
+so only python standard library can be used here.
+
+Usage:
+    python screen_model_devi.py --skip-images 0 \
+        --force-limits 0.05 0.15 --energy-limits 1e10 1e10 \
+        --bins 500 --xmax 5 0/model_devi.out 1/model_devi.out ...
+
+It prints json like {"0/model_devi.out": {"candidate": [],
+"candidate_devi_f": [], "failed": [], "accurate": [], "counts": [],
+"total": 0}, ...}
+"""
+import argparse
+import json
+
+MODEL_DEVI_BINS = 500
+MODEL_DEVI_XMAX = 5
+
+
+def screen_model_devi(filename, skip_images,
+                      force_low_limit, force_high_limit,
+                      energy_low_limit, energy_high_limit,
+                      bins=MODEL_DEVI_BINS, xmax=MODEL_DEVI_XMAX):
+    """Same selection as `ecint.postprocessor.parse.parse_model_devi_index`,
+    also count histogram of max_devi_f
+
+    Args:
+        filename (str): path of model_devi.out
+        skip_images (int): steps smaller than it are skipped
+        force_low_limit (float): lower limit of max_devi_f for candidate
+        force_high_limit (float): upper limit of max_devi_f for candidate
+        energy_low_limit (float): lower limit of max_devi_e for candidate
+        energy_high_limit (float): upper limit of max_devi_e for candidate
+        bins (int): number of bins in [0, xmax]
+        xmax (float): upper edge of histogram
+
+    Returns:
+        dict: sorted unique steps of 'candidate', 'failed', 'accurate',
+            max_devi_f of candidates 'candidate_devi_f', histogram 'counts'
+            and 'total' number of valid steps
+
+    """
+    # {step: max_devi_f}, the first row of a repeated step is kept
+    candidate = {}
+    failed, accurate = set(), set()
+    counts = [0] * bins
+    total = 0
+    with open(filename) as f:
+        for line in f:
+            values = line.split()
+            if (not values) or values[0].startswith('#'):
+                continue
+            step = int(float(values[0]))
+            if step < skip_images:
+                continue
+            energy_devi, force_devi = float(values[1]), float(values[4])
+            if ((force_low_limit <= force_devi < force_high_limit) or
+                    (energy_low_limit <= energy_devi < energy_high_limit)):
+                candidate.setdefault(step, force_devi)
+            if (force_devi >= force_high_limit or
+                    energy_devi >= energy_high_limit):
+                failed.add(step)
+            if force_devi < force_low_limit and energy_devi < energy_low_limit:
+                accurate.add(step)
+            # the last bin includes right edge, same as numpy.histogram
+            if 0 <= force_devi <= xmax:
+                counts[min(int(force_devi / xmax * bins), bins - 1)] += 1
+            total += 1
+    candidate_steps = sorted(candidate)
+    return {'candidate': candidate_steps,
+            'candidate_devi_f': [candidate[step] for step in candidate_steps],
+            'failed': sorted(failed), 'accurate': sorted(accurate),
+            'counts': counts, 'total': total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Screen model_devi.out')
+    parser.add_argument('--skip-images', type=int, default=0)
+    parser.add_argument('--force-limits', type=float, nargs=2,
+                        default=[0.05, 0.15])
+    parser.add_argument('--energy-limits', type=float, nargs=2,
+                        default=[1e10, 1e10])
+    parser.add_argument('--bins', type=int, default=MODEL_DEVI_BINS)
+    parser.add_argument('--xmax', type=float, default=MODEL_DEVI_XMAX)
+    parser.add_argument('filenames', nargs='+')
+    args = parser.parse_args()
+    results = {
+        filename: screen_model_devi(filename, args.skip_images,
+                                    *args.force_limits, *args.energy_limits,
+                                    bins=args.bins, xmax=args.xmax)
+        for filename in args.filenames
+    }
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import numpy as np
+from ase.neighborlist import neighbor_list
+
+__all__ = ['get_fingerprints', 'farthest_point_sampling',
+           'select_diverse_structures']
+
+FINGERPRINT_RCUT = 6.0
+FINGERPRINT_NBINS = 60
+
+
+def get_fingerprints(atoms_list, kinds, rcut=FINGERPRINT_RCUT,
+                     nbins=FINGERPRINT_NBINS):
+    """Histograms of neighbor distances for each pair of elements
+
+    Distances in [0, rcut) are counted in `nbins` bins for every ordered pair
+    of `kinds`, and normalized by number of atoms, so structures of
+    different sizes are comparable
+
+    Args:
+        atoms_list (list[ase.Atoms]): structures
+        kinds (list[str]): elements, decide the order of pairs
+        rcut (float): cutoff of neighbor distances
+        nbins (int): number of bins for each pair
+
+    Returns:
+        numpy.ndarray: shape (len(atoms_list), len(kinds) ** 2 * nbins)
+
+    """
+    nkinds = len(kinds)
+    kind_index = {kind: i for i, kind in enumerate(kinds)}
+    fingerprints = np.zeros((len(atoms_list), nkinds ** 2 * nbins))
+    for n, atoms in enumerate(atoms_list):
+        types = np.array([kind_index[symbol]
+                          for symbol in atoms.get_chemical_symbols()])
+        i, j, d = neighbor_list('ijd', atoms, rcut)
+        pair = types[i] * nkinds + types[j]
+        distance_bin = np.minimum((d / rcut * nbins).astype(int), nbins - 1)
+        fingerprints[n] = np.bincount(pair * nbins + distance_bin,
+                                      minlength=nkinds ** 2 * nbins)
+        fingerprints[n] /= max(len(atoms), 1)
+    return fingerprints
+
+
+def farthest_point_sampling(fingerprints, k, weights=None):
+    """Select points one by one, each is the farthest from selected ones
+
+    With `weights`, the point with the largest product of weight and
+    distance to selected points is selected, the first point is the one
+    with the largest weight
+
+    Args:
+        fingerprints (numpy.ndarray): shape (n, m)
+        k (int): number of selected points
+        weights (numpy.ndarray): shape (n,), non-negative, e.g. model
+            deviation of each point
+
+    Returns:
+        list[int]: indices of selected points, in selected order
+
+    """
+    fingerprints = np.asarray(fingerprints, dtype=float)
+    n = len(fingerprints)
+    if k >= n:
+        return list(range(n))
+    if weights is None:
+        weights = np.ones(n)
+        # start from the point farthest from center
+        first = int(np.argmax(np.linalg.norm(
+            fingerprints - fingerprints.mean(axis=0), axis=1)))
+    else:
+        weights = np.asarray(weights, dtype=float)
+        first = int(np.argmax(weights))
+    selected = [first]
+    min_distances = np.linalg.norm(fingerprints - fingerprints[first], axis=1)
+    for _ in range(k - 1):
+        scores = min_distances * weights
+        scores[selected] = -1
+        index = int(np.argmax(scores))
+        selected.append(index)
+        min_distances = np.minimum(
+            min_distances,
+            np.linalg.norm(fingerprints - fingerprints[index], axis=1))
+    return selected
+
+
+def select_diverse_structures(atoms_list, k, kinds, model_devi=None,
+                              rcut=FINGERPRINT_RCUT, nbins=FINGERPRINT_NBINS):
+    """Select `k` structures which are most different from each other
+
+    Args:
+        atoms_list (list[ase.Atoms]): structures
+        k (int): number of selected structures
+        kinds (list[str]): elements in structures
+        model_devi (list[float]): max_devi_f of each structure, structures
+            with larger deviation are preferred if set
+        rcut (float): see `get_fingerprints`
+        nbins (int): see `get_fingerprints`
+
+    Returns:
+        list[int]: sorted indices of selected structures
+
+    """
+    fingerprints = get_fingerprints(atoms_list, kinds, rcut, nbins)
+    weights = None
+    if model_devi is not None:
+        model_devi = np.asarray(model_devi, dtype=float)
+        weights = model_devi / max(model_devi.max(), np.finfo(float).tiny)
+    return sorted(farthest_point_sampling(fingerprints, k, weights))
@@ -1,13 +1,26 @@
 import json
 import os
 import re
+import shlex
+import shutil
+import tarfile
+import tempfile
+import zlib
+from glob import glob
+from uuid import uuid4
+from warnings import warn
 
 import numpy as np
 import requests
+from aiida.orm import CalcJobNode, Float, List, QueryBuilder, StructureData, \
+    WorkChainNode
 from ase import Atoms
 from ase.io import read, write
 
-from ecint.postprocessor.parse import parse_band_convergence_like_info
+from ecint.postprocessor import screen_model_devi
+from ecint.postprocessor.parse import BandConvergenceParser
+from ecint.postprocessor.screen_model_devi import MODEL_DEVI_BINS, \
+    MODEL_DEVI_XMAX
 
 AU2EV = 2.72113838565563E+01
 AU2AR = 5.29177208590000E-01
@@ -16,6 +29,10 @@ PROJECT_NAME = 'aiida'
 TRAJ_NAME = f'{PROJECT_NAME}-pos-1.xyz'
 REPLICA_NAME = f'{PROJECT_NAME}-Replica_data_for_energy_curve.xyz'
 MAX_ENERGY_NAME = f'max_energy_structure.xyz'
+BAND_NAME = f'{PROJECT_NAME}-BAND.out'
+# chunk size of streaming copy from repository
+COPY_CHUNK_SIZE = 1024 * 1024
+DP_SET_SIZE = 5000
 
 
 def get_last_frame(traj_file=TRAJ_NAME, format='xyz', cell=None, pbc=None):
@@ -97,6 +114,31 @@ def write_output_from_label(label, suffix=None, content=None):
             f.write(content)
 
 
+def write_file_from_node(node, output_file, filename=None,
+                         chunk_size=COPY_CHUNK_SIZE):
+    """Copy file in repository of node to disk chunk by chunk
+
+    Memory used is limited to `chunk_size`, whatever the size of file
+
+    Args:
+        node (aiida.orm.Node): e.g. SinglefileData or FolderData
+        output_file (str): path of file to write
+        filename (str): name of file in repository of node,
+            None for SinglefileData
+        chunk_size (int): bytes read per chunk
+
+    Returns:
+        None
+
+    """
+    output_dir = os.path.dirname(output_file)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with node.open(filename, mode='rb') as src, \
+            open(output_file, mode='wb') as dst:
+        shutil.copyfileobj(src, dst, chunk_size)
+
+
 def write_xyz_from_structure(structure, output_file):
     """Write output xyz file for StructureData with energy
 
@@ -113,76 +155,250 @@ def write_xyz_from_structure(structure, output_file):
     atoms.write(output_file)
 
 
-def write_xyz_from_trajectory(trajectory, output_file):
+def write_xyz_from_trajectory(trajectory, output_file, pbc=True):
     """Write output xyz file for TrajectoryData with energy
 
+    Extended xyz text is generated from positions, cells and symbols arrays
+    directly, without building StructureData or Atoms for each step
+
     Args:
         trajectory (aiida.orm.TrajectoryData): TrajectoryData with array energy
         output_file (str): output file name, *.xyz
+        pbc (bool or list[bool]): periodic boundary conditions written with
+            cells, TrajectoryData does not keep them, default is periodic
+            in all directions, same as `get_step_structure`
 
     Returns:
         None
 
     """
-    energy_array = trajectory.get_array('energy')
-    traj = []
-    for structure_index in trajectory.get_stepids():
-        structure = trajectory.get_step_structure(structure_index)
-        energy = energy_array[structure_index]
-        atoms = structure.get_ase()
-        atoms.info.update({'i': structure_index, 'E': f'{energy} eV'})
-        traj.append(atoms)
-    write(output_file, traj)
-
-
-def write_datadir_from_energyworkchain(dirname, nodes, kinds):
+    symbols = trajectory.symbols
+    positions = trajectory.get_positions()
+    cells = trajectory.get_cells()
+    energy_array = (trajectory.get_array('energy')
+                    if 'energy' in trajectory.get_arraynames() else None)
+    pbc_value = ' '.join('T' if p else 'F'
+                         for p in np.broadcast_to(pbc, 3).tolist())
+    # format of all atoms lines in one frame
+    frame_format = ''.join(f'{symbol:<2} %16.8f %16.8f %16.8f\n'
+                           for symbol in symbols)
+    with open(output_file, 'w') as f:
+        for structure_index in trajectory.get_stepids():
+            comment = []
+            if cells is not None:
+                lattice = ' '.join(f'{x:.8f}'
+                                   for x in cells[structure_index].ravel())
+                comment.append(f'Lattice="{lattice}"')
+            comment.append('Properties=species:S:1:pos:R:3')
+            comment.append(f'i={structure_index}')
+            if energy_array is not None:
+                comment.append(f'E="{energy_array[structure_index]} eV"')
+            if cells is not None:
+                comment.append(f'pbc="{pbc_value}"')
+            f.write(f'{len(symbols)}\n{" ".join(comment)}\n')
+            f.write(frame_format % tuple(positions[structure_index].ravel()))
+
+
+def _query_frames(pks, namespace=False):
+    """Query structures, energies and forces linked to workchains
+
+    Args:
+        pks (list[int]): pks of workchains
+        namespace (bool): if False, query links `structure`, `energy` and
+            `forces`, else links in namespaces `structures`, `energy` and
+            `forces`, the key in namespace is the key of frame
+
+    Returns:
+        dict: {pk: {key: [cell, sites, energy, forces]}}
+
+    """
+    def get_key(link_label, name):
+        if not namespace:
+            return '' if link_label == name else None
+        prefix, _, key = link_label.partition('__')
+        return key if (prefix == name) and key else None
+
+    def get_filters(name):
+        # `_` is also a wildcard of `like`, keys are checked by `get_key`
+        return {'label': {'like': f'{name}__%'} if namespace else name}
+
+    frames = {}
+    qb = QueryBuilder()
+    qb.append(WorkChainNode, filters={'id': {'in': pks}},
+              project=['id'], tag='workchain')
+    structure_name = 'structures' if namespace else 'structure'
+    qb.append(StructureData, with_outgoing='workchain',
+              edge_filters=get_filters(structure_name),
+              edge_project=['label'],
+              project=['attributes.cell', 'attributes.sites'], tag='structure')
+    for row in qb.iterdict():
+        key = get_key(row['workchain--structure']['label'], structure_name)
+        if key is not None:
+            frames.setdefault(row['workchain']['id'], {})[key] = \
+                [row['structure']['attributes.cell'],
+                 row['structure']['attributes.sites'], None, None]
+    if not frames:
+        return frames
+    for i, (data_class, name, attribute) in enumerate(
+            [(Float, 'energy', 'attributes.value'),
+             (List, 'forces', 'attributes.list')], 2):
+        qb = QueryBuilder()
+        qb.append(WorkChainNode, filters={'id': {'in': list(frames)}},
+                  project=['id'], tag='workchain')
+        qb.append(data_class, with_incoming='workchain',
+                  edge_filters=get_filters(name),
+                  edge_project=['label'], project=[attribute], tag='data')
+        for row in qb.iterdict():
+            key = get_key(row['workchain--data']['label'], name)
+            frame = frames[row['workchain']['id']].get(key)
+            if frame is not None:
+                frame[i] = row['data'][attribute]
+    return frames
+
+
+def get_energyworkchain_arrays(nodes):
+    """Fetch structures, energies and forces of nodes in bulk
+
+    All values are projected from database by a few `QueryBuilder`,
+    frames without energy or forces are skipped
+
+    Args:
+        nodes (list): EnergySingleWorkChain nodes,
+            structure should in node.inputs,
+            energy and forces should in node.outputs,
+            or EnergyFarmingWorkChain nodes, with `structures`, `energy`
+            and `forces` namespaces, one frame for each key
+
+    Returns:
+        (list, dict): kind names of sites, and arrays
+            {'box': , 'coord': , 'energy': , 'force': },
+            frames are in the first axis and keep the order of `nodes`,
+            frames of EnergyFarmingWorkChain are sorted by key
+
     """
+    pks = [node.pk for node in nodes]
+    single_frames = _query_frames(pks)
+    farming_frames = _query_frames(pks, namespace=True)
+    frames = []
+    for pk in pks:
+        node_frames = single_frames.get(pk) or farming_frames.get(pk) or {}
+        if not node_frames:
+            warn(f'Node {pk} has no structure, so it is skipped', Warning)
+        for key in sorted(node_frames):
+            cell, sites, energy, forces = node_frames[key]
+            if (energy is None) or (not forces):
+                name = f'{pk}:{key}' if key else str(pk)
+                warn(f'Node {name} has no energy or forces, so it is skipped',
+                     Warning)
+                continue
+            frames.append((cell, sites, energy, forces))
+    if not frames:
+        raise ValueError('No valid energy and forces in `nodes`')
+    n_frames = len(frames)
+    cells, sites, energies, forces = zip(*frames)
+    kindnames = [site['kind_name'] for site in sites[0]]
+    data = {
+        'box': np.array(cells).reshape(n_frames, -1),
+        'coord': np.array([[site['position'] for site in one_sites]
+                           for one_sites in sites]).reshape(n_frames, -1),
+        'energy': np.array(energies).reshape(n_frames, -1),
+        'force': np.array(forces).reshape(n_frames, -1)
+    }
+    return kindnames, data
+
+
+def write_datadir(dirname, typeraw, data, set_size=DP_SET_SIZE, dtype=None,
+                  append=False):
+    """Write arrays to a deepmd system, split into `set.NNN`
 
     Args:
-        dirname:
+        dirname (str): directory of deepmd system
+        typeraw (list[int]): type index of each atom
+        data (dict): arrays like {'box': , 'coord': , 'energy': , 'force': },
+            frames should be in the first axis
+        set_size (int): max number of frames in each `set.NNN`
+        dtype (numpy.dtype): dtype of `.npy` files, e.g. np.float32,
+            if None, keep dtype of `data`
+        append (bool): if True and `dirname` is already a deepmd system,
+            add new sets after the existing sets,
+            otherwise start from `set.000`
+
+    Returns:
+        list[str]: directories of sets written
+
+    """
+    type_name = os.path.join(dirname, 'type.raw')
+    first_set_index = 0
+    if append and os.path.exists(type_name):
+        exist_typeraw = np.loadtxt(type_name, dtype=int, ndmin=1)
+        if not np.array_equal(exist_typeraw, typeraw):
+            raise ValueError(f'`type.raw` in {dirname} does not match '
+                             f'types of new frames')
+        exist_set_index = [int(os.path.basename(set_path).split('.')[-1])
+                           for set_path in
+                           glob(os.path.join(dirname, 'set.*'))]
+        if exist_set_index:
+            first_set_index = max(exist_set_index) + 1
+    else:
+        os.makedirs(dirname, exist_ok=True)
+        with open(type_name, 'w') as f:
+            f.write(' '.join(map(str, typeraw)))
+    n_frames = len(data['energy'])
+    set_path_list = []
+    for i, start in enumerate(range(0, n_frames, set_size)):
+        set_path = os.path.join(dirname, f'set.{first_set_index + i:03d}')
+        os.makedirs(set_path)
+        for name, array in data.items():
+            set_array = array[start:start + set_size]
+            if dtype is not None:
+                set_array = set_array.astype(dtype)
+            np.save(os.path.join(set_path, name), set_array)
+        set_path_list.append(set_path)
+    return set_path_list
+
+
+def write_datadir_from_energyworkchain(dirname, nodes, kinds,
+                                       set_size=DP_SET_SIZE, dtype=None,
+                                       append=False):
+    """Write deepmd system from EnergySingleWorkChain
+    or EnergyFarmingWorkChain nodes
+
+    Frames without energy or forces (e.g. failed or unfinished workchains)
+    are skipped with a warning instead of raising, a ValueError is raised
+    only if no frame is valid
+
+    Args:
+        dirname (str): directory of deepmd system
         nodes (list): structure should in node.inputs,
-            energy and forces should in node.outputs
-        kinds:
+            energy and forces should in node.outputs,
+            all structures should have the same kinds order
+        kinds (list): type map of deepmd, e.g. ['H', 'O']
+        set_size (int): max number of frames in each `set.NNN`
+        dtype (numpy.dtype): dtype of `.npy` files, e.g. np.float32
+        append (bool): append new sets to an existing deepmd system
 
     Returns:
-        None
+        list[str]: directories of sets written
 
     """
-    set_path = os.path.join(dirname, 'set.000')
-    os.makedirs(set_path)
-    structures = [node.inputs.structure for node in nodes]
-    n_raw = len(structures)
-    # write type.raw
-    typeraw = [str(kinds.index(kindname)) for kindname in
-               structures[0].get_site_kindnames()]
-    with open(os.path.join(dirname, 'type.raw'), 'w') as f:
-        f.write(' '.join(typeraw))
-    # write box.npy, coord.npy, energy.npy, force.npy
-    box = [structure.cell for structure in structures]
-    coord = [[site.position for site in structure.sites]
-             for structure in structures]
-    energy = [node.outputs.energy.value for node in nodes]
-    force = [node.outputs.forces.get_list() for node in nodes]
-    for name, data in {'box': box, 'coord': coord,
-                       'energy': energy, 'force': force}.items():
-        uniform_data = np.array(data).reshape(n_raw, -1)
-        np.save(os.path.join(set_path, name), uniform_data)
-
-
-def notification_in_dingtalk(webhook, node):
-    """Send messages to dingtalk
+    kindnames, data = get_energyworkchain_arrays(nodes)
+    typeraw = [kinds.index(kindname) for kindname in kindnames]
+    return write_datadir(dirname, typeraw, data, set_size=set_size,
+                         dtype=dtype, append=append)
+
+
+def get_job_info(node):
+    """Get markdown message of a finished job
 
     Args:
-        webhook (str): url webhook of dingtalk robot
         node (aiida.orm.ProcessNode):
             object returned by running or submitting workchain,
             at ecint WorkChain or SingleWorkChain level
 
     Returns:
-        dict: response information after post
+        (str, str): title and markdown text
 
     """
-    headers = {'Content-Type': 'application/json'}
     title = 'Job Info'
     # get structure
     structure = None
@@ -203,9 +419,31 @@ def notification_in_dingtalk(webhook, node):
     text += f'> Job Type: **{node.process_label}**\n'
     text += '>\n'
     text += f'> Job State: **{node.process_state.name}**\n'
+    return title, text
+
+
+def notification_in_dingtalk(webhook, node, timeout=10):
+    """Send messages to dingtalk
+
+    It blocks until the post returns, in workchains,
+    use `ecint.postprocessor.notify.get_notifier` instead
+
+    Args:
+        webhook (str): url webhook of dingtalk robot
+        node (aiida.orm.ProcessNode):
+            object returned by running or submitting workchain,
+            at ecint WorkChain or SingleWorkChain level
+        timeout (float): timeout of post in seconds
+
+    Returns:
+        dict: response information after post
+
+    """
+    headers = {'Content-Type': 'application/json'}
+    title, text = get_job_info(node)
     data = {'msgtype': 'markdown', 'markdown': {'title': title, 'text': text}}
     response = requests.post(url=webhook, headers=headers,
-                             data=json.dumps(data))
+                             data=json.dumps(data), timeout=timeout)
     return response
 
 
@@ -219,25 +457,275 @@ def get_convergence_info_of_band(band_file):
         dict: convergence information of band
 
     """
-
+    parser = BandConvergenceParser()
     with open(band_file) as f:
-        band_info = f.read()
-    rms_displacement = re.findall(r'RMS DISPLACEMENT.*', band_info)
-    max_displacement = re.findall(r'MAX DISPLACEMENT', band_info)
-    rms_force = re.findall(r'RMS FORCE', band_info)
-    max_force = re.findall(r'MAX FORCE', band_info)
-
-    def get_convergence_info_list(convergence_key):
-        return [parse_band_convergence_like_info(info) for info in
-                convergence_key]
-
-    band_convergence_info = {
-        'rms_displacement': get_convergence_info_list(rms_displacement),
-        'max_displacement': get_convergence_info_list(max_displacement),
-        'rms_force': get_convergence_info_list(rms_force),
-        'max_force': get_convergence_info_list(max_force)
-    }
-    return band_convergence_info
+        for block in iter(lambda: f.read(1 << 20), ''):
+            parser.feed(block)
+    parser.feed('\n')
+    return parser.get_convergence_info()
+
+
+class BandConvergenceMonitor(object):
+    def __init__(self, remote_folder, band_file=BAND_NAME):
+        """Follow BAND.out of a running NEB calculation on remote computer
+
+        Only bytes appended since last `update` are transferred,
+        so keep the monitor and call `update` repeatedly
+
+        Args:
+            remote_folder (aiida.orm.RemoteData): remote folder of calculation
+            band_file (str): name of band file in remote folder
+
+        """
+        self.remote_folder = remote_folder
+        self.band_file = band_file
+        self.offset = 0
+        self.parser = BandConvergenceParser()
+
+    def update(self, window=20, tolerance=0.05):
+        """Read new content of band file and get convergence progress
+
+        Args:
+            window (int): see `BandConvergenceParser.is_stalled`
+            tolerance (float): see `BandConvergenceParser.is_stalled`
+
+        Returns:
+            dict: see `BandConvergenceParser.get_progress`
+
+        """
+        band_path = shlex.quote(os.path.join(
+            self.remote_folder.get_remote_path(), self.band_file))
+        # size in bytes is printed first, offset does not depend on decoding
+        command = (f'size=$(wc -c < {band_path}) && echo $size && '
+                   f'tail -c +{self.offset + 1} {band_path} | '
+                   f'head -c $((size > {self.offset} ? '
+                   f'size - {self.offset} : 0))')
+        with self.remote_folder.get_authinfo().get_transport() as transport:
+            retval, stdout, stderr = transport.exec_command_wait(command)
+        if retval == 0:
+            size, text = stdout.split('\n', 1)
+            if int(size) < self.offset:
+                # band file is rewritten, e.g. by a restarted calculation
+                self.offset = 0
+                self.parser = BandConvergenceParser()
+                return self.update(window, tolerance)
+            self.offset = int(size)
+            self.parser.feed(text)
+        return self.parser.get_progress(window, tolerance)
+
+
+# {(uuid of remote folder, band file): monitor}, kept between polls
+_band_monitors = {}
+
+
+def get_neb_progress(node, band_file=BAND_NAME, window=20, tolerance=0.05):
+    """Get convergence progress of the latest NEB calculation under node
+
+    Monitor of each remote folder is kept in this process, so polling
+    again only transfers and parses new content of band file
+
+    Args:
+        node (aiida.orm.ProcessNode): NebWorkChain, NebSingleWorkChain
+            or the CalcJobNode of NEB
+        band_file (str): name of band file in remote folder
+        window (int): see `BandConvergenceParser.is_stalled`
+        tolerance (float): see `BandConvergenceParser.is_stalled`
+
+    Returns:
+        dict: see `BandConvergenceParser.get_progress`
+
+    """
+    calculations = [calculation for calculation in
+                    [node] + list(getattr(node, 'called_descendants', []))
+                    if isinstance(calculation, CalcJobNode) and
+                    'remote_folder' in calculation.outputs]
+    if not calculations:
+        raise ValueError(f'No remote folder of calculation under {node.pk}')
+    calculation = max(calculations, key=lambda x: x.ctime)
+    remote_folder = calculation.outputs.remote_folder
+    key = (remote_folder.uuid, band_file)
+    if key not in _band_monitors:
+        _band_monitors[key] = BandConvergenceMonitor(remote_folder, band_file)
+    return _band_monitors[key].update(window, tolerance)
+
+
+def get_files_in_bundle(transport, remote_path, patterns, localpath):
+    """Retrieve many remote files in one compressed archive
+
+    Files matching `patterns` are packed by `tar` on the remote computer,
+    transferred once and unpacked under `localpath`,
+    instead of opening one transfer for each file
+
+    Args:
+        transport (aiida.transports.Transport): opened transport
+        remote_path (str): remote directory, `patterns` are relative to it
+        patterns (list[str]): shell patterns, e.g. ['*/model_devi.out']
+        localpath (str): local directory to unpack files
+
+    Returns:
+        list[str]: relative paths of retrieved files,
+            raise OSError if failed to pack or transfer files,
+            tarfile.TarError if archive is truncated or corrupt
+
+    """
+    archive_name = f'.ecint_bundle_{uuid4().hex}.tar.gz'
+    remote_archive = os.path.join(remote_path, archive_name)
+    retval, stdout, stderr = transport.exec_command_wait(
+        f'cd {shlex.quote(remote_path)} && '
+        f'tar -czf {archive_name} {" ".join(patterns)}')
+    try:
+        if retval != 0:
+            raise OSError(f'Failed to pack {patterns} in {remote_path}: '
+                          f'{stderr}')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            local_archive = os.path.join(tmpdir, archive_name)
+            transport.getfile(remote_archive, local_archive)
+            os.makedirs(localpath, exist_ok=True)
+            try:
+                with tarfile.open(local_archive) as tar:
+                    members = [member for member in tar.getmembers()
+                               if member.isfile() and
+                               not os.path.isabs(member.name) and
+                               '..' not in member.name.split('/')]
+                    tar.extractall(localpath, members=members)
+            except (EOFError, zlib.error) as e:
+                # truncated or corrupt gzip stream
+                raise tarfile.ReadError(f'Corrupt archive of {patterns} in '
+                                        f'{remote_path}: {e}') from e
+    finally:
+        transport.exec_command_wait(f'rm -f {shlex.quote(remote_archive)}')
+    return [member.name for member in members]
+
+
+LAST_FRAME_MARK = '#ECINT_FILE'
+
+
+def get_last_frames_on_remote(transport, remote_path, pattern):
+    """Get text of the last frame of xyz trajectories on remote computer
+
+    The last frame of each file is cut by `tail` on the remote computer and
+    all frames are returned in one command, the whole trajectories are
+    never transferred
+
+    Args:
+        transport (aiida.transports.Transport): opened transport
+        remote_path (str): remote directory, `pattern` is relative to it
+        pattern (str): shell pattern, e.g. '*-pos-Replica_nr_*-1.xyz'
+
+    Returns:
+        dict: {filename: text of last frame in xyz format}
+
+    """
+    retval, stdout, stderr = transport.exec_command_wait(
+        f'cd {shlex.quote(remote_path)} && '
+        f'for f in {pattern}; do '
+        f'[ -f "$f" ] || continue; '
+        f'n=$(head -n 1 "$f"); '
+        f'echo "{LAST_FRAME_MARK} $f"; '
+        f'tail -n $((n + 2)) "$f"; '
+        f'done')
+    if retval != 0:
+        raise OSError(f'Failed to get last frames of {pattern} '
+                      f'in {remote_path}: {stderr}')
+    return split_last_frames(stdout)
+
+
+def split_last_frames(output):
+    """Split output of `get_last_frames_on_remote` by file
+
+    Args:
+        output (str): frames, each one starts with a mark line
+
+    Returns:
+        dict: {filename: text of last frame}
+
+    """
+    frames = {}
+    filename = None
+    for line in output.splitlines(keepends=True):
+        if line.startswith(LAST_FRAME_MARK + ' '):
+            filename = line[len(LAST_FRAME_MARK) + 1:].strip()
+            frames[filename] = []
+        elif filename is not None:
+            frames[filename].append(line)
+    return {filename: ''.join(lines) for filename, lines in frames.items()}
+
+
+def screen_model_devi_on_remote(transport, remote_path, filenames,
+                                skip_images, force_low_limit, force_high_limit,
+                                energy_low_limit, energy_high_limit,
+                                bins=MODEL_DEVI_BINS, xmax=MODEL_DEVI_XMAX,
+                                python='python3'):
+    """Screen model_devi.out by a script on remote computer
+
+    Only index arrays and histogram counts are transferred back,
+    instead of whole model_devi.out files
+
+    Args:
+        transport (aiida.transports.Transport): opened transport
+        remote_path (str): remote directory, `filenames` are relative to it
+        filenames (list[str]): e.g. ['0/model_devi.out', '1/model_devi.out']
+        skip_images (int): see `parse_model_devi_index`
+        force_low_limit (float): see `parse_model_devi_index`
+        force_high_limit (float): see `parse_model_devi_index`
+        energy_low_limit (float): see `parse_model_devi_index`
+        energy_high_limit (float): see `parse_model_devi_index`
+        bins (int): number of bins of max_devi_f histogram
+        xmax (float): upper edge of max_devi_f histogram
+        python (str): python executable on remote computer
+
+    Returns:
+        dict: {filename: {'candidate': , 'candidate_devi_f': , 'failed': ,
+                          'accurate': , 'counts': , 'total': }},
+            index arrays are numpy arrays as `parse_model_devi_index`
+
+    Raises:
+        OSError: if the script fails on remote computer
+        ValueError: if output of the script is not valid json
+
+    """
+    script_name = f'.ecint_screen_{uuid4().hex}.py'
+    remote_script = os.path.join(remote_path, script_name)
+    transport.putfile(screen_model_devi.__file__, remote_script)
+    try:
+        retval, stdout, stderr = transport.exec_command_wait(
+            f'cd {shlex.quote(remote_path)} && '
+            f'{python} {script_name} --skip-images {skip_images} '
+            f'--force-limits {force_low_limit} {force_high_limit} '
+            f'--energy-limits {energy_low_limit} {energy_high_limit} '
+            f'--bins {bins} --xmax {xmax} '
+            f'{" ".join(map(shlex.quote, filenames))}')
+    finally:
+        transport.remove(remote_script)
+    if retval != 0:
+        raise OSError(f'Failed to screen model_devi.out in {remote_path}: '
+                      f'{stderr}')
+    results = json.loads(stdout)
+    for result in results.values():
+        for key in ('candidate', 'failed', 'accurate'):
+            result[key] = np.array(result[key], dtype=int)
+        result['candidate_devi_f'] = np.array(result['candidate_devi_f'],
+                                              dtype=float)
+    return results
+
+
+def get_energy_info(filename):
+    """Get total energy from cp2k output
+
+    Args:
+        filename (str or file-like object): cp2k output
+
+    Returns:
+        float or None: energy in a.u., None if not found
+
+    """
+    if isinstance(filename, str):
+        with open(filename) as f:
+            output = f.read()
+    else:
+        output = filename.read()
+    energy_info = re.findall(r'ENERGY\|\s+Total FORCE_EVAL.*:\s+(\S+)', output)
+    return float(energy_info[-1]) if energy_info else None
 
 
 def get_forces_info(filename):
@@ -0,0 +1,189 @@
+import numpy as np
+from ase import units
+from ase.geometry import find_mic
+
+# sqrt(eV / (Å^2 amu)) to hbar * omega in eV, same as `ase.vibrations`
+_HESSIAN_TO_EV = units._hbar * 1e10 / np.sqrt(units._e * units._amu)
+# modes above -IMAGINARY_TOLERANCE cm^-1 are numerical noise of
+# finite difference, not counted as imaginary
+IMAGINARY_TOLERANCE = 50.
+
+
+def get_active_atoms(atoms, indices=None, tags=None, reference=None,
+                     n_moving=1, cutoff=None):
+    """Select atoms to displace in partial hessian, union of all selections
+
+    Args:
+        atoms (ase.Atoms): structure, e.g. transition state
+        indices (list[int]): indices of active atoms
+        tags (list[int]): atoms with these tags are active
+        reference (ase.Atoms): e.g. reactant, `n_moving` atoms moving most
+            from `reference` to `atoms` are active
+        n_moving (int): number of moving atoms from `reference`
+        cutoff (float): atoms within `cutoff` (Å) of moving atoms,
+            or of `indices` if no `reference`, are also active
+
+    Returns:
+        list[int]: sorted indices of active atoms,
+            all atoms if nothing is selected
+
+    """
+    active = set(indices or [])
+    if tags:
+        active.update(np.flatnonzero(np.isin(atoms.get_tags(), tags)))
+    centers = set(indices or [])
+    if reference is not None:
+        moves, _ = find_mic(
+            atoms.get_positions() - reference.get_positions(),
+            atoms.cell, atoms.pbc)
+        moving = np.argsort(-np.linalg.norm(moves, axis=1))[:n_moving]
+        active.update(moving)
+        centers = set(moving)
+    if cutoff and centers:
+        for center in centers:
+            distances = atoms.get_distances(center, range(len(atoms)),
+                                            mic=True)
+            active.update(np.flatnonzero(distances <= cutoff))
+    if not active:
+        return list(range(len(atoms)))
+    return sorted(int(i) for i in active)
+
+
+def get_displacements(n_atoms, delta=0.01, active=None):
+    """Displacements of central finite difference
+
+    Args:
+        n_atoms (int): number of atoms
+        delta (float): displacement in Å
+        active (list[int]): only displace these atoms, all if None
+
+    Returns:
+        list[tuple]: (atom index, axis, signed displacement),
+            +delta and -delta of each degree of freedom are adjacent
+
+    """
+    if active is None:
+        active = range(n_atoms)
+    return [(atom, axis, sign * delta)
+            for atom in active
+            for axis in range(3)
+            for sign in (1, -1)]
+
+
+def get_displaced_atoms(atoms, displacements):
+    """Displaced structures
+
+    Args:
+        atoms (ase.Atoms): reference structure
+        displacements (list[tuple]): from `get_displacements`
+
+    Returns:
+        list[ase.Atoms]
+
+    """
+    displaced_atoms = []
+    for atom, axis, dx in displacements:
+        displaced = atoms.copy()
+        positions = displaced.get_positions()
+        positions[atom, axis] += dx
+        displaced.set_positions(positions)
+        displaced_atoms.append(displaced)
+    return displaced_atoms
+
+
+def get_hessian(displacements, forces):
+    """Hessian from forces of displaced structures
+
+    Args:
+        displacements (list[tuple]): from `get_displacements`
+        forces (list): forces of each displaced structure, in eV/Å,
+            shape (n_displacements, n_atoms, 3)
+
+    Returns:
+        numpy.ndarray: symmetric hessian in eV/Å^2 of displaced atoms,
+            in order of `displacements`, shape (3 * n_active, 3 * n_active)
+
+    """
+    active = list(dict.fromkeys(atom for atom, _, _ in displacements))
+    # only forces on displaced atoms are in partial hessian
+    forces = np.asarray(forces, dtype=float)[:, active, :]
+    n_dof = len(active) * 3
+    hessian = np.zeros((n_dof, n_dof))
+    forces = forces.reshape(len(displacements), n_dof)
+    for (atom, axis, dx), plus, (_, _, _dx), minus in zip(
+            displacements[::2], forces[::2],
+            displacements[1::2], forces[1::2]):
+        # H_ij = -dF_j / dx_i
+        hessian[active.index(atom) * 3 + axis] = -(plus - minus) / (dx - _dx)
+    return (hessian + hessian.T) / 2
+
+
+def get_rigid_modes(positions, masses, rotations=True):
+    """Orthonormal translations and rotations in mass weighted coordinates
+
+    Args:
+        positions (numpy.ndarray): positions of atoms in Å, shape (n, 3)
+        masses (list[float]): masses of atoms in amu
+        rotations (bool): include rotations, not for periodic structures
+
+    Returns:
+        numpy.ndarray: shape (3 * n, n_modes), 3 translations and
+            3 rotations, 2 rotations for linear molecule
+
+    """
+    positions = np.asarray(positions, dtype=float)
+    masses = np.asarray(masses, dtype=float)
+    sqrt_masses = np.sqrt(masses)
+    modes = []
+    for axis in np.eye(3):
+        modes.append(np.outer(sqrt_masses, axis).ravel())
+    if rotations:
+        center = masses @ positions / masses.sum()
+        for axis in np.eye(3):
+            modes.append((np.cross(positions - center, axis) *
+                          sqrt_masses[:, None]).ravel())
+    u, s, _ = np.linalg.svd(np.array(modes).T, full_matrices=False)
+    return u[:, s > 1e-8 * s.max()]
+
+
+def get_frequencies(hessian, masses, positions=None, pbc=False):
+    """Vibrational frequencies from hessian
+
+    Args:
+        hessian (numpy.ndarray): hessian in eV/Å^2
+        masses (list[float]): masses of atoms in amu,
+            only atoms in hessian for partial hessian
+        positions (numpy.ndarray): positions of atoms in Å, if set,
+            translations and rotations are projected out, and their
+            frequencies are zero, only for full hessian
+        pbc (bool): periodic structure, only translations are projected out
+
+    Returns:
+        numpy.ndarray: frequencies in cm^-1, sorted,
+            imaginary frequencies are negative
+
+    """
+    inv_sqrt_masses = np.repeat(np.asarray(masses, dtype=float) ** -0.5, 3)
+    mass_weighted = hessian * np.outer(inv_sqrt_masses, inv_sqrt_masses)
+    if positions is not None:
+        rigid_modes = get_rigid_modes(positions, masses, rotations=not pbc)
+        projector = np.eye(len(mass_weighted)) - rigid_modes @ rigid_modes.T
+        mass_weighted = projector @ mass_weighted @ projector
+    eigenvalues = np.linalg.eigvalsh(mass_weighted)
+    energies = _HESSIAN_TO_EV * np.sign(eigenvalues) * \
+        np.sqrt(np.abs(eigenvalues))
+    return energies / units.invcm
+
+
+def count_imaginary(frequencies, tolerance=IMAGINARY_TOLERANCE):
+    """Number of imaginary frequencies
+
+    Args:
+        frequencies (numpy.ndarray): from `get_frequencies`, in cm^-1
+        tolerance (float): frequencies above -tolerance are not counted
+
+    Returns:
+        int
+
+    """
+    return int(np.sum(np.asarray(frequencies) < -tolerance))
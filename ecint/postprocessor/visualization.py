@@ -3,13 +3,92 @@ from math import ceil
 
 import matplotlib.pyplot as plt
 import numpy as np
-from aiida.orm import load_node
+from aiida.common.links import LinkType
+from aiida.orm import Node, QueryBuilder
+from aiida.orm.utils.links import LinkPair
 from aiida.tools.visualization import Graph
+from aiida.tools.visualization.graph import default_link_styles
 
+from ecint.postprocessor.parse import load_model_devi
+from ecint.postprocessor.screen_model_devi import MODEL_DEVI_BINS, \
+    MODEL_DEVI_XMAX
 
-def get_provenance_graph(pk, level='minimal',
-                         annotate_links=None, graph_attr=None):
-    """Generate aiida provenance graph for a node
+
+def _query_links(pks, incoming=True, link_types=None):
+    """Query incoming or outgoing links of many nodes by one QueryBuilder
+
+    Args:
+        pks (Iterable[int]): node pks
+        incoming (bool): query incoming links if True, else outgoing links
+        link_types (list[str]): e.g. ['call_calc', 'call_work'],
+            all link types if None
+
+    Returns:
+        list[tuple]: (source node, target node, LinkPair)
+
+    """
+    pks = list(pks)
+    if not pks:
+        return []
+    qb = QueryBuilder()
+    qb.append(Node, filters={'id': {'in': pks}}, project=['*'], tag='node')
+    relationship = ({'with_outgoing': 'node'} if incoming
+                    else {'with_incoming': 'node'})
+    qb.append(Node, project=['*'], tag='neighbour', edge_tag='link',
+              edge_filters={'type': {'in': link_types}} if link_types else {},
+              edge_project=['type', 'label'], **relationship)
+    links = []
+    for result in qb.iterdict():
+        node, neighbour = result['node']['*'], result['neighbour']['*']
+        link_pair = LinkPair(LinkType(result['link']['type']),
+                             result['link']['label'])
+        if incoming:
+            links.append((neighbour, node, link_pair))
+        else:
+            links.append((node, neighbour, link_pair))
+    return links
+
+
+def _get_called_pks(pks):
+    return sorted({target.pk for _, target, _ in
+                   _query_links(pks, incoming=False,
+                                link_types=['call_calc', 'call_work'])})
+
+
+def _add_links(graph, links, annotate_links=None):
+    """Add links to graph, same as `Graph.add_incoming/add_outgoing`
+    """
+    for source, target, link_pair in links:
+        graph.add_node(source)
+        graph.add_node(target)
+        style = default_link_styles(
+            link_pair,
+            add_label=annotate_links in ['label', 'both'],
+            add_type=annotate_links in ['type', 'both'])
+        graph.add_edge(source, target, link_pair, style=style)
+
+
+def _add_level(graph, pks, annotate_links=None,
+               incoming_types=None, outgoing_types=None):
+    """Add incoming and outgoing links of one level of processes
+    """
+    _add_links(graph, _query_links(pks, incoming=True,
+                                   link_types=incoming_types),
+               annotate_links)
+    _add_links(graph, _query_links(pks, incoming=False,
+                                   link_types=outgoing_types),
+               annotate_links)
+
+
+def build_provenance_graph(pk, level='minimal',
+                           annotate_links=None, graph_attr=None):
+    """Build aiida provenance graph for a node, without rendering it
+
+    Nodes and links of each level of called processes are queried in bulk,
+    instead of loading every node. In level 'medium', links of all processes
+    called by each level are added, e.g. every restart of a base restart
+    workchain is linked to its code, while only links of the first called
+    process of each node were added before
 
     Args:
         pk: node pk
@@ -20,63 +99,43 @@ def get_provenance_graph(pk, level='minimal',
             more information: https://www.graphviz.org/doc/info/attrs.html
 
     Returns:
-        None
+        aiida.tools.visualization.Graph: provenance graph
 
     """
 
     if graph_attr is None:
         graph_attr = {"rankdir": "TR"}
     graph = Graph(graph_attr=graph_attr)
-    if level == 'minimal':
-        called_list = [node.pk for node in load_node(pk).called]
-        graph.add_incoming(pk)
-        graph.add_outgoing(pk)
-        for called_pk in called_list:
-            graph.add_incoming(called_pk)
-            graph.add_outgoing(called_pk, link_types='return')
-    elif level == 'low':
-        if annotate_links is None:
+    if level in ('minimal', 'low'):
+        if (level == 'low') and (annotate_links is None):
             annotate_links = 'label'
-        called_list = [node.pk for node in load_node(pk).called]
-        graph.add_incoming(pk, annotate_links=annotate_links)
-        graph.add_outgoing(pk, annotate_links=annotate_links)
-        for called_pk in called_list:
-            graph.add_incoming(called_pk, annotate_links=annotate_links)
-            graph.add_outgoing(called_pk, annotate_links=annotate_links,
-                               link_types='return')
+        graph.add_node(pk)
+        called_list = _get_called_pks([pk])
+        _add_level(graph, [pk], annotate_links)
+        _add_level(graph, called_list, annotate_links,
+                   outgoing_types=['return'])
     elif level == 'medium':
         if annotate_links is None:
             annotate_links = 'label'
-        singleworkchain_list = [node.pk for node in load_node(pk).called]
-        baseworkchain_list = [node.pk for node in
-                              [load_node(pk).called[0] for pk in
-                               singleworkchain_list]]
-        calculation_list = [node.pk for node in
-                            [load_node(pk).called[0] for pk in
-                             baseworkchain_list]]
-        code_pk = load_node(
-            calculation_list[0]).get_incoming().get_node_by_label('code')
-        graph.add_incoming(pk, annotate_links=annotate_links)
-        graph.add_outgoing(pk, annotate_links=annotate_links)
-        for node_pk in singleworkchain_list:
-            graph.add_incoming(node_pk, annotate_links=annotate_links)
-            graph.add_outgoing(node_pk, annotate_links=annotate_links)
-
-        for node_pk in baseworkchain_list:
-            graph.add_incoming(node_pk, annotate_links=annotate_links,
-                               link_types='call_work')
-            graph.add_outgoing(node_pk, annotate_links=annotate_links,
-                               link_types='call_calc')
-
-        for node_pk in calculation_list:
-            graph.add_incoming(node_pk, annotate_links=annotate_links,
-                               link_types='call_calc')
-            graph.add_outgoing(node_pk, annotate_links=annotate_links,
-                               link_types='return')
-
-        graph.add_node(code_pk)
-        for node_pk in calculation_list:
-            graph.add_edge(code_pk, node_pk)
+        singleworkchain_list = _get_called_pks([pk])
+        baseworkchain_list = _get_called_pks(singleworkchain_list)
+        calculation_list = _get_called_pks(baseworkchain_list)
+        graph.add_node(pk)
+        _add_level(graph, [pk], annotate_links)
+        _add_level(graph, singleworkchain_list, annotate_links)
+        _add_level(graph, baseworkchain_list, annotate_links,
+                   incoming_types=['call_work'],
+                   outgoing_types=['call_calc'])
+        _add_level(graph, calculation_list, annotate_links,
+                   incoming_types=['call_calc'],
+                   outgoing_types=['return'])
+        # codes of calculations
+        for code, calculation, link_pair in \
+                _query_links(calculation_list, incoming=True,
+                             link_types=['input_calc']):
+            if link_pair.link_label == 'code':
+                graph.add_node(code)
+                graph.add_edge(code, calculation)
     elif level == 'high':
         if annotate_links is None:
             annotate_links = 'both'
@@ -85,35 +144,162 @@ def get_provenance_graph(pk, level='minimal',
             include_process_inputs=True,
             annotate_links=annotate_links,
         )
+    return graph
+
+
+def get_provenance_graph(pk, level='minimal',
+                         annotate_links=None, graph_attr=None):
+    """Generate aiida provenance graph for a node
+
+    Args:
+        pk: node pk
+        level: 'minimal', 'low', 'medium', 'high'
+        annotate_links: 'label', 'type', 'both',
+            description of edges of provenance graph
+        graph_attr: attribute for graphviz,
+            more information: https://www.graphviz.org/doc/info/attrs.html
+
+    Returns:
+        None
+
+    """
+    graph = build_provenance_graph(pk, level, annotate_links, graph_attr)
     graph.graphviz.render(f'provenance_graph_{level}', format='png')
 
 
 def plot_energy_curve(trajectory, output_file='potential_energy_path.png'):
+    plot_energy_path(trajectory.symbols, trajectory.get_array('energy'),
+                     output_file=output_file)
+
+
+def plot_energy_path(symbols, energy, output_file='potential_energy_path.png'):
+    """Plot potential energy path
+
+    Args:
+        symbols (list[str]): chemical symbols of structure
+        energy (numpy.ndarray): energy of each image
+        output_file (str): name of output figure
+
+    Returns:
+        None
+
+    """
     fig, ax = plt.subplots(figsize=[8, 6])
     chemical_formula = ''.join([f'{symbol}_{{{num}}}' for symbol, num in
-                                Counter(trajectory.symbols).items()])
+                                Counter(symbols).items()])
     ax.set_title(f'Potential Energy Path for ${chemical_formula}$', fontsize=20)
     ax.set_xlabel('NEB Images', fontsize=18)
     ax.set_ylabel('Potential Energy (eV)', fontsize=18)
-    energy = trajectory.get_array('energy')
     ax.plot(range(len(energy)), energy)
     fig.tight_layout()
     fig.savefig(output_file)
+    plt.close(fig)
+
+
+class FixedBinHistogram(object):
+    """Histogram with fixed bins, accumulated chunk by chunk
+
+    Args:
+        bins (int): number of bins
+        value_range (tuple): (min, max) of bins,
+            values out of range are only counted in `total`
+
+    """
+
+    def __init__(self, bins=MODEL_DEVI_BINS, value_range=(0, MODEL_DEVI_XMAX)):
+        self.edges = np.linspace(value_range[0], value_range[1], bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.total = 0
+
+    def update(self, values):
+        values = np.asarray(values)
+        self.counts += np.histogram(values, bins=self.edges)[0]
+        self.total += values.size
+
+    def update_counts(self, counts, total):
+        """Accumulate counts histogrammed elsewhere with the same bins
+        """
+        self.counts += np.asarray(counts, dtype=np.int64)
+        self.total += total
+
+    def update_from_model_devi(self, model_devi_name, skip_images=0,
+                               chunk_size=1000000):
+        """Accumulate max_devi_f of a model_devi.out
+
+        Args:
+            model_devi_name (str): path of model_devi.out
+            skip_images (int): steps smaller than it are skipped
+            chunk_size (int): number of rows read into memory at once
+
+        Returns:
+            None
+
+        """
+        model_devi = load_model_devi(model_devi_name)
+        for start in range(0, len(model_devi), chunk_size):
+            chunk = np.asarray(model_devi[start:start + chunk_size])
+            self.update(chunk[chunk[:, 0] >= skip_images][:, 2])
+
+    @property
+    def frequency(self):
+        if self.total == 0:
+            return np.zeros_like(self.counts, dtype=float)
+        return self.counts / self.total
 
 
 def get_model_devi_distribution(model_devi_list, force_low_limit,
                                 force_high_limit, skip_images=0,
                                 title='Distribution of force deviation',
-                                filename='force_devi_distribution.jpg'):
-    force = []
-    fig, ax = plt.subplots()
+                                filename='force_devi_distribution.jpg',
+                                bins=MODEL_DEVI_BINS, xmax=MODEL_DEVI_XMAX):
+    """Plot distribution of max_devi_f in model_devi.out files
+
+    Args:
+        model_devi_list (list[str]): paths of model_devi.out
+        force_low_limit (float): lower limit of candidate, dashed line
+        force_high_limit (float): upper limit of candidate, dashed line
+        skip_images (int): steps smaller than it are skipped
+        title (str): title of figure
+        filename (str): name of output figure
+        bins (int): number of bins in [0, xmax]
+        xmax (float): upper edge of histogram
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): frequency and edges of fixed bins,
+            like the first two values returned by `plt.hist`, but bins no
+            longer depend on number of steps
+
+    """
+    histogram = FixedBinHistogram(bins=bins, value_range=(0, xmax))
     for model_devi_name in model_devi_list:
-        model_devi = np.loadtxt(model_devi_name)
-        force.extend(model_devi[model_devi[:, 0] >= skip_images][:, 4])
-    hb = plt.hist(force, bins=len(force),
-                  weights=np.ones_like(force) / len(force))
-    xmax, ymax = 5, max(hb[0]) * 1.1
-    ax.set_xlim(0, xmax)
+        histogram.update_from_model_devi(model_devi_name, skip_images)
+    return plot_model_devi_distribution(histogram, force_low_limit,
+                                        force_high_limit, title, filename)
+
+
+def plot_model_devi_distribution(histogram, force_low_limit,
+                                 force_high_limit,
+                                 title='Distribution of force deviation',
+                                 filename='force_devi_distribution.jpg'):
+    """Plot distribution of force deviation from histogram counts
+
+    Args:
+        histogram (FixedBinHistogram): accumulated histogram
+        force_low_limit (float): lower limit of candidate, dashed line
+        force_high_limit (float): upper limit of candidate, dashed line
+        title (str): title of figure
+        filename (str): name of output figure
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): frequency and edges of bins
+
+    """
+    frequency = histogram.frequency
+    fig, ax = plt.subplots()
+    # only reduced counts are passed to matplotlib
+    ax.hist(histogram.edges[:-1], bins=histogram.edges, weights=frequency)
+    ymax = (frequency.max() * 1.1) or 1
+    ax.set_xlim(0, histogram.edges[-1])
     ax.set_ylim(0, ymax)
     ax.vlines(force_low_limit, 0, ymax, linestyles='dashed')
     ax.vlines(force_high_limit, 0, ymax, linestyles='dashed')
@@ -122,7 +308,8 @@ def get_model_devi_distribution(model_devi_list, force_low_limit,
     ax.set_title(title)
     fig.tight_layout()
     fig.savefig(filename)
-    return hb[:-1]
+    plt.close(fig)
+    return frequency, histogram.edges
 
 
 def get_learning_curve(lcurve_list, filename='force_learning_curve.jpg'):
@@ -135,3 +322,4 @@ def get_learning_curve(lcurve_list, filename='force_learning_curve.jpg'):
         plt.plot(batch, f_train, label='train')
         plt.legend()
     plt.savefig(filename)
+    plt.close()
@@ -1,16 +1,24 @@
 from abc import ABCMeta, abstractmethod
+from copy import deepcopy
 
-from aiida.orm import Code, Dict, StructureData
+import numpy as np
+
+from aiida.common.hashing import make_hash
+from aiida.orm import Code, Dict, Int, Str, StructureData
+from aiida.plugins import CalculationFactory
 from aiida_cp2k.workchains import Cp2kBaseWorkChain
 from aiida_deepmd.calculations.dp import DpCalculation
 from aiida_lammps.calculations.lammps.template import BatchTemplateCalculation
 from ase import Atoms
 
-from ecint.preprocessor.utils import get_procs_per_node_from_code_name, \
-    load_machine, uniform_neb
+from ecint.calculations import DPPackCalculation, LammpsPackCalculation
+from ecint.preprocessor.utils import canonicalize_parameters, \
+    get_procs_per_node_from_code_name, load_machine, uniform_neb
 
 __all__ = ['EnergyPreprocessor', 'GeooptPreprocessor', 'NebPreprocessor',
-           'FrequencyPreprocessor', 'DPPreprocessor', 'QBCPreprocessor']
+           'FrequencyPreprocessor', 'EnergyFarmingPreprocessor',
+           'DPPreprocessor', 'DPPackPreprocessor', 'QBCPreprocessor',
+           'QBCPackPreprocessor']
 
 
 def set_machine(builder, restrict_machine, isslurm=False):
@@ -95,19 +103,75 @@ class Cp2kPreprocessor(Preprocessor):
         set_machine(_builder['cp2k'], self.machine)
         return _builder
 
+    @staticmethod
+    def get_cache_key(builder):
+        """Hash of inputs which decide results of calculation
+
+        Resources of machine are not included
+
+        Args:
+            builder (aiida.engine.processes.builder.ProcessBuilder):
+                builder of Cp2kBaseWorkChain
+
+        Returns:
+            str
+
+        """
+        cp2k = builder.cp2k
+        settings = cp2k.get('settings')
+        return make_hash({
+            'process': Cp2kBaseWorkChain.__name__,
+            'code': cp2k.code.uuid,
+            'structure': canonicalize_parameters(cp2k.structure.attributes),
+            'parameters': canonicalize_parameters(cp2k.parameters.get_dict()),
+            'settings': (canonicalize_parameters(settings.get_dict())
+                         if settings is not None else {})
+        })
+
+
+class EnergyFarmingPreprocessor(Preprocessor):
+    def __init__(self, inpclass, restrict_machine=None):
+        super(EnergyFarmingPreprocessor, self).__init__(inpclass,
+                                                        restrict_machine)
+        self.files = inpclass.files
+
+    @property
+    def builder(self):
+        # one Cp2kCalculation for all jobs, no structure in master input
+        _builder = CalculationFactory('cp2k').get_builder()
+        _builder.parameters = self.parameters
+        _builder.file = self.files
+        _builder.settings = Dict(
+            dict={'additional_retrieve_list': ["job_*.out"]})
+
+        set_machine(_builder, self.machine)
+        return _builder
+
 
 class DPPreprocessor(Preprocessor):
+    # input of DpCalculation, frozen model to initialise training from
+    INIT_MODEL_PORT = 'init_model'
+
     def __init__(self, inpclass, restrict_machine=None):
         super(DPPreprocessor, self).__init__(inpclass, restrict_machine)
         self.datadirs = inpclass.datadirs
         self.kinds = inpclass.kinds
         self.descriptor_sel = inpclass.descriptor_sel
+        self.init_model = inpclass.init_model
+
+    @classmethod
+    def support_init_model(cls):
+        """Whether installed DpCalculation can initialise from a model
+        """
+        return cls.INIT_MODEL_PORT in DpCalculation.spec().inputs
 
     @property
     def builder(self):
         _builder = DpCalculation.get_builder()
         if isinstance(self.datadirs, list):
             _builder.datadirs = self.datadirs
+        if self.init_model is not None:
+            _builder[self.INIT_MODEL_PORT] = self.init_model
 
         # place the input parameters
         _builder.loss = Dict(dict=self.parameters['loss'])
@@ -120,11 +184,61 @@ class DPPreprocessor(Preprocessor):
         return _builder
 
 
+class DPPackPreprocessor(DPPreprocessor):
+    # seeds of deepmd input, different for every model
+    SEED_KEYS = [('model', 'descriptor', 'seed'),
+                 ('model', 'fitting_net', 'seed'),
+                 ('training', 'seed')]
+
+    def __init__(self, inpclass, restrict_machine=None, num_models=4,
+                 dp_command='dp'):
+        super(DPPackPreprocessor, self).__init__(inpclass, restrict_machine)
+        self.num_models = num_models
+        self.dp_command = dp_command
+
+    def get_member_parameters(self):
+        """Parameters of each model, only seeds are different
+
+        Returns:
+            dict: {'member_{i}': aiida.orm.Dict}
+
+        """
+        members = {}
+        for i in range(self.num_models):
+            parameters = deepcopy(self.parameters.get_dict())
+            for keys in self.SEED_KEYS:
+                section = parameters
+                for key in keys[:-1]:
+                    section = section.setdefault(key, {})
+                section[keys[-1]] = int(np.random.randint(10000000))
+            members[f'member_{i}'] = Dict(dict=parameters)
+        return members
+
+    @property
+    def builder(self):
+        _builder = DPPackCalculation.get_builder()
+        _builder.datadirs = self.datadirs
+        _builder.parameters = self.get_member_parameters()
+        # models are distributed to GPUs of machine in turn
+        _builder.ngpu = Int(self.machine.get('ngpu', 1))
+        _builder.dp_command = Str(self.dp_command)
+        if self.init_model is not None:
+            assert len(self.init_model) == self.num_models
+            _builder.init_models = {f'member_{i}': model for i, model
+                                    in enumerate(self.init_model)}
+
+        set_machine(_builder, self.machine, isslurm=True)
+        return _builder
+
+
 class QBCPreprocessor(Preprocessor):
-    def __init__(self, inpclass, restrict_machine=None):
+    def __init__(self, inpclass, restrict_machine=None,
+                 retrieve_model_devi=True):
         super(QBCPreprocessor, self).__init__(inpclass, restrict_machine)
         self.structures = inpclass.structures
         self.kinds = inpclass.kinds
+        # if False, model_devi.out is screened on remote and not retrieved
+        self.retrieve_model_devi = retrieve_model_devi
 
     @property
     def builder(self):
@@ -134,8 +248,40 @@ class QBCPreprocessor(Preprocessor):
         _builder.template = self.parameters['template']
         _builder.variables = self.parameters['variables']
         _builder.file = self.parameters['file']
+        additional_retrieve_list = (['*/model_devi.out']
+                                    if self.retrieve_model_devi else [])
         _builder.settings = Dict(
-            dict={'additional_retrieve_list': ['*/model_devi.out']})
+            dict={'additional_retrieve_list': additional_retrieve_list})
+
+        set_machine(_builder, self.machine, isslurm=True)
+        return _builder
+
+
+class QBCPackPreprocessor(QBCPreprocessor):
+    def __init__(self, inpclass, restrict_machine=None,
+                 retrieve_model_devi=True, parallelism=1,
+                 lmp_command='lmp'):
+        super(QBCPackPreprocessor, self).__init__(
+            inpclass, restrict_machine, retrieve_model_devi)
+        self.parallelism = parallelism
+        self.lmp_command = lmp_command
+
+    @property
+    def builder(self):
+        _builder = LammpsPackCalculation.get_builder()
+        _builder.structures = self.structures
+        _builder.kinds = self.kinds
+        with open(self.parameters['template']) as f:
+            _builder.template = Str(f.read())
+        _builder.variables = Dict(dict=self.parameters['variables'])
+        _builder.file = self.parameters['file']
+        additional_retrieve_list = (['*/model_devi.out']
+                                    if self.retrieve_model_devi else [])
+        _builder.settings = Dict(
+            dict={'additional_retrieve_list': additional_retrieve_list})
+        _builder.ngpu = Int(self.machine.get('ngpu', 1))
+        _builder.parallelism = Int(self.parallelism)
+        _builder.lmp_command = Str(self.lmp_command)
 
         set_machine(_builder, self.machine, isslurm=True)
         return _builder
@@ -160,11 +306,22 @@ class GeooptPreprocessor(Cp2kPreprocessor):
 
 
 class NebPreprocessor(Cp2kPreprocessor):
+    # any number of replicas
+    REPLICA_PATTERN = '*-pos-Replica_nr_*-1.xyz'
+
+    def __init__(self, inpclass, restrict_machine=None,
+                 retrieve_replicas=True):
+        super(NebPreprocessor, self).__init__(inpclass, restrict_machine)
+        # if False, last frames of replicas are extracted on remote
+        self.retrieve_replicas = retrieve_replicas
+
     @property
     def builder(self):
         builder = super(NebPreprocessor, self).builder
+        additional_retrieve_list = ([self.REPLICA_PATTERN]
+                                    if self.retrieve_replicas else [])
         builder.cp2k.settings = Dict(
-            dict={'additional_retrieve_list': ["*-pos-Replica_nr_?-1.xyz"]})
+            dict={'additional_retrieve_list': additional_retrieve_list})
         # uniform_neb(self.parameters.attributes, self.machine)
         return builder
 
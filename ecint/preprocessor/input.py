@@ -1,3 +1,4 @@
+import io
 import os
 from copy import deepcopy
 from dataclasses import dataclass
@@ -12,7 +13,8 @@ from ecint.preprocessor.utils import load_config, update_dict
 from ecint.workflow.units import CONFIG_DIR
 
 __all__ = ['EnergyInputSets', 'GeooptInputSets', 'NebInputSets',
-           'FrequencyInputSets', 'DPInputSets', 'QBCInputSets']
+           'FrequencyInputSets', 'EnergyFarmingInputSets', 'DPInputSets',
+           'QBCInputSets']
 
 
 def make_tag_config(init_config, typemap):
@@ -260,17 +262,128 @@ class FrequencyInputSets(UnitsInputSets):
                                     "PRINT_LEVEL": "MEDIUM"}})
 
 
+class EnergyFarmingInputSets(object):
+    """Energy and forces of many structures in one cp2k FARMING run
+
+    Each structure is a job with its own input file `job_{i}.inp`,
+    coordinate file `job_{i}.xyz` and output file `job_{i}.out`
+
+    Args:
+        structures (dict): {key: aiida.orm.StructureData}
+        config (str or dict): input base config of energy
+        kind_section (KindSection or list): elements kind section
+        ngroups (int): number of jobs running at the same time,
+            resources are split into groups
+
+    """
+    JOB_NAME = 'job_{}'
+
+    def __init__(self, structures, config='metal', kind_section=DZVPPBE(),
+                 ngroups=1):
+        self._structures = structures
+        self._config = config
+        self._kind_section = kind_section
+        self.ngroups = ngroups
+
+    @property
+    def structures(self):
+        return self._structures
+
+    @property
+    def job_names(self):
+        """{key: job name}, jobs are sorted by key
+        """
+        return {key: self.JOB_NAME.format(i)
+                for i, key in enumerate(sorted(self.structures))}
+
+    @staticmethod
+    def _structure_to_xyz(structure):
+        lines = [str(len(structure.sites)), '']
+        for site in structure.sites:
+            lines.append('{:<6} {:20.10f} {:20.10f} {:20.10f}'
+                         .format(site.kind_name, *site.position))
+        return '\n'.join(lines) + '\n'
+
+    def get_job_input_sets(self, key):
+        """input_sets of one job
+        """
+        job_name = self.job_names[key]
+        inp = EnergyInputSets(structure=self.structures[key],
+                              config=deepcopy(self._config),
+                              kind_section=self._kind_section)
+        _input_sets = inp.input_sets
+        update_dict(_input_sets, {"GLOBAL": {"PROJECT": job_name,
+                                             "RUN_TYPE": "ENERGY_FORCE",
+                                             "PRINT_LEVEL": "MEDIUM"}})
+        topology = {"TOPOLOGY": {"COORD_FILE_NAME": f'{job_name}.xyz',
+                                 "COORD_FILE_FORMAT": "XYZ"}}
+        force_eval = _input_sets["FORCE_EVAL"]
+        for one_force_eval in (force_eval if isinstance(force_eval, list)
+                               else [force_eval]):
+            update_dict(one_force_eval.setdefault("SUBSYS", {}), topology)
+        return _input_sets
+
+    @property
+    def files(self):
+        """Input and coordinate files of all jobs
+        """
+        _files = {}
+        for key, job_name in self.job_names.items():
+            job_input = Cp2kInput(self.get_job_input_sets(key)).render()
+            _files[f'{job_name}_inp'] = SinglefileData(
+                file=io.BytesIO(job_input.encode()),
+                filename=f'{job_name}.inp')
+            _files[f'{job_name}_xyz'] = SinglefileData(
+                file=io.BytesIO(self._structure_to_xyz(
+                    self.structures[key]).encode()),
+                filename=f'{job_name}.xyz')
+        return _files
+
+    @property
+    def input_sets(self):
+        jobs = [{"DIRECTORY": ".",
+                 "INPUT_FILE_NAME": f'{job_name}.inp',
+                 "OUTPUT_FILE_NAME": f'{job_name}.out',
+                 "JOB_ID": i + 1}
+                for i, job_name in enumerate(self.job_names.values())]
+        _input_sets = {
+            "GLOBAL": {"PROJECT": "aiida", "PROGRAM_NAME": "FARMING"},
+            "FARMING": {"NGROUPS": min(self.ngroups, len(jobs)),
+                        "JOB": jobs}
+        }
+        return _input_sets
+
+
 class DPInputSets(object):
     """
     for deepmd
     """
     TypeMap = {'default': 'dpmd.json'}
+    # keys of training steps in deepmd v1 and v2
+    STEPS_KEYS = ('stop_batch', 'numb_steps')
+
+    def __init__(self, datadirs, kinds, descriptor_sel, config='default',
+                 init_model=None, init_steps_ratio=0.2):
+        """
+
+        Args:
+            datadirs (list): training data directories
+            kinds (list): type map of model
+            descriptor_sel (list): sel of descriptor
+            config (str or dict): name of config or config dict
+            init_model (aiida.orm.SinglefileData or list): frozen model to
+                initialise training from, or one for each model of
+                DPPackPreprocessor, None to train from scratch
+            init_steps_ratio (float): ratio of training steps and decay steps
+                when training from `init_model`
 
-    def __init__(self, datadirs, kinds, descriptor_sel, config='default'):
+        """
         self._datadirs = datadirs
         self._kinds = kinds
         self._descriptor_sel = descriptor_sel
         self._config = config
+        self._init_model = init_model
+        self._init_steps_ratio = init_steps_ratio
 
     @property
     def datadirs(self):
@@ -284,6 +397,10 @@ class DPInputSets(object):
     def descriptor_sel(self):
         return self._descriptor_sel
 
+    @property
+    def init_model(self):
+        return self._init_model
+
     @property
     def config(self):
         _config = make_tag_config(self._config, self.TypeMap)
@@ -297,6 +414,16 @@ class DPInputSets(object):
         _input_sets = deepcopy(self.config)
         _input_sets['model']['type_map'] = self.kinds
         _input_sets['model']['descriptor']['sel'] = self.descriptor_sel
+        if self.init_model is not None:
+            # same learning rate schedule in fewer steps
+            for key in self.STEPS_KEYS:
+                if key in _input_sets['training']:
+                    _input_sets['training'][key] = max(1, int(
+                        _input_sets['training'][key] * self._init_steps_ratio))
+            if 'decay_steps' in _input_sets['learning_rate']:
+                _input_sets['learning_rate']['decay_steps'] = max(1, int(
+                    _input_sets['learning_rate']['decay_steps'] *
+                    self._init_steps_ratio))
         return _input_sets
 
 
@@ -309,6 +436,12 @@ class QBCInputSets(object):
     init_template: str
     variables: dict
     graphs: list
+    # same seed for every access of `input_sets`, random if not set
+    seed: int = None
+
+    def __post_init__(self):
+        if self.seed is None:
+            self.seed = int(np.random.randint(10000000))
 
     @property
     def template(self):
@@ -328,10 +461,10 @@ class QBCInputSets(object):
                     file=os.path.abspath(graph))
             elif isinstance(graph, SinglefileData):
                 files[f'graph_{i}'] = graph
-        variables = self.variables
+        variables = deepcopy(self.variables)
         variables.update({
             '_GRAPHS': [' '.join([f'../{g}.pb' for g in files.keys()])],
-            '_SEED': [np.random.randint(10000000)],
+            '_SEED': [self.seed],
             '_INPUT_STRUCTURE': ['input.data']
         })
         _input_sets = {
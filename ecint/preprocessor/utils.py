@@ -1,5 +1,6 @@
 import os
 import sys
+from copy import deepcopy
 from itertools import groupby
 from os.path import exists, isabs, isdir
 from pathlib import PurePath
@@ -7,7 +8,10 @@ from warnings import warn
 
 import json5
 import numpy as np
-from aiida.orm import Computer, SinglefileData, StructureData
+from aiida.common.links import LinkType
+from aiida.engine import workfunction
+from aiida.orm import CalcJobNode, Computer, Dict, QueryBuilder, \
+    SinglefileData, StructureData, WorkChainNode
 from ase import Atoms
 from ase.io import read
 from ase.io.extxyz import key_val_str_to_dict
@@ -299,7 +303,8 @@ def load_machine(machine):
                 'tot_num_mpiprocs': ,
                 'max_wallclock_seconds': ,
                 'queue_name': ,
-                'custom_scheduler_commands':
+                'custom_scheduler_commands': ,
+                'ngpu': (optional)
             }
 
     """
@@ -374,6 +379,9 @@ def load_machine(machine):
         custom_scheduler_commands = f'#BSUB -R \"span[ptile={ptile}]\"'
     restrict_machine.update(
         {'custom_scheduler_commands': custom_scheduler_commands})
+    # GPUs used by packed calculations
+    if 'ngpu' in _machine:
+        restrict_machine.update({'ngpu': _machine['ngpu']})
     # return dict={'code@computer': , 'tot_num_mpiprocs': ,
     # 'max_wallclock_seconds': ,'queue_name': ,'custom_scheduler_commands': }
     return restrict_machine
@@ -400,6 +408,184 @@ def inspect_node(node):
     assert node.is_finished_ok
 
 
+# wavefunction written by parent cp2k calculation, copied to `parent_calc`
+WFN_RESTART_FILE_NAME = './parent_calc/aiida-RESTART.wfn'
+
+
+def update_cp2k_parameters(builder, parameters):
+    """Update cp2k parameters of builder
+
+    Args:
+        builder (aiida.engine.processes.builder.ProcessBuilder):
+            builder of Cp2kBaseWorkChain, will be changed
+        parameters (dict): nested cp2k parameters to update
+
+    Returns:
+        aiida.engine.processes.builder.ProcessBuilder
+
+    """
+    # nested dicts of unstored Dict are shared, do not change them
+    new_parameters = deepcopy(builder.cp2k.parameters.get_dict())
+    update_dict(new_parameters, parameters)
+    builder.cp2k.parameters = Dict(dict=new_parameters)
+    return builder
+
+
+def set_wfn_restart(builder, parent_calc_folder):
+    """Start SCF of cp2k builder from wavefunction of parent calculation
+
+    If the wavefunction file is not found, cp2k falls back to initial guess
+
+    Args:
+        builder (aiida.engine.processes.builder.ProcessBuilder):
+            builder of Cp2kBaseWorkChain, will be changed
+        parent_calc_folder (aiida.orm.RemoteData): remote folder of
+            parent calculation with same atoms and basis sets
+
+    Returns:
+        aiida.engine.processes.builder.ProcessBuilder
+
+    """
+    parameters = builder.cp2k.parameters.get_dict()
+    if isinstance(parameters['FORCE_EVAL'], dict):
+        update_dict(parameters, {'FORCE_EVAL': {'DFT': {
+            'WFN_RESTART_FILE_NAME': WFN_RESTART_FILE_NAME,
+            'SCF': {'SCF_GUESS': 'RESTART'}}}})
+    else:
+        warn('Wavefunction restart is not supported for multiple FORCE_EVAL',
+             Warning)
+    builder.cp2k.parameters = Dict(dict=parameters)
+    builder.cp2k.parent_calc_folder = parent_calc_folder
+    return builder
+
+
+# exit status of scheduler and cp2k out of walltime
+WALLTIME_EXIT_STATUS = (120, 400)
+
+
+def get_last_calculation(node):
+    """Last calculation called by node
+
+    Failed workchain, e.g. Cp2kBaseWorkChain out of walltime, has no outputs,
+    outputs of its last calculation are used instead
+
+    Args:
+        node (aiida.orm.ProcessNode): e.g. node of Cp2kBaseWorkChain
+
+    Returns:
+        aiida.orm.CalcJobNode: node itself if it is CalcJobNode,
+            None if no calculation is called
+
+    """
+    if isinstance(node, CalcJobNode):
+        return node
+    calculations = [descendant for descendant in node.called_descendants
+                    if isinstance(descendant, CalcJobNode)]
+    if not calculations:
+        return None
+    return max(calculations, key=lambda x: x.ctime)
+
+
+def is_out_of_walltime(node):
+    """Whether the last calculation called by node is out of walltime
+
+    Args:
+        node (aiida.orm.ProcessNode): e.g. node of Cp2kBaseWorkChain
+
+    Returns:
+        bool
+
+    """
+    last_calculation = get_last_calculation(node)
+    if last_calculation is None:
+        return False
+    return last_calculation.exit_status in WALLTIME_EXIT_STATUS
+
+
+def canonicalize_parameters(parameters):
+    """Convert parameters to a canonical form, to get stable hash
+
+    Dict keys are sorted, numpy scalars and arrays are converted to
+    python objects and tuples to lists
+
+    Args:
+        parameters (Any): e.g. input_sets of cp2k
+
+    Returns:
+        Any: canonical parameters
+
+    """
+    if isinstance(parameters, dict):
+        return {str(k): canonicalize_parameters(parameters[k])
+                for k in sorted(parameters, key=str)}
+    elif isinstance(parameters, (list, tuple)):
+        return [canonicalize_parameters(v) for v in parameters]
+    elif isinstance(parameters, (np.generic, np.ndarray)):
+        return canonicalize_parameters(parameters.tolist())
+    else:
+        return parameters
+
+
+CACHE_EXTRA_KEY = 'ecint_cache_key'
+
+
+def get_cached_node(cache_key, node_class=WorkChainNode):
+    """Get latest finished ok node with the same cache key
+
+    Args:
+        cache_key (str): hash of canonical inputs,
+            stored in extras of node by `CACHE_EXTRA_KEY`
+        node_class (type): class of node
+
+    Returns:
+        aiida.orm.ProcessNode or None
+
+    """
+    qb = QueryBuilder()
+    qb.append(node_class, tag='node',
+              filters={f'extras.{CACHE_EXTRA_KEY}': cache_key,
+                       'attributes.process_state': 'finished',
+                       'attributes.exit_status': 0})
+    qb.order_by({'node': {'ctime': 'desc'}})
+    qb.limit(1)
+    result = qb.first()
+    return result[0] if result else None
+
+
+CACHED_FROM_EXTRA_KEY = 'ecint_cached_from'
+
+
+@workfunction
+def reuse_outputs(**outputs):
+    """Return outputs of a reused node as they are
+
+    Called by the workchain which reuses the node, so the reused outputs
+    are linked to it by CALL, INPUT and RETURN links in provenance
+    """
+    return outputs
+
+
+def link_cached_node(node):
+    """Link a cached node to the calling process
+
+    A finished node can not be called again, so its outputs are passed
+    through `reuse_outputs` in the calling process instead, and uuid of
+    node is stored in extras of the workfunction by `CACHED_FROM_EXTRA_KEY`
+
+    Args:
+        node (aiida.orm.ProcessNode): node got by `get_cached_node`
+
+    Returns:
+        aiida.orm.WorkFunctionNode: node of `reuse_outputs`
+
+    """
+    outputs = {link.link_label: link.node for link in
+               node.get_outgoing(link_type=LinkType.RETURN).all()}
+    _, reuse_node = reuse_outputs.run_get_node(**outputs)
+    reuse_node.set_extra(CACHED_FROM_EXTRA_KEY, node.uuid)
+    return reuse_node
+
+
 def check_config_machine(config=None, machine=None, uniform_func=None):
     """check config and machine
 
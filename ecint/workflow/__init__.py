@@ -1,4 +1,5 @@
 from ecint.workflow.al import ActiveLearning
+from ecint.workflow.frequency import FiniteDifferenceFrequencyWorkChain
 from ecint.workflow.neb import NebWorkChain
 from ecint.workflow.scalecell import CelloptWorkChain
 from ecint.workflow.units.base import *
@@ -1,6 +1,7 @@
 import os
 import os
 import random
+import tarfile
 from collections import namedtuple
 from uuid import uuid4
 
@@ -8,12 +9,18 @@ from aiida.engine import while_, WorkChain
 from aiida.orm import Int, SinglefileData, StructureData
 from ase.io import read
 
-from ecint.config import RESULT_NAME
-from ecint.postprocessor.utils import write_datadir_from_energyworkchain
+from ecint.config import default_dpmd_pack_machine, RESULT_NAME
+from ecint.postprocessor.parse import read_lammps_dump_text
+from ecint.postprocessor.render import render_in_background
+from ecint.postprocessor.results import record_result
+from ecint.postprocessor.selection import select_diverse_structures
+from ecint.postprocessor.utils import get_files_in_bundle, \
+    write_datadir_from_energyworkchain, write_file_from_node
 from ecint.postprocessor.visualization import get_learning_curve
+from ecint.preprocessor import DPPreprocessor
 from ecint.preprocessor.utils import inspect_node
-from ecint.workflow.units.base import DPSingleWorkChain, \
-    EnergySingleWorkChain, QBCBatchWorkChain
+from ecint.workflow.units.base import DPPackWorkChain, DPSingleWorkChain, \
+    EnergyFarmingWorkChain, EnergySingleWorkChain, QBCBatchWorkChain
 
 
 def download_file(node, remotename, localname):
@@ -57,17 +64,53 @@ class ActiveLearning(WorkChain):
         # TODO: need parameters like fp_task_max/min
         spec.input('labeling.task_max', valid_type=int, default=20, non_db=True)
         spec.input('labeling.task_min', valid_type=int, default=1, non_db=True)
+        # if > 0, pack every `farming_size` structures into one scheduler job
+        spec.input('labeling.farming_size', valid_type=int, default=0,
+                   non_db=True)
+        spec.input('labeling.farming_ngroups', valid_type=int, default=1,
+                   non_db=True)
+        # label the first candidate of each trajectory first, then start SCF
+        # of other candidates in same trajectory from its wavefunction
+        spec.input('labeling.wfn_restart', valid_type=bool, default=False,
+                   non_db=True)
+        # retrieve all candidate frames in one compressed archive
+        spec.input('labeling.retrieve_in_bundle', valid_type=bool,
+                   default=True, non_db=True)
+        # 'random': select `task_max` candidates randomly,
+        # 'fps': select `task_max` structurally diverse candidates by
+        # farthest point sampling from `fps_pool_max` random candidates
+        spec.input('labeling.selection', valid_type=str, default='random',
+                   non_db=True)
+        spec.input('labeling.fps_pool_max', valid_type=int, default=500,
+                   non_db=True)
+        # prefer candidates with larger max_devi_f in farthest point sampling
+        spec.input('labeling.fps_weighted', valid_type=bool, default=True,
+                   non_db=True)
         spec.expose_inputs(DPSingleWorkChain,
                            namespace='training',
-                           include=['resdir', 'config', 'machine'])
+                           include=['resdir', 'config', 'machine',
+                                    'init_steps_ratio'])
+        # initialise each model from its counterpart of previous loop,
+        # DpCalculation without `init_model` input only supports it if packed
+        spec.input('training.warm_start', valid_type=bool, default=False,
+                   non_db=True)
+        # train all `num_pb` models in one job by DPPackWorkChain
+        spec.input('training.packed', valid_type=bool, default=False,
+                   non_db=True)
+        # models are distributed to `ngpu` GPUs of pack_machine
+        spec.input('training.pack_machine', valid_type=dict,
+                   default=default_dpmd_pack_machine, non_db=True)
+        spec.input('training.dp_command', valid_type=str, default='dp',
+                   non_db=True)
         spec.expose_inputs(QBCBatchWorkChain,
                            namespace='exploration',
                            include=['resdir', 'template', 'machine',
-                                    'model_devi'])
+                                    'model_devi', 'parallelism',
+                                    'lmp_command', 'pack_machine'])
         spec.expose_inputs(EnergySingleWorkChain,
                            namespace='labeling',
                            include=['resdir', 'config', 'machine',
-                                    'kind_section'])
+                                    'kind_section', 'use_cache'])
 
         spec.outline(
             cls.check_imd,
@@ -79,6 +122,7 @@ class ActiveLearning(WorkChain):
                 cls.submit_exploration,
                 cls.inspect_exploration,
                 cls.get_candidate,
+                cls.submit_labeling_seeds,
                 cls.submit_labeling,
                 cls.inspect_labeling,
                 cls.get_datadir,
@@ -97,6 +141,13 @@ class ActiveLearning(WorkChain):
             for v in settings.values():
                 if not isinstance(v, list):
                     raise TypeError('Variables in imd must be list')
+        if self.inputs.labeling.selection not in ('random', 'fps'):
+            raise ValueError('labeling.selection should be "random" or "fps"')
+        if self.inputs.training.warm_start and \
+                (not self.inputs.training.packed) and \
+                (not DPPreprocessor.support_init_model()):
+            raise ValueError('DpCalculation can not initialise from model, '
+                             'set training.packed to warm start')
 
     def init_settings(self):
         # init loops count
@@ -117,9 +168,33 @@ class ActiveLearning(WorkChain):
             return False
 
     def submit_training(self):
+        # models of previous loop
+        warm_start = self.inputs.training.warm_start and (self.ctx.loops > 0)
+        if self.inputs.training.packed:
+            init_inputs = {}
+            if warm_start:
+                init_inputs['init_models'] = {
+                    f'model_{i}': self.get_trained(i)[0]
+                    for i in range(self.inputs.num_pb.value)}
+            node = self.submit(DPPackWorkChain,
+                               **init_inputs,
+                               datadirs=self.ctx.datadirs,
+                               kinds=self.inputs.kinds,
+                               descriptor_sel=self.inputs.descriptor_sel,
+                               num_models=self.inputs.num_pb.value,
+                               dp_command=self.inputs.training.dp_command,
+                               init_steps_ratio=(
+                                   self.inputs.training.init_steps_ratio),
+                               resdir=self.inputs.training.resdir,
+                               config=self.inputs.training.config,
+                               machine=self.inputs.training.pack_machine)
+            self.to_context(dpmd_pack=node)
+            return
         for i in range(self.inputs.num_pb.value):
             init_inputs = self.exposed_inputs(DPSingleWorkChain)
             init_inputs['datadirs'] = self.ctx.datadirs
+            if warm_start:
+                init_inputs['init_model'] = self.get_trained(i)[0]
             node = self.submit(DPSingleWorkChain,
                                **init_inputs,
                                **self.exposed_inputs(DPSingleWorkChain,
@@ -128,9 +203,28 @@ class ActiveLearning(WorkChain):
             self.to_context(**{f'dpmd_{i}': node})
 
     def inspect_training(self):
+        if self.inputs.training.packed:
+            inspect_node(self.ctx.dpmd_pack)
+            return
         for i in range(self.inputs.num_pb.value):
             inspect_node(self.ctx[f'dpmd_{i}'])
 
+    def get_trained(self, i):
+        """Get model.pb and lcurve.out of i-th model in this loop
+
+        Args:
+            i (int): index of model
+
+        Returns:
+            (aiida.orm.SinglefileData, aiida.orm.SinglefileData)
+
+        """
+        if self.inputs.training.packed:
+            outputs = self.ctx.dpmd_pack.outputs
+            return outputs.models[f'model_{i}'], outputs.lcurves[f'model_{i}']
+        outputs = self.ctx[f'dpmd_{i}'].outputs
+        return outputs.model, outputs.lcurve
+
     def write_models(self):
         self.report(f'Loops {self.ctx.loops}')
         models_dir = os.path.join(self.inputs.training.resdir,
@@ -139,18 +233,12 @@ class ActiveLearning(WorkChain):
         # model.pb and lcurve.out
         for i in range(self.inputs.num_pb.value):
             model_number_name = os.path.join(models_dir, str(i))
-            os.makedirs(model_number_name, exist_ok=True)
-            model_name = os.path.join(model_number_name, 'model.pb')
-            lcurve_name = os.path.join(model_number_name, 'lcurve.out')
-            # write model.pb
-            with self.ctx[f'dpmd_{i}'].outputs.model.open(mode='rb') as f:
-                model_content = f.read()
-            with open(model_name, mode='wb') as f:
-                f.write(model_content)
-            # write lcurve.out
-            lcurve_content = self.ctx[f'dpmd_{i}'].outputs.lcurve.get_content()
-            with open(lcurve_name, mode='w') as f:
-                f.write(lcurve_content)
+            model, lcurve = self.get_trained(i)
+            # write model.pb and lcurve.out without loading them in memory
+            write_file_from_node(model,
+                                 os.path.join(model_number_name, 'model.pb'))
+            write_file_from_node(lcurve,
+                                 os.path.join(model_number_name, 'lcurve.out'))
         # datadirs
         datadirs_name = os.path.join(models_dir, 'datadirs')
         os.makedirs(datadirs_name, exist_ok=True)
@@ -162,12 +250,12 @@ class ActiveLearning(WorkChain):
         # force_learning_curve.jpg
         lcurve_list = [os.path.join(models_dir, str(i), 'lcurve.out')
                        for i in range(self.inputs.num_pb.value)]
-        get_learning_curve(lcurve_list,
-                           os.path.join(models_dir, 'force_lcurve.jpg'))
+        render_in_background(get_learning_curve, lcurve_list,
+                             os.path.join(models_dir, 'force_lcurve.jpg'))
 
     def get_pbs(self):
         for i in range(self.inputs.num_pb.value):
-            self.out(f'models.dpmd_{i}', self.ctx[f'dpmd_{i}'].outputs.model)
+            self.out(f'models.dpmd_{i}', self.get_trained(i)[0])
 
     def submit_exploration(self):
         # nloop = 0  # should be changed when run workchain, now just test
@@ -182,7 +270,7 @@ class ActiveLearning(WorkChain):
                            structures=structures,
                            variables=variables,
                            kinds=self.inputs.kinds,
-                           graphs=[self.ctx[f'dpmd_{i}'].outputs.model
+                           graphs=[self.get_trained(i)[0]
                                    for i in range(self.inputs.num_pb.value)],
                            **self.exposed_inputs(QBCBatchWorkChain,
                                                  namespace='exploration',
@@ -226,20 +314,85 @@ class ActiveLearning(WorkChain):
     def inspect_exploration(self):
         inspect_node(self.ctx.qbc)
 
-    # TODO: one ssh connect to download all lmp structures
+    def retrieve_candidates(self, remotenames, localpath):
+        """Retrieve candidate frames, in one bundle if possible
+
+        Args:
+            remotenames (list[str]): relative paths in remote folder of qbc,
+                e.g. ['0/100.lammpstrj']
+            localpath (str): local directory, relative paths are kept
+
+        """
+        remote_folder = self.ctx.qbc.outputs.remote_folder
+        if self.inputs.labeling.retrieve_in_bundle:
+            try:
+                with remote_folder.get_authinfo().get_transport() \
+                        as transport:
+                    get_files_in_bundle(transport,
+                                        remote_folder.get_remote_path(),
+                                        remotenames, localpath)
+                return
+            except (OSError, tarfile.TarError) as e:
+                self.report(f'Failed to retrieve candidates in bundle, '
+                            f'retrieve them one by one: {e}')
+        for remotename in remotenames:
+            localfile = os.path.join(localpath, remotename)
+            os.makedirs(os.path.dirname(localfile), exist_ok=True)
+            remote_folder.getfile(remotename, localfile)
+
+    def read_candidate(self, filename):
+        try:
+            return read_lammps_dump_text(filename, self.inputs.kinds)
+        except ValueError:
+            return read(filename, format='lammps-dump-text',
+                        specorder=self.inputs.kinds)
+
+    def select_diverse_candidate(self, candidates, atoms_list):
+        """Select `task_max` candidates by farthest point sampling
+
+        Args:
+            candidates (list[Point]): (i_traj, step) of candidates
+            atoms_list (list[ase.Atoms]): structure of each candidate
+
+        Returns:
+            list[int]: indices of selected candidates
+
+        """
+        model_devi = None
+        model_devi_index = self.ctx.qbc.outputs.model_devi_index
+        if self.inputs.labeling.fps_weighted and all(
+                'candidate_devi_f' in md_index for md_index in
+                model_devi_index):
+            devi_f = {}
+            for i_traj, md_index in enumerate(model_devi_index):
+                devi_f.update(
+                    {(i_traj, step): value for step, value in
+                     zip(md_index['candidate'], md_index['candidate_devi_f'])})
+            model_devi = [devi_f[(candidate.i_traj, candidate.step)]
+                          for candidate in candidates]
+        return select_diverse_structures(atoms_list,
+                                         self.inputs.labeling.task_max,
+                                         self.inputs.kinds, model_devi)
+
     def get_candidate(self):
         # select candidate
         p = namedtuple('Point', ['i_traj', 'step'])
         all_candidate, selected_candidate = [], None
+        task_max = self.inputs.labeling.task_max
+        use_fps = self.inputs.labeling.selection == 'fps'
         for i_traj, traj in enumerate([md_index['candidate'] for md_index in
                                        self.ctx.qbc.outputs.model_devi_index]):
             for step in traj:
                 all_candidate.append(p(i_traj, step))
-        if len(all_candidate) > self.inputs.labeling.task_max:
+        if len(all_candidate) > task_max:
+            # candidates are retrieved and read before farthest point
+            # sampling, so the pool is limited by `fps_pool_max`
+            k = (max(task_max, self.inputs.labeling.fps_pool_max)
+                 if use_fps else task_max)
             selected_candidate = random.sample(all_candidate,
-                                               k=self.inputs.labeling.task_max)
+                                               k=min(k, len(all_candidate)))
         elif ((len(all_candidate) >= self.inputs.labeling.task_min) and
-              (len(all_candidate) <= self.inputs.labeling.task_max)):
+              (len(all_candidate) <= task_max)):
             selected_candidate = all_candidate
         elif len(all_candidate) < self.inputs.labeling.task_min:
             # TODO: break big loop
@@ -249,20 +402,26 @@ class ActiveLearning(WorkChain):
                                        self._ITER_NAME + str(self.ctx.loops),
                                        self._FP_DIR)
         self.ctx.fp_stc = []
+        # index of trajectory of each candidate
+        self.ctx.fp_trajs = []
         if selected_candidate:
-            for candidate in selected_candidate:
-                remote_folder = self.ctx.qbc.outputs.remote_folder
-                subfolder = str(candidate.i_traj)
-                filename = str(candidate.step) + '.lammpstrj'
-                localfolder = os.path.join(self.ctx.fp_dir, 'candidate',
-                                           subfolder)
-                localfile = os.path.join(localfolder, filename)
-                os.makedirs(localfolder, exist_ok=True)
-                remote_folder.getfile(os.path.join(subfolder, filename),
-                                      localfile)
-                atoms = read(localfile, format='lammps-dump-text',
-                             specorder=self.inputs.kinds)
-                self.ctx.fp_stc.append(StructureData(ase=atoms))
+            selected_candidate = sorted(selected_candidate)
+            candidate_dir = os.path.join(self.ctx.fp_dir, 'candidate')
+            remotenames = [f'{candidate.i_traj}/{candidate.step}.lammpstrj'
+                           for candidate in selected_candidate]
+            self.retrieve_candidates(remotenames, candidate_dir)
+            atoms_list = [self.read_candidate(os.path.join(candidate_dir,
+                                                           remotename))
+                          for remotename in remotenames]
+            selected_index = range(len(selected_candidate))
+            if use_fps and len(selected_candidate) > task_max:
+                selected_index = self.select_diverse_candidate(
+                    selected_candidate, atoms_list)
+                self.report(f'Select {len(selected_index)} diverse candidates '
+                            f'from {len(selected_candidate)} candidates')
+            for i in selected_index:
+                self.ctx.fp_stc.append(StructureData(ase=atoms_list[i]))
+                self.ctx.fp_trajs.append(selected_candidate[i].i_traj)
 
         # for i_v, condition in enumerate(self.ctx.v_list):
         #     condition_dir = os.path.join(self.ctx.md_dir, f'condition_{i_v}')
@@ -314,18 +473,75 @@ class ActiveLearning(WorkChain):
         #                      specorder=self.inputs.kinds)
         #         self.ctx.structures.append(StructureData(ase=atoms))
 
+    def get_type_mark(self, structure):
+        return ''.join([str(self.inputs.kinds.index(kindname))
+                        for kindname in structure.get_site_kindnames()])
+
+    def submit_labeling_seeds(self):
+        # {i_traj: index of seed structure}
+        self.ctx.fp_seeds = {}
+        if ((not self.inputs.labeling.wfn_restart) or
+                (self.inputs.labeling.farming_size > 0)):
+            return
+        labeling_inputs = self.exposed_inputs(EnergySingleWorkChain,
+                                              namespace='labeling')
+        for i, i_traj in enumerate(self.ctx.fp_trajs):
+            if i_traj not in self.ctx.fp_seeds:
+                self.ctx.fp_seeds[i_traj] = i
+                node = self.submit(EnergySingleWorkChain,
+                                   label=os.path.join(self.ctx.fp_dir,
+                                                      f'coords_{i}'),
+                                   structure=self.ctx.fp_stc[i],
+                                   **labeling_inputs)
+                self.to_context(**{f'fp_{i}': node})
+
     def submit_labeling(self):
-        for i, structure in enumerate(self.ctx.fp_stc):
-            node = self.submit(EnergySingleWorkChain,
-                               label=os.path.join(self.ctx.fp_dir,
-                                                  f'coords_{i}'),
-                               structure=structure,
-                               **self.exposed_inputs(EnergySingleWorkChain,
-                                                     namespace='labeling'))
-            self.to_context(**{f'fp_{i}': node})
+        labeling_inputs = self.exposed_inputs(EnergySingleWorkChain,
+                                              namespace='labeling')
+        farming_size = self.inputs.labeling.farming_size
+        # type mark of structures in each fp node
+        self.ctx.fp_marks = []
+        if farming_size > 0:
+            labeling_inputs.pop('use_cache', None)
+            # only structures with same kinds order in one farming job
+            categories = {}
+            for i, structure in enumerate(self.ctx.fp_stc):
+                categories.setdefault(self.get_type_mark(structure),
+                                      {})[f'coords_{i}'] = structure
+            for tr_mark, structures in categories.items():
+                keys = list(structures)
+                for start in range(0, len(keys), farming_size):
+                    node = self.submit(
+                        EnergyFarmingWorkChain,
+                        label=self.ctx.fp_dir,
+                        structures={key: structures[key] for key in
+                                    keys[start:start + farming_size]},
+                        ngroups=self.inputs.labeling.farming_ngroups,
+                        **labeling_inputs)
+                    self.to_context(**{f'fp_{len(self.ctx.fp_marks)}': node})
+                    self.ctx.fp_marks.append(tr_mark)
+        else:
+            seeds = set(self.ctx.fp_seeds.values())
+            for i, structure in enumerate(self.ctx.fp_stc):
+                self.ctx.fp_marks.append(self.get_type_mark(structure))
+                if i in seeds:
+                    continue
+                extra_inputs = {}
+                seed = self.ctx.fp_seeds.get(self.ctx.fp_trajs[i])
+                if seed is not None:
+                    seed_node = self.ctx[f'fp_{seed}']
+                    if 'remote_folder' in seed_node.outputs:
+                        extra_inputs['parent_calc_folder'] = \
+                            seed_node.outputs.remote_folder
+                node = self.submit(EnergySingleWorkChain,
+                                   label=os.path.join(self.ctx.fp_dir,
+                                                      f'coords_{i}'),
+                                   structure=structure,
+                                   **labeling_inputs, **extra_inputs)
+                self.to_context(**{f'fp_{i}': node})
 
     def inspect_labeling(self):
-        for i in range(len(self.ctx.fp_stc)):
+        for i in range(len(self.ctx.fp_marks)):
             inspect_node(self.ctx[f'fp_{i}'])
 
     def get_datadir(self):
@@ -335,12 +551,9 @@ class ActiveLearning(WorkChain):
                                        self._MODELS_DIR)
         datadirs_name = os.path.join(next_models_dir, 'datadirs')
         os.makedirs(datadirs_name, exist_ok=True)
-        nodes = [self.ctx[f'fp_{i}'] for i in range(len(self.ctx.fp_stc))]
         nodes_categories = {}
-        for node in nodes:
-            structure = node.inputs.structure
-            tr_mark = ''.join([str(self.inputs.kinds.index(kindname))
-                               for kindname in structure.get_site_kindnames()])
+        for i, tr_mark in enumerate(self.ctx.fp_marks):
+            node = self.ctx[f'fp_{i}']
             if tr_mark in nodes_categories:
                 nodes_categories[tr_mark].append(node)
             else:
@@ -354,9 +567,11 @@ class ActiveLearning(WorkChain):
             self.ctx.datadirs.append(data_dirname)
 
     def write_results(self):
-        os.chdir(self.inputs.training.resdir)
         loop_dir = os.path.join(self.inputs.training.resdir,
                                 self._ITER_NAME + str(self.ctx.loops))
-        with open(RESULT_NAME, 'a') as f:
+        with open(os.path.join(self.inputs.training.resdir, RESULT_NAME),
+                  'a') as f:
             f.write('# END ACTIVE LEARNING\n')
             f.write(f'Last loop: {loop_dir}\n')
+        record_result(self.inputs.training.resdir, 'Active Learning',
+                      loops=self.ctx.loops, loop_dir=loop_dir)
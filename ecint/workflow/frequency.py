@@ -0,0 +1,177 @@
+import os
+
+import numpy as np
+from aiida.engine import WorkChain
+from aiida.orm import ArrayData, List, StructureData
+
+from ecint.config import RESULT_NAME
+from ecint.postprocessor.results import record_result
+from ecint.postprocessor.vibration import count_imaginary, \
+    get_active_atoms, get_displaced_atoms, get_displacements, \
+    get_frequencies, get_hessian
+from ecint.preprocessor.utils import check_config_machine, inspect_node
+from ecint.workflow.units.base import EnergyFarmingWorkChain, \
+    EnergySingleWorkChain
+
+
+class FiniteDifferenceFrequencyWorkChain(WorkChain):
+    """
+    Workflow to vibrational analysis by finite difference,
+    forces of displaced structures are calculated as independent jobs
+    """
+    TYPE = 'simulation'
+    SUB = {'enercalc'}  # correspond to expose_inputs namespace
+    _DISPLACEMENTS_DIR = 'displacements'
+
+    @classmethod
+    def define(cls, spec):
+        super(FiniteDifferenceFrequencyWorkChain, cls).define(spec)
+
+        spec.input('structure', valid_type=StructureData, required=True)
+        # displacement in Å
+        spec.input('delta', default=0.01,
+                   valid_type=float, required=False, non_db=True)
+        # if > 0, pack every `farming_size` displacements into one job
+        spec.input('farming_size', default=0,
+                   valid_type=int, required=False, non_db=True)
+        spec.input('farming_ngroups', default=1,
+                   valid_type=int, required=False, non_db=True)
+        # partial hessian, only displace active atoms, see `get_active_atoms`
+        spec.input('active.indices', valid_type=list,
+                   required=False, non_db=True)
+        spec.input('active.tags', valid_type=list,
+                   required=False, non_db=True)
+        # e.g. reactant of NEB, atoms moving most to `structure` are active
+        spec.input('active.reference', valid_type=StructureData,
+                   required=False)
+        spec.input('active.n_moving', default=1,
+                   valid_type=int, required=False, non_db=True)
+        spec.input('active.cutoff', valid_type=(int, float),
+                   required=False, non_db=True)
+
+        # set single point energy and forces calculation input setting
+        spec.expose_inputs(EnergySingleWorkChain,
+                           namespace='enercalc',
+                           exclude=['structure', 'label'])
+
+        spec.outline(
+            cls.check_config_machine,
+            cls.submit_displacements,
+            cls.inspect_displacements,
+            cls.get_vib_frequency,
+            cls.write_results
+        )
+
+        spec.output('hessian', valid_type=ArrayData)
+        spec.output('vibrational_frequency', valid_type=List)  # cm^-1
+
+        spec.exit_code(400, 'ERROR_MISSING_FORCES',
+                       message='No forces of displacements: {displacements}')
+
+    def check_config_machine(self):
+        check_config_machine(
+            config=self.inputs.enercalc.config,
+            machine=self.inputs.enercalc.machine
+        )
+
+    def submit_displacements(self):
+        atoms = self.inputs.structure.get_ase()
+        active = self.inputs.active
+        self.ctx.active = get_active_atoms(
+            atoms, indices=active.get('indices'), tags=active.get('tags'),
+            reference=(active.reference.get_ase()
+                       if 'reference' in active else None),
+            n_moving=active.n_moving, cutoff=active.get('cutoff'))
+        if len(self.ctx.active) < len(atoms):
+            self.report(f'Partial hessian of {len(self.ctx.active)} '
+                        f'active atoms: {self.ctx.active}')
+        self.ctx.displacements = get_displacements(
+            len(atoms), self.inputs.delta, active=self.ctx.active)
+        structures = {}
+        for i, displaced in enumerate(get_displaced_atoms(
+                atoms, self.ctx.displacements)):
+            structures[f'disp_{i}'] = StructureData(ase=displaced).store()
+        # {key of displacement: name of node in ctx}
+        self.ctx.disp_nodes = {}
+        enercalc_inputs = self.exposed_inputs(EnergySingleWorkChain,
+                                              namespace='enercalc')
+        farming_size = self.inputs.farming_size
+        if farming_size > 0:
+            enercalc_inputs.pop('use_cache', None)
+            keys = list(structures)
+            for n, start in enumerate(range(0, len(keys), farming_size)):
+                node = self.submit(
+                    EnergyFarmingWorkChain,
+                    label=self._DISPLACEMENTS_DIR,
+                    structures={key: structures[key] for key in
+                                keys[start:start + farming_size]},
+                    ngroups=self.inputs.farming_ngroups,
+                    **enercalc_inputs)
+                self.to_context(**{f'farming_{n}': node})
+                for key in keys[start:start + farming_size]:
+                    self.ctx.disp_nodes[key] = f'farming_{n}'
+        else:
+            for key, structure in structures.items():
+                node = self.submit(
+                    EnergySingleWorkChain,
+                    label=os.path.join(self._DISPLACEMENTS_DIR, key),
+                    structure=structure,
+                    **enercalc_inputs)
+                self.to_context(**{key: node})
+                self.ctx.disp_nodes[key] = key
+
+    def inspect_displacements(self):
+        for name in set(self.ctx.disp_nodes.values()):
+            inspect_node(self.ctx[name])
+        # farming finishes ok even if some jobs have no output
+        missing = [key for key in self.ctx.disp_nodes
+                   if self.get_disp_forces(key) is None]
+        if missing:
+            return self.exit_codes.ERROR_MISSING_FORCES.format(
+                displacements=', '.join(missing))
+
+    def get_disp_forces(self, key):
+        """Forces of displacement `key`, None if it has no forces"""
+        name = self.ctx.disp_nodes[key]
+        link_label = 'forces' if name == key else f'forces__{key}'
+        forces = self.ctx[name].get_outgoing(link_label_filter=link_label)
+        forces = forces.all()
+        if not forces:
+            return None
+        return forces[0].node.get_list() or None
+
+    def get_vib_frequency(self):
+        forces = [self.get_disp_forces(f'disp_{i}')
+                  for i in range(len(self.ctx.displacements))]
+        hessian = get_hessian(self.ctx.displacements, forces)
+        atoms = self.inputs.structure.get_ase()
+        masses = atoms.get_masses()[self.ctx.active]
+        if len(self.ctx.active) == len(atoms):
+            # translations and rotations are only free in full hessian
+            self.ctx.frequency = get_frequencies(
+                hessian, masses, positions=atoms.get_positions(),
+                pbc=atoms.pbc.any())
+        else:
+            self.ctx.frequency = get_frequencies(hessian, masses)
+        hessian_data = ArrayData()
+        hessian_data.set_array('hessian', hessian)
+        self.out('hessian', hessian_data.store())
+        self.out('vibrational_frequency',
+                 List(list=self.ctx.frequency.tolist()).store())
+
+    def write_results(self):
+        resdir = self.inputs.enercalc.resdir
+        output_frequency_name = 'frequency.txt'
+        np.savetxt(os.path.join(resdir, output_frequency_name),
+                   self.ctx.frequency, fmt='%-15.4f',
+                   header='Frequency (cm^-1), imaginary is negative')
+        n_imaginary = count_imaginary(self.ctx.frequency)
+        with open(os.path.join(resdir, RESULT_NAME), 'a') as f:
+            f.write(f'# Step: Finite Difference Frequency, PK: {self.pk}\n')
+            f.write(f'frequency file: {output_frequency_name}\n')
+            f.write(f'number of imaginary frequency: {n_imaginary}\n')
+            f.write(f'active atoms: {self.ctx.active}\n')
+        record_result(resdir, 'Finite Difference Frequency', self.node,
+                      frequency_file=os.path.join(resdir,
+                                                  output_frequency_name),
+                      n_imaginary=n_imaginary, active=self.ctx.active)
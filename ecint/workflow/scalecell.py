@@ -1,10 +1,11 @@
 import os
 
 import numpy as np
-from aiida.engine import WorkChain
+from aiida.engine import if_, WorkChain
 from aiida.orm import StructureData
 
 from ecint.config import RESULT_NAME
+from ecint.postprocessor.results import record_result
 from ecint.preprocessor.utils import check_config_machine, inspect_node
 from ecint.workflow.units.base import EnergySingleWorkChain
 
@@ -25,10 +26,19 @@ class CelloptWorkChain(WorkChain):
         # now only implement semiconductor k point sampling energy calculation
         spec.expose_inputs(EnergySingleWorkChain,
                            namespace='enercalc',
-                           exclude=['structure', 'label'])
+                           exclude=['structure', 'label',
+                                    'parent_calc_folder'])
+        # start SCF of other scales from wavefunction of the unscaled one
+        spec.input('wfn_restart', default=False,
+                   valid_type=bool, required=False, non_db=True)
 
         spec.outline(
             cls.check_config_machine,
+            cls.init_scale,
+            if_(cls.should_wfn_restart)(
+                cls.submit_reference,
+                cls.inspect_reference,
+            ),
             cls.submit_cellopt,
             cls.inspect_cellopt,
             cls.write_results
@@ -40,39 +50,60 @@ class CelloptWorkChain(WorkChain):
             machine=self.inputs.enercalc.machine
         )
 
+    def init_scale(self):
+        # TODO: 0.95:1.05:0.01
+        # initial the scaling parameter
+        self.ctx.scale_list = np.arange(0.95, 1.05, 0.01)
+        # scale closest to 1 is calculated first as reference
+        self.ctx.reference = int(np.argmin(np.abs(self.ctx.scale_list - 1)))
+
+    def should_wfn_restart(self):
+        return self.inputs.wfn_restart
+
+    def submit_scale(self, i, **kwargs):
+        struct = self.inputs.structure.get_ase()
+        scale = self.ctx.scale_list[i]
+        struct.set_cell(struct.get_cell() * scale, scale_atoms=True)
+        tmp_struct_data = StructureData(ase=struct)
+        tmp_struct_data.store()
+        node = self.submit(
+            EnergySingleWorkChain,
+            structure=tmp_struct_data,
+            label=f'scale_{scale:.3f}',
+            **self.exposed_inputs(EnergySingleWorkChain,
+                                  namespace='enercalc'),
+            **kwargs
+        )
+        self.to_context(**{f'cellopt_{i}': node})
+
+    def submit_reference(self):
+        self.submit_scale(self.ctx.reference)
+
+    def inspect_reference(self):
+        inspect_node(self.ctx[f'cellopt_{self.ctx.reference}'])
+
     def submit_cellopt(self):
         """
         prepare the rough scaled structures and submit single point energy
         :return:
         """
-        struct = self.inputs.structure.get_ase()
-
-        # TODO: 0.95:1.05:0.01
-        # initial the scaling parameter
-
-        self.ctx.scale_list = np.arange(0.95, 1.05, 0.01)
-        cell = struct.get_cell()
-        for i, scale in enumerate(self.ctx.scale_list):
-            tmp = struct.copy()
-            tmp.set_cell(cell * scale, scale_atoms=True)
-            tmp_struct_data = StructureData(ase=tmp)
-            tmp_struct_data.store()
-            node = self.submit(
-                EnergySingleWorkChain,
-                structure=tmp_struct_data,
-                label=f'scale_{scale:.3f}',
-                **self.exposed_inputs(EnergySingleWorkChain,
-                                      namespace='enercalc')
-            )
-            self.to_context(**{f'cellopt_{i}': node})
+        kwargs = {}
+        if self.inputs.wfn_restart:
+            reference_node = self.ctx[f'cellopt_{self.ctx.reference}']
+            if 'remote_folder' in reference_node.outputs:
+                kwargs['parent_calc_folder'] = \
+                    reference_node.outputs.remote_folder
+        for i in range(len(self.ctx.scale_list)):
+            if self.inputs.wfn_restart and (i == self.ctx.reference):
+                continue
+            self.submit_scale(i, **kwargs)
 
     def inspect_cellopt(self):
         for i in range(len(self.ctx.scale_list)):
             inspect_node(self.ctx[f'cellopt_{i}'])
 
     def write_results(self):
-        os.chdir(self.inputs.resdir)
-        with open(RESULT_NAME, 'a') as f:
+        with open(os.path.join(self.inputs.resdir, RESULT_NAME), 'a') as f:
             f.write(f'# Scale Factor,  Volume, Energy')
             for i in range(len(self.ctx.scale_list)):
                 volume = (
@@ -88,3 +119,8 @@ class CelloptWorkChain(WorkChain):
                         .value
                 )
                 f.write(f'{i} {volume} {energy}')
+                record_result(self.inputs.resdir, 'Cellopt',
+                              self.ctx[f'cellopt_{i}'],
+                              label=f'scale_{self.ctx.scale_list[i]:.3f}',
+                              scale=self.ctx.scale_list[i],
+                              volume=volume, energy=energy)
@@ -1,31 +1,44 @@
+import io
 import json
 import os
 import re
-from itertools import product
+import tarfile
+import tempfile
 
 import numpy as np
-from aiida.engine import WorkChain
-from aiida.orm import Bool, Float, List, SinglefileData, StructureData, \
-    TrajectoryData
+from aiida.engine import while_, WorkChain
+from aiida.orm import Bool, Float, List, RemoteData, SinglefileData, \
+    StructureData, TrajectoryData
 from aiida_lammps.calculations.lammps.template import BatchTemplateCalculation
 
+from ecint.calculations.lammps import get_conditions
 from ecint.config import default_cp2k_large_machine, default_cp2k_machine, \
-    default_dpmd_gpu_machine, default_lmp_gpu_machine, RESULT_NAME
+    default_dpmd_gpu_machine, default_dpmd_pack_machine, \
+    default_lmp_gpu_machine, default_lmp_pack_machine, RESULT_NAME
 from ecint.postprocessor.parse import parse_model_devi_index
-from ecint.postprocessor.utils import AU2EV, get_forces_info, get_last_frame, \
-    write_xyz_from_structure, write_xyz_from_trajectory
-from ecint.postprocessor.visualization import get_model_devi_distribution, \
-    plot_energy_curve
+from ecint.postprocessor.render import render_in_background
+from ecint.postprocessor.results import record_result
+from ecint.postprocessor.utils import AU2EV, get_energy_info, \
+    get_files_in_bundle, get_forces_info, get_last_frame, \
+    get_last_frames_on_remote, get_neb_progress, \
+    screen_model_devi_on_remote, write_xyz_from_structure, \
+    write_xyz_from_trajectory
+from ecint.postprocessor.visualization import FixedBinHistogram, \
+    get_model_devi_distribution, plot_energy_path, \
+    plot_model_devi_distribution
 from ecint.preprocessor import *
 from ecint.preprocessor.input import *
 from ecint.preprocessor.input import make_tag_config
 from ecint.preprocessor.kind import DZVPPBE, KindSection
-from ecint.preprocessor.utils import check_config_machine, inspect_node, \
-    load_machine, uniform_neb
+from ecint.preprocessor.utils import CACHE_EXTRA_KEY, \
+    check_config_machine, get_cached_node, get_last_calculation, \
+    inspect_node, is_out_of_walltime, link_cached_node, load_machine, \
+    set_wfn_restart, uniform_neb, update_cp2k_parameters
 
-__all__ = ['EnergySingleWorkChain', 'GeooptSingleWorkChain',
-           'NebSingleWorkChain', 'FrequencySingleWorkChain',
-           'DPSingleWorkChain', 'QBCBatchWorkChain']
+__all__ = ['EnergySingleWorkChain', 'EnergyFarmingWorkChain',
+           'GeooptSingleWorkChain', 'NebSingleWorkChain',
+           'FrequencySingleWorkChain', 'DPSingleWorkChain', 'DPPackWorkChain',
+           'QBCBatchWorkChain']
 
 
 # def load_default_config(config_name):
@@ -70,6 +83,57 @@ class BaseSingleWorkChain(WorkChain):
         self.ctx.config, self.ctx.machine = \
             check_config_machine(self.inputs.config, self.inputs.machine)
 
+    def submit_or_reuse(self, pre, builder=None, runtime_parameters=None):
+        """Submit builder of preprocessor, or reuse finished node
+
+        If input `use_cache` is True, a finished ok node with the same
+        canonical inputs is reused instead of submitting a new one, and its
+        outputs are linked to this workchain by `link_cached_node`
+
+        Args:
+            pre (ecint.preprocessor.Cp2kPreprocessor): preprocessor
+            builder (aiida.engine.processes.builder.ProcessBuilder):
+                builder modified from `pre.builder`, if None use `pre.builder`
+            runtime_parameters (dict): cp2k parameters depending on machine,
+                e.g. GLOBAL/WALLTIME, updated after cache key is computed
+
+        Returns:
+            aiida.orm.ProcessNode
+
+        """
+        if builder is None:
+            builder = pre.builder
+        cache_key = None
+        if self.inputs.get('use_cache', False):
+            cache_key = pre.get_cache_key(builder)
+            node = get_cached_node(cache_key)
+            if node is not None:
+                self.report(
+                    f'Reuse {node.process_label}<{node.pk}> from cache')
+                link_cached_node(node)
+                return node
+        if runtime_parameters:
+            update_cp2k_parameters(builder, runtime_parameters)
+        node = self.submit(builder)
+        if cache_key is not None:
+            node.set_extra(CACHE_EXTRA_KEY, cache_key)
+        return node
+
+    def get_result_path(self, *paths):
+        """Get path of result file in `resdir`
+
+        Never `os.chdir` in workchain steps, the current directory is shared
+        by all processes running in the same daemon worker.
+
+        Args:
+            *paths (str): path relative to `resdir`, absolute path is kept
+
+        Returns:
+            str: absolute path
+
+        """
+        return os.path.abspath(os.path.join(self.inputs.resdir, *paths))
+
     # def submit_workchain(self):
     #     inp = UnitsInputSets(structure=self.inputs.structure,
     #                          config=self.ctx.config,
@@ -92,6 +156,13 @@ class EnergySingleWorkChain(BaseSingleWorkChain):
         spec.input('structure',
                    valid_type=StructureData, required=True)
 
+        # reuse finished calculation with identical inputs
+        spec.input('use_cache', default=False,
+                   valid_type=bool, required=False, non_db=True)
+        # start SCF from wavefunction of a similar calculation
+        spec.input('parent_calc_folder',
+                   valid_type=RemoteData, required=False)
+
         spec.outline(
             cls.check_config_machine,
             cls.submit_energy,
@@ -105,6 +176,8 @@ class EnergySingleWorkChain(BaseSingleWorkChain):
         spec.output('energy', valid_type=Float)
         spec.output('forces', valid_type=List)
         spec.output('converged', valid_type=Bool)
+        # wavefunction in it can be used as `parent_calc_folder` of others
+        spec.output('remote_folder', valid_type=RemoteData, required=False)
 
     def submit_energy(self):
         inp = EnergyInputSets(structure=self.inputs.structure,
@@ -112,11 +185,16 @@ class EnergySingleWorkChain(BaseSingleWorkChain):
                               kind_section=self.inputs.kind_section)
         pre = EnergyPreprocessor(inp, self.ctx.machine)
         builder = pre.builder
-        node = self.submit(builder)
+        if 'parent_calc_folder' in self.inputs:
+            set_wfn_restart(builder, self.inputs.parent_calc_folder)
+        node = self.submit_or_reuse(pre, builder)
         self.to_context(energy_workchain=node)
 
     def inspect_energy(self):
         inspect_node(self.ctx.energy_workchain)
+        if 'remote_folder' in self.ctx.energy_workchain.outputs:
+            self.out('remote_folder',
+                     self.ctx.energy_workchain.outputs.remote_folder)
 
     def get_energy(self):
         self.ctx.energy = (self.ctx.energy_workchain.outputs.
@@ -142,14 +220,14 @@ class EnergySingleWorkChain(BaseSingleWorkChain):
             self.out('converged', Bool(False).store())
 
     def write_results(self):
-        os.chdir(self.inputs.resdir)
-        with open(RESULT_NAME, 'a') as f:
+        with open(self.get_result_path(RESULT_NAME), 'a') as f:
             f.write(f'# Step: Energy, PK: {self.ctx.energy_workchain.pk}\n')
             f.write(f'energy (eV): {self.ctx.energy}\n')
 
         # write structure with energy
         if self.inputs.label:
-            output_structure_name = self.inputs.label.rstrip('/') + '.xyz'
+            output_structure_name = \
+                self.get_result_path(self.inputs.label.rstrip('/') + '.xyz')
             output_structure_dir = os.path.dirname(output_structure_name)
             if output_structure_dir:
                 os.makedirs(output_structure_dir, exist_ok=True)
@@ -158,6 +236,119 @@ class EnergySingleWorkChain(BaseSingleWorkChain):
             if self.ctx.forces:
                 atoms.set_array('forces', np.array(self.ctx.forces))
             atoms.write(output_structure_name)
+        else:
+            output_structure_name = None
+        record_result(self.inputs.resdir, 'Energy', self.ctx.energy_workchain,
+                      label=self.inputs.label, energy=self.ctx.energy,
+                      structure_file=output_structure_name)
+
+
+class EnergyFarmingWorkChain(BaseSingleWorkChain):
+    """Energy and forces of many structures in one scheduler job
+
+    Structures are packed into one cp2k FARMING calculation,
+    results are split back by key of `structures`. The cp2k parser is
+    written for output of one force evaluation and only sees the master
+    output of FARMING, so its exit status is not trusted, results are read
+    from retrieved `job_*.out` and at least one of them is required
+    """
+
+    @classmethod
+    def define(cls, spec):
+        super(EnergyFarmingWorkChain, cls).define(spec)
+        # directory of output structures, relative to resdir
+        spec.input('label', default='coords',
+                   valid_type=str, required=False, non_db=True)
+        spec.input_namespace('structures',
+                             valid_type=StructureData, dynamic=True)
+        # number of jobs running at the same time in the allocation
+        spec.input('ngroups', default=1,
+                   valid_type=int, required=False, non_db=True)
+
+        spec.outline(
+            cls.check_config_machine,
+            cls.submit_farming,
+            cls.inspect_farming,
+            cls.get_energy_forces,
+            cls.write_results
+        )
+
+        spec.output_namespace('energy', valid_type=Float, dynamic=True)
+        spec.output_namespace('forces', valid_type=List, dynamic=True)
+        spec.output_namespace('converged', valid_type=Bool, dynamic=True)
+
+        spec.exit_code(400, 'ERROR_NO_JOB_OUTPUT',
+                       message='No output of farming jobs is retrieved')
+
+    def submit_farming(self):
+        inp = EnergyFarmingInputSets(structures=self.inputs.structures,
+                                     config=self.ctx.config,
+                                     kind_section=self.inputs.kind_section,
+                                     ngroups=self.inputs.ngroups)
+        self.ctx.job_names = inp.job_names
+        pre = EnergyFarmingPreprocessor(inp, self.ctx.machine)
+        builder = pre.builder
+        node = self.submit(builder)
+        self.to_context(farming_calculation=node)
+
+    def inspect_farming(self):
+        node = self.ctx.farming_calculation
+        if node.is_finished_ok:
+            return
+        job_outputs = {f'{job_name}.out'
+                       for job_name in self.ctx.job_names.values()}
+        retrieved_names = (set(node.outputs.retrieved.list_object_names())
+                           if 'retrieved' in node.outputs else set())
+        if not job_outputs & retrieved_names:
+            return self.exit_codes.ERROR_NO_JOB_OUTPUT
+        self.report(f'{node.process_label}<{node.pk}> finished with exit '
+                    f'status {node.exit_status}, read outputs of jobs')
+
+    def get_energy_forces(self):
+        retrieved = self.ctx.farming_calculation.outputs.retrieved
+        self.ctx.energy, self.ctx.forces = {}, {}
+        for key, job_name in self.ctx.job_names.items():
+            try:
+                output = retrieved.get_object_content(f'{job_name}.out')
+            except (FileNotFoundError, OSError):
+                self.report(f'No output of {key} ({job_name}), skip it')
+                continue
+            energy = get_energy_info(io.StringIO(output))
+            if energy is None:
+                self.report(f'No energy of {key} ({job_name}), skip it')
+                continue
+            self.ctx.energy[key] = energy * AU2EV
+            try:
+                self.ctx.forces[key] = get_forces_info(io.StringIO(output))
+            except AttributeError:
+                self.ctx.forces[key] = []
+            converged = bool(re.search(r'SCF run converged in \s+\d+ steps',
+                                       output))
+            self.out(f'energy.{key}', Float(self.ctx.energy[key]).store())
+            self.out(f'forces.{key}', List(list=self.ctx.forces[key]).store())
+            self.out(f'converged.{key}', Bool(converged).store())
+
+    def write_results(self):
+        with open(self.get_result_path(RESULT_NAME), 'a') as f:
+            f.write(f'# Step: Energy Farming, '
+                    f'PK: {self.ctx.farming_calculation.pk}\n')
+            for key, energy in self.ctx.energy.items():
+                f.write(f'{key} energy (eV): {energy}\n')
+
+        # write structures with energy
+        output_dir = self.get_result_path(self.inputs.label)
+        os.makedirs(output_dir, exist_ok=True)
+        for key, energy in self.ctx.energy.items():
+            output_structure_name = os.path.join(output_dir, f'{key}.xyz')
+            atoms = self.inputs.structures[key].get_ase()
+            atoms.info.update({'E': f'{energy} eV'})
+            if self.ctx.forces[key]:
+                atoms.set_array('forces', np.array(self.ctx.forces[key]))
+            atoms.write(output_structure_name)
+            record_result(self.inputs.resdir, 'Energy Farming',
+                          self.ctx.farming_calculation,
+                          label=os.path.join(self.inputs.label, key),
+                          energy=energy, structure_file=output_structure_name)
 
 
 class GeooptSingleWorkChain(BaseSingleWorkChain):
@@ -169,27 +360,112 @@ class GeooptSingleWorkChain(BaseSingleWorkChain):
         spec.input('structure',
                    valid_type=StructureData, required=True)
 
+        # reuse finished calculation with identical inputs
+        spec.input('use_cache', default=False,
+                   valid_type=bool, required=False, non_db=True)
+
+        # restart from last geometry and wavefunction when out of walltime,
+        # at most `max_restarts` times
+        spec.input('max_restarts', default=3,
+                   valid_type=int, required=False, non_db=True)
+        # also restart if finished ok but not converged, e.g. MAX_ITER
+        # reached, else last geometry of it is the result
+        spec.input('restart_not_converged', default=False,
+                   valid_type=bool, required=False, non_db=True)
+        # cp2k stops itself at this fraction of max_wallclock_seconds,
+        # to leave time for writing restart files
+        spec.input('walltime_fraction', default=0.95,
+                   valid_type=float, required=False, non_db=True)
+
         spec.outline(
             cls.check_config_machine,
-            cls.submit_geoopt,
-            cls.inspect_geoopt,
+            cls.init_geoopt,
+            while_(cls.should_run_geoopt)(
+                cls.submit_geoopt,
+                cls.inspect_geoopt,
+            ),
             cls.get_structure_geoopt,
             cls.write_results
         )
 
         spec.output('structure_geoopt', valid_type=StructureData)
 
+        spec.exit_code(400, 'ERROR_GEOOPT_FAILED',
+                       message='Geoopt failed, not by walltime')
+        spec.exit_code(401, 'ERROR_MAX_RESTARTS',
+                       message='Geoopt is not finished after max_restarts')
+
+    GEOOPT_COMPLETED = 'GEOMETRY OPTIMIZATION COMPLETED'
+
+    def init_geoopt(self):
+        self.ctx.structure = self.inputs.structure
+        self.ctx.parent_calc_folder = None
+        self.ctx.restarts = 0
+        self.ctx.geoopt_finished = False
+
+    def should_run_geoopt(self):
+        return not self.ctx.geoopt_finished
+
     def submit_geoopt(self):
-        inp = GeooptInputSets(structure=self.inputs.structure,
+        inp = GeooptInputSets(structure=self.ctx.structure,
                               config=self.ctx.config,
                               kind_section=self.inputs.kind_section)
         pre = GeooptPreprocessor(inp, self.ctx.machine)
         builder = pre.builder
-        node = self.submit(builder)
+        runtime_parameters = {}
+        walltime = builder.cp2k.metadata.options.get('max_wallclock_seconds')
+        if walltime:
+            runtime_parameters = {'GLOBAL': {
+                'WALLTIME': int(walltime * self.inputs.walltime_fraction)}}
+        if self.ctx.parent_calc_folder is None:
+            node = self.submit_or_reuse(pre, builder, runtime_parameters)
+        else:
+            update_cp2k_parameters(builder, runtime_parameters)
+            set_wfn_restart(builder, self.ctx.parent_calc_folder)
+            node = self.submit(builder)
         self.to_context(geoopt_workchain=node)
 
     def inspect_geoopt(self):
-        inspect_node(self.ctx.geoopt_workchain)
+        node = self.ctx.geoopt_workchain
+        if node.is_finished_ok:
+            output = node.outputs.retrieved.get_object_content('aiida.out')
+            if (self.GEOOPT_COMPLETED in output
+                    or not self.inputs.restart_not_converged):
+                self.ctx.geoopt_finished = True
+                return
+            reason = 'stopped before converged'
+        elif is_out_of_walltime(node):
+            reason = 'out of walltime'
+        else:
+            self.report(f'Geoopt<{node.pk}> failed with exit status '
+                        f'{node.exit_status}')
+            return self.exit_codes.ERROR_GEOOPT_FAILED
+        if self.ctx.restarts >= self.inputs.max_restarts:
+            self.report(f'Geoopt<{node.pk}> {reason}, '
+                        f'but reach max_restarts {self.inputs.max_restarts}')
+            return self.exit_codes.ERROR_MAX_RESTARTS
+        self.restart_geoopt(node, reason)
+
+    def restart_geoopt(self, node, reason):
+        """Restart geoopt from last geometry and wavefunction of node
+        """
+        # failed Cp2kBaseWorkChain has no outputs, use its last calculation
+        remote_folder = get_last_calculation(node).outputs.remote_folder
+        with remote_folder.get_authinfo().get_transport() as transport:
+            frames = get_last_frames_on_remote(
+                transport, remote_folder.get_remote_path(), '*-pos-1.xyz')
+        if not frames:
+            self.report(f'No trajectory of Geoopt<{node.pk}> on remote, '
+                        f'restart from previous structure')
+        else:
+            last_atoms = get_last_frame(
+                io.StringIO(frames[sorted(frames)[-1]]),
+                cell=self.ctx.structure.cell, pbc=self.ctx.structure.pbc)
+            self.ctx.structure = StructureData(ase=last_atoms)
+        self.ctx.parent_calc_folder = remote_folder
+        self.ctx.restarts += 1
+        self.report(f'Geoopt<{node.pk}> {reason}, restart '
+                    f'{self.ctx.restarts}/{self.inputs.max_restarts}')
 
     def get_structure_geoopt(self):
         retrieved = self.ctx.geoopt_workchain.outputs.retrieved
@@ -206,17 +482,23 @@ class GeooptSingleWorkChain(BaseSingleWorkChain):
         self.out('structure_geoopt', self.ctx.structure_geoopt.store())
 
     def write_results(self):
-        os.chdir(self.inputs.resdir)
         # write structure file after geoopt
         output_structure_name = f'{self.inputs.label}_geoopt.xyz'
-        write_xyz_from_structure(self.ctx.structure_geoopt,
-                                 output_file=output_structure_name)
+        write_xyz_from_structure(
+            self.ctx.structure_geoopt,
+            output_file=self.get_result_path(output_structure_name))
 
-        with open(RESULT_NAME, 'a') as f:
+        with open(self.get_result_path(RESULT_NAME), 'a') as f:
             f.write(f'# Step: Geoopt, PK: {self.ctx.geoopt_workchain.pk}\n')
             f.write(f'structure file: {output_structure_name}\n')
             f.write(f'energy (eV): '
                     f'{self.ctx.structure_geoopt.get_attribute("energy")} eV\n')
+        record_result(self.inputs.resdir, 'Geoopt', self.ctx.geoopt_workchain,
+                      label=self.inputs.label,
+                      energy=self.ctx.structure_geoopt.get_attribute('energy'),
+                      structure_file=self.get_result_path(
+                          output_structure_name),
+                      restarts=self.ctx.restarts)
 
 
 class NebSingleWorkChain(BaseSingleWorkChain):
@@ -231,6 +513,9 @@ class NebSingleWorkChain(BaseSingleWorkChain):
                              valid_type=StructureData, dynamic=True)
         spec.input('machine', default=default_cp2k_large_machine,
                    valid_type=dict, required=False, non_db=True)
+        # only transfer last frame of each replica, cut on remote
+        spec.input('last_frame_on_remote', default=False,
+                   valid_type=bool, required=False, non_db=True)
 
         spec.outline(
             cls.check_config_machine,
@@ -273,27 +558,51 @@ class NebSingleWorkChain(BaseSingleWorkChain):
                 }
             })
 
-        pre = NebPreprocessor(inp, self.ctx.machine)
+        pre = NebPreprocessor(
+            inp, self.ctx.machine,
+            retrieve_replicas=not self.inputs.last_frame_on_remote)
         builder = pre.builder
         builder.cp2k.file = self.inputs.structures
         node = self.submit(builder)
         self.to_context(neb_workchain=node)
 
     def inspect_neb(self):
-        inspect_node(self.ctx.neb_workchain)
+        node = self.ctx.neb_workchain
+        if not node.is_finished_ok:
+            # e.g. whether band is stalled or close to converged at walltime
+            try:
+                progress = get_neb_progress(node)
+                self.report(f'NEB<{node.pk}> failed, band progress: '
+                            f'{progress}')
+            except Exception as e:
+                self.report(f'NEB<{node.pk}> failed, no band progress: {e}')
+        inspect_node(node)
 
     def get_energy_curve_data(self):
-        retrieved = self.ctx.neb_workchain.outputs.retrieved
+        if self.inputs.last_frame_on_remote:
+            remote_folder = self.ctx.neb_workchain.outputs.remote_folder
+            with remote_folder.get_authinfo().get_transport() as transport:
+                replica_frames = get_last_frames_on_remote(
+                    transport, remote_folder.get_remote_path(),
+                    NebPreprocessor.REPLICA_PATTERN)
+            replica_names = list(replica_frames)
+
+            def open_replica(name):
+                return io.StringIO(replica_frames[name])
+        else:
+            retrieved = self.ctx.neb_workchain.outputs.retrieved
+            replica_names = retrieved.list_object_names()
+            open_replica = retrieved.open
         # get list of `Atoms`
         replica_regex = re.compile(r'.*-pos-Replica_nr_(\d+)-1.xyz')
         replica_file_list = sorted(filter(lambda x: replica_regex.match(x),
-                                          retrieved.list_object_names()),
+                                          replica_names),
                                    key=lambda x: int(replica_regex.
                                                      match(x).group(1)))
         replica_traj = []
         energy_list = []
         for replica_file in replica_file_list:
-            with retrieved.open(replica_file) as f:
+            with open_replica(replica_file) as f:
                 replica_atoms = get_last_frame(f, cell=self.ctx.cell,
                                                pbc=self.ctx.pbc)
                 energy = replica_atoms.info['E'] * AU2EV
@@ -309,36 +618,46 @@ class NebSingleWorkChain(BaseSingleWorkChain):
 
     def get_transition_state(self):
         traj_data = self.ctx.traj_for_energy_curve
-        structure_list = [traj_data.get_step_structure(i) for i in
-                          traj_data.get_stepids()]
         energy_array = traj_data.get_array('energy')
         self.ctx.structure_with_max_energy = \
-            structure_list[energy_array.argmax()]
+            traj_data.get_step_structure(int(energy_array.argmax()))
         max_energy = energy_array.max()
         self.ctx.structure_with_max_energy.set_attribute('energy', max_energy)
         self.out('transition_state',
                  self.ctx.structure_with_max_energy.store())
 
     def write_results(self):
-        os.chdir(self.inputs.resdir)
         # write trajactory for energy curve
         output_traj_name = 'images_traj.xyz'
-        write_xyz_from_trajectory(self.ctx.traj_for_energy_curve,
-                                  output_file=output_traj_name)
+        write_xyz_from_trajectory(
+            self.ctx.traj_for_energy_curve,
+            output_file=self.get_result_path(output_traj_name),
+            pbc=self.ctx.pbc)
         # plot potential energy curve with data in traj_for_energy_curve
         output_energy_curve_name = 'potential_energy_path.png'
-        plot_energy_curve(self.ctx.traj_for_energy_curve,
-                          output_file=output_energy_curve_name)
+        render_in_background(
+            plot_energy_path,
+            list(self.ctx.traj_for_energy_curve.symbols),
+            self.ctx.traj_for_energy_curve.get_array('energy'),
+            output_file=self.get_result_path(output_energy_curve_name))
         # write transition state structure
         output_ts_name = 'transition_state.xyz'
-        write_xyz_from_structure(self.ctx.structure_with_max_energy,
-                                 output_file=output_ts_name)
+        write_xyz_from_structure(
+            self.ctx.structure_with_max_energy,
+            output_file=self.get_result_path(output_ts_name))
 
-        with open(RESULT_NAME, 'a') as f:
+        with open(self.get_result_path(RESULT_NAME), 'a') as f:
             f.write(f'# Step: NEB, PK: {self.ctx.neb_workchain.pk}\n')
             f.write(f'trajectory file: {output_traj_name}\n')
             f.write(f'potential energy curve: {output_energy_curve_name}\n')
             f.write(f'transition state file: {output_ts_name}\n')
+        record_result(
+            self.inputs.resdir, 'NEB', self.ctx.neb_workchain,
+            label=self.inputs.label,
+            energy=self.ctx.structure_with_max_energy.get_attribute('energy'),
+            structure_file=self.get_result_path(output_ts_name),
+            trajectory_file=self.get_result_path(output_traj_name),
+            energy_curve_file=self.get_result_path(output_energy_curve_name))
 
 
 class FrequencySingleWorkChain(BaseSingleWorkChain):
@@ -350,6 +669,10 @@ class FrequencySingleWorkChain(BaseSingleWorkChain):
         spec.input('machine', default=default_cp2k_large_machine,
                    valid_type=dict, required=False, non_db=True)
 
+        # reuse finished calculation with identical inputs
+        spec.input('use_cache', default=False,
+                   valid_type=bool, required=False, non_db=True)
+
         spec.outline(
             cls.check_config_machine,
             cls.submit_frequency,
@@ -365,8 +688,7 @@ class FrequencySingleWorkChain(BaseSingleWorkChain):
                                  config=self.ctx.config,
                                  kind_section=self.inputs.kind_section)
         pre = FrequencyPreprocessor(inp, self.ctx.machine)
-        builder = pre.builder
-        node = self.submit(builder)
+        node = self.submit_or_reuse(pre)
         self.to_context(frequency_workchain=node)
 
     def inspect_frequency(self):
@@ -383,17 +705,28 @@ class FrequencySingleWorkChain(BaseSingleWorkChain):
         self.out('vibrational_frequency', self.ctx.frequency_data.store())
 
     def write_results(self):
-        os.chdir(self.inputs.resdir)
         # write frequency value
         output_frequency_name = 'frequency.txt'
         freq_list = self.ctx.frequency_data.get_list()
-        np.savetxt('frequency.txt', freq_list, fmt='%-15s%-15s%-15s',
-                   header='VIB|Frequency (cm^-1)')
+        np.savetxt(self.get_result_path(output_frequency_name), freq_list,
+                   fmt='%-15s%-15s%-15s', header='VIB|Frequency (cm^-1)')
 
-        with open(RESULT_NAME, 'a') as f:
+        with open(self.get_result_path(RESULT_NAME), 'a') as f:
             f.write(f'# Step: Frequency, '
                     f'PK: {self.ctx.frequency_workchain.pk}\n')
             f.write(f'frequency file: {output_frequency_name}')
+        record_result(self.inputs.resdir, 'Frequency',
+                      self.ctx.frequency_workchain, label=self.inputs.label,
+                      frequency_file=self.get_result_path(
+                          output_frequency_name))
+
+
+def validate_init_model(value, _=None):
+    """Reject `init_model` if installed DpCalculation has no port for it
+    """
+    if (value is not None) and (not DPPreprocessor.support_init_model()):
+        return (f'DpCalculation has no `{DPPreprocessor.INIT_MODEL_PORT}` '
+                f'input to initialise from model, use DPPackWorkChain')
 
 
 class DPSingleWorkChain(BaseSingleWorkChain):
@@ -408,6 +741,11 @@ class DPSingleWorkChain(BaseSingleWorkChain):
                    required=True, non_db=True)
         spec.input('machine', default=default_dpmd_gpu_machine,
                    valid_type=dict, required=False, non_db=True)
+        # initialise from a trained model, and train with fewer steps
+        spec.input('init_model', valid_type=SinglefileData, required=False,
+                   validator=validate_init_model)
+        spec.input('init_steps_ratio', default=0.2,
+                   valid_type=float, required=False, non_db=True)
 
         spec.outline(
             cls.check_config_machine,
@@ -425,7 +763,9 @@ class DPSingleWorkChain(BaseSingleWorkChain):
             datadirs=self.inputs.datadirs,
             kinds=self.inputs.kinds,
             descriptor_sel=self.inputs.descriptor_sel,
-            config=self.ctx.config
+            config=self.ctx.config,
+            init_model=self.inputs.get('init_model'),
+            init_steps_ratio=self.inputs.init_steps_ratio
         )
         pre = DPPreprocessor(inp, self.ctx.machine)
         builder = pre.builder
@@ -436,20 +776,107 @@ class DPSingleWorkChain(BaseSingleWorkChain):
         inspect_node(self.ctx.dpmd_workchain)
 
     def get_pb(self):
-        with self.ctx.dpmd_workchain.outputs.retrieved.open('model.pb',
-                                                            mode='rb') as f:
-            model = SinglefileData(file=f)
-        with self.ctx.dpmd_workchain.outputs.retrieved.open('lcurve.out',
-                                                            mode='rb') as f:
-            lcurve = SinglefileData(file=f)
-        self.out('model', model.store())
-        self.out('lcurve', lcurve.store())
+        retrieved = self.ctx.dpmd_workchain.outputs.retrieved
+        for output_name, filename in [('model', 'model.pb'),
+                                      ('lcurve', 'lcurve.out')]:
+            # handle is copied to repository by chunks, not read in memory
+            with retrieved.open(filename, mode='rb') as f:
+                singlefile = SinglefileData(file=f, filename=filename)
+            self.out(output_name, singlefile.store())
 
     def write_results(self):
-        os.chdir(self.inputs.resdir)
-        with open(RESULT_NAME, 'a') as f:
+        with open(self.get_result_path(RESULT_NAME), 'a') as f:
             f.write(f'# Step: Deepmd Training, '
                     f'PK: {self.ctx.dpmd_workchain.pk}\n')
+        record_result(self.inputs.resdir, 'Deepmd Training',
+                      self.ctx.dpmd_workchain, label=self.inputs.label)
+
+
+class DPPackWorkChain(BaseSingleWorkChain):
+    """Train `num_models` deepmd models concurrently in one job
+    """
+    TYPE = 'deepmd'
+
+    @classmethod
+    def define(cls, spec):
+        super(DPPackWorkChain, cls).define(spec)
+        spec.input('datadirs', valid_type=list, required=True, non_db=True)
+        spec.input('kinds', valid_type=list, required=True, non_db=True)
+        spec.input('descriptor_sel', valid_type=list,
+                   required=True, non_db=True)
+        spec.input('num_models', default=4,
+                   valid_type=int, required=False, non_db=True)
+        spec.input('dp_command', default='dp',
+                   valid_type=str, required=False, non_db=True)
+        # {model_{i}: trained model}, initialise each model from one of them
+        # by `dp train --init-frz-model`, and train with fewer steps
+        spec.input_namespace('init_models', valid_type=SinglefileData,
+                             dynamic=True, required=False)
+        spec.input('init_steps_ratio', default=0.2,
+                   valid_type=float, required=False, non_db=True)
+        # code of machine should be a shell, e.g. bash,
+        # models are distributed to `ngpu` GPUs of machine in turn
+        spec.input('machine', default=default_dpmd_pack_machine,
+                   valid_type=dict, required=False, non_db=True)
+
+        spec.outline(
+            cls.check_config_machine,
+            cls.submit_pack,
+            cls.inspect_pack,
+            cls.get_pbs,
+            cls.write_results
+        )
+
+        spec.output_namespace('models', valid_type=SinglefileData,
+                              dynamic=True)
+        spec.output_namespace('lcurves', valid_type=SinglefileData,
+                              dynamic=True)
+
+        spec.exit_code(400, 'ERROR_PACK_FAILED',
+                       message='Training of some models failed')
+
+    def submit_pack(self):
+        init_models = self.inputs.get('init_models')
+        if init_models:
+            init_models = [init_models[f'model_{i}']
+                           for i in range(self.inputs.num_models)]
+        inp = DPInputSets(
+            datadirs=self.inputs.datadirs,
+            kinds=self.inputs.kinds,
+            descriptor_sel=self.inputs.descriptor_sel,
+            config=self.ctx.config,
+            init_model=init_models or None,
+            init_steps_ratio=self.inputs.init_steps_ratio
+        )
+        pre = DPPackPreprocessor(inp, self.ctx.machine,
+                                 num_models=self.inputs.num_models,
+                                 dp_command=self.inputs.dp_command)
+        node = self.submit(pre.builder)
+        self.to_context(pack_calculation=node)
+
+    def inspect_pack(self):
+        node = self.ctx.pack_calculation
+        if not node.is_finished_ok:
+            self.report(f'{node.process_label}<{node.pk}> failed with exit '
+                        f'status {node.exit_status}')
+            return self.exit_codes.ERROR_PACK_FAILED
+
+    def get_pbs(self):
+        retrieved = self.ctx.pack_calculation.outputs.retrieved
+        for i in range(self.inputs.num_models):
+            for namespace, filename in [('models', 'model.pb'),
+                                        ('lcurves', 'lcurve.out')]:
+                with retrieved.open(f'member_{i}/{filename}', mode='rb') as f:
+                    singlefile = SinglefileData(file=f, filename=filename)
+                self.out(f'{namespace}.model_{i}', singlefile.store())
+
+    def write_results(self):
+        with open(self.get_result_path(RESULT_NAME), 'a') as f:
+            f.write(f'# Step: Deepmd Packed Training, '
+                    f'PK: {self.ctx.pack_calculation.pk}\n')
+        record_result(self.inputs.resdir, 'Deepmd Packed Training',
+                      self.ctx.pack_calculation, label=self.inputs.label,
+                      num_models=self.inputs.num_models)
 
 
 class QBCBatchWorkChain(BaseSingleWorkChain):
@@ -463,8 +890,23 @@ class QBCBatchWorkChain(BaseSingleWorkChain):
         spec.input('template', valid_type=str, default='default', non_db=True)
         spec.input('variables', valid_type=dict, required=False, non_db=True)
         spec.input('graphs', valid_type=list, required=False, non_db=True)
+        # if > 1, run `parallelism` tasks per GPU concurrently in one job
+        # by LammpsPackCalculation, with code and `ngpu` of `pack_machine`
         spec.input('parallelism', default=1,
                    valid_type=int, required=False, non_db=True)
+        spec.input('lmp_command', default='lmp',
+                   valid_type=str, required=False, non_db=True)
+        spec.input('pack_machine', default=default_lmp_pack_machine,
+                   valid_type=dict, required=False, non_db=True)
+        # retrieve all model_devi.out in one compressed archive
+        spec.input('retrieve_in_bundle', default=True,
+                   valid_type=bool, required=False, non_db=True)
+        # screen model_devi.out on remote, only retrieve index and histogram
+        spec.input('screen_on_remote', default=False,
+                   valid_type=bool, required=False, non_db=True)
+        # python executable on remote computer to screen model_devi.out
+        spec.input('remote_python', default='python3',
+                   valid_type=str, required=False, non_db=True)
         spec.input('model_devi.skip_images', default=0,
                    valid_type=int, required=False, non_db=True)
         spec.input('model_devi.force_low_limit', default=0.05,
@@ -498,7 +940,16 @@ class QBCBatchWorkChain(BaseSingleWorkChain):
                            init_template=self.inputs.template,
                            variables=self.inputs.variables,
                            graphs=self.inputs.graphs)
-        pre = QBCPreprocessor(inp, load_machine(self.inputs.machine))
+        if self.inputs.parallelism > 1:
+            pre = QBCPackPreprocessor(
+                inp, load_machine(self.inputs.pack_machine),
+                retrieve_model_devi=not self.inputs.screen_on_remote,
+                parallelism=self.inputs.parallelism,
+                lmp_command=self.inputs.lmp_command)
+        else:
+            pre = QBCPreprocessor(
+                inp, load_machine(self.inputs.machine),
+                retrieve_model_devi=not self.inputs.screen_on_remote)
         builder = pre.builder
         node = self.submit(builder)
         self.to_context(batch_workchain=node)
@@ -511,30 +962,42 @@ class QBCBatchWorkChain(BaseSingleWorkChain):
         )
 
     def get_model_devi(self):
-        label = self.inputs.label or self.inputs.resdir
-        os.chdir(label)
+        self.ctx.model_devi_dir = self.get_result_path(self.inputs.label)
         remote_folder = self.ctx.batch_workchain.outputs.remote_folder
-        conditions = [dict(zip(self.inputs.variables.keys(), v)) for v in
-                      product(*self.inputs.variables.values())]
+        conditions = get_conditions(self.inputs.variables)
         self.ctx.n_s = len(self.inputs.structures)
         self.ctx.n_c = len(conditions)
+        model_devi_files = {}
         for c, condition in enumerate(conditions):
-            condition_dir = os.path.abspath(f'condition_{c}')
+            condition_dir = os.path.join(self.ctx.model_devi_dir,
+                                         f'condition_{c}')
             os.makedirs(condition_dir, exist_ok=True)
             # condition.json
             with open(os.path.join(condition_dir, 'condition.json'),
                       'w') as f:
                 json.dump(condition, f, sort_keys=True, indent=2)
             # model_devi_{s}.out
-            model_devi_list = []
             for s in range(self.ctx.n_s):
-                model_devi_filename = os.path.join(condition_dir,
-                                                   f'model_devi_{s}.out')
-                remote_folder.getfile(f'{c + s * self.ctx.n_c}/model_devi.out',
-                                      model_devi_filename)
-                model_devi_list.append(model_devi_filename)
+                model_devi_files[f'{c + s * self.ctx.n_c}/model_devi.out'] = \
+                    os.path.join(condition_dir, f'model_devi_{s}.out')
+        self.ctx.screened_on_remote = False
+        if self.inputs.screen_on_remote:
+            try:
+                self.screen_model_devi(remote_folder, list(model_devi_files))
+                return
+            except (OSError, ValueError) as e:
+                self.report(f'Failed to screen model_devi.out on remote, '
+                            f'retrieve them: {e}')
+        self.retrieve_model_devi(remote_folder, model_devi_files)
+        for c in range(self.ctx.n_c):
+            condition_dir = os.path.join(self.ctx.model_devi_dir,
+                                         f'condition_{c}')
+            model_devi_list = [os.path.join(condition_dir,
+                                            f'model_devi_{s}.out')
+                               for s in range(self.ctx.n_s)]
             # force_devi_distribution.jpg
-            get_model_devi_distribution(
+            render_in_background(
+                get_model_devi_distribution,
                 model_devi_list,
                 self.inputs.model_devi.force_low_limit,
                 self.inputs.model_devi.force_high_limit,
@@ -542,21 +1005,93 @@ class QBCBatchWorkChain(BaseSingleWorkChain):
                 'Distribution of force deviation',
                 os.path.join(condition_dir, 'force_devi_distribution.jpg'))
 
+    def retrieve_model_devi(self, remote_folder, model_devi_files):
+        """Retrieve model_devi.out files, in one bundle if possible
+
+        Args:
+            remote_folder (aiida.orm.RemoteData): remote folder of batch
+            model_devi_files (dict): {remote relative path: local path}
+
+        """
+        if self.inputs.retrieve_in_bundle:
+            try:
+                with tempfile.TemporaryDirectory(
+                        dir=self.ctx.model_devi_dir) as tmpdir:
+                    with remote_folder.get_authinfo().get_transport() \
+                            as transport:
+                        get_files_in_bundle(transport,
+                                            remote_folder.get_remote_path(),
+                                            ['*/model_devi.out'], tmpdir)
+                    for remotename, localname in model_devi_files.items():
+                        os.replace(os.path.join(tmpdir, remotename),
+                                   localname)
+                        # mtime from archive may be older than cache
+                        os.utime(localname)
+                return
+            except (OSError, tarfile.TarError) as e:
+                self.report(f'Failed to retrieve model_devi.out in bundle, '
+                            f'retrieve them one by one: {e}')
+        for remotename, localname in model_devi_files.items():
+            remote_folder.getfile(remotename, localname)
+
+    def screen_model_devi(self, remote_folder, remotenames):
+        """Screen model_devi.out on remote, only get index and histogram
+
+        Args:
+            remote_folder (aiida.orm.RemoteData): remote folder of batch
+            remotenames (list[str]): relative paths of model_devi.out
+
+        """
+        with remote_folder.get_authinfo().get_transport() as transport:
+            screen_results = screen_model_devi_on_remote(
+                transport, remote_folder.get_remote_path(), remotenames,
+                python=self.inputs.remote_python, **self.inputs.model_devi)
+        self.ctx.screened_on_remote = True
+        self.ctx.model_devi_index = [
+            {k: screen_results[f'{i}/model_devi.out'][k]
+             for k in ('candidate', 'candidate_devi_f', 'failed', 'accurate')}
+            for i in range(self.ctx.n_c * self.ctx.n_s)
+        ]
+        for c in range(self.ctx.n_c):
+            condition_dir = os.path.join(self.ctx.model_devi_dir,
+                                         f'condition_{c}')
+            histogram = FixedBinHistogram()
+            for s in range(self.ctx.n_s):
+                result = screen_results[f'{c + s * self.ctx.n_c}/'
+                                        f'model_devi.out']
+                histogram.update_counts(result['counts'], result['total'])
+            # force_devi_distribution.jpg
+            render_in_background(
+                plot_model_devi_distribution,
+                histogram,
+                self.inputs.model_devi.force_low_limit,
+                self.inputs.model_devi.force_high_limit,
+                'Distribution of force deviation',
+                os.path.join(condition_dir, 'force_devi_distribution.jpg'))
+
     def get_model_devi_index(self):
+        if self.ctx.screened_on_remote:
+            self.out('model_devi_index',
+                     List(list=self.ctx.model_devi_index).store())
+            return
         model_devi_index = [{}] * (self.ctx.n_c * self.ctx.n_s)
         for c in range(self.ctx.n_c):
             for s in range(self.ctx.n_s):
-                filename = os.path.abspath(f'condition_{c}/model_devi_{s}.out')
+                filename = os.path.join(self.ctx.model_devi_dir,
+                                        f'condition_{c}',
+                                        f'model_devi_{s}.out')
                 model_devi_index[c + s * self.ctx.n_c] = \
                     parse_model_devi_index(filename, **self.inputs.model_devi)
         self.out('model_devi_index', List(list=model_devi_index).store())
 
     def write_results(self):
-        os.chdir(self.inputs.resdir)
-        with open(RESULT_NAME, 'a') as f:
+        with open(self.get_result_path(RESULT_NAME), 'a') as f:
             f.write(f'# Step: Lammps Model Deviation, '
                     f'PK: {self.ctx.batch_workchain.pk}\n')
             # f.write(f'candidate index: {self.ctx.candidate_list}\n')
+        record_result(self.inputs.resdir, 'Lammps Model Deviation',
+                      self.ctx.batch_workchain, label=self.inputs.label,
+                      model_devi_dir=self.ctx.model_devi_dir)
 
         # if self.inputs.label:
         #     output_model_devi_name = self.inputs.label.rstrip('/') + '.out'
@@ -0,0 +1,37 @@
+import os
+import stat
+import subprocess
+
+import pytest
+
+# fixtures of temporary aiida profile, e.g. `aiida_profile`
+try:
+    from aiida.tools.pytest_fixtures import *  # noqa: F401,F403
+except ImportError:
+    pass
+
+
+@pytest.fixture
+def run_pack_script(tmp_path):
+    """Run script of packed calculation in `tmp_path` with a fake program
+
+    The returned function takes `get_script`, which gets content of script
+    from path of the fake program, `program` as content of the fake
+    program, directories to create and additional environment variables
+    """
+
+    def run(get_script, program, dirs, env=None):
+        fake_program = tmp_path / 'program'
+        fake_program.write_text(program)
+        fake_program.chmod(fake_program.stat().st_mode | stat.S_IEXEC)
+        for directory in dirs:
+            (tmp_path / directory).mkdir()
+        script = tmp_path / 'pack.sh'
+        script.write_text(get_script(str(fake_program)))
+        _env = {k: v for k, v in os.environ.items()
+                if k != 'CUDA_VISIBLE_DEVICES'}
+        _env.update(env or {})
+        return subprocess.run(['bash', str(script)], cwd=tmp_path, env=_env,
+                              capture_output=True, text=True)
+
+    return run
@@ -0,0 +1,256 @@
+import os
+import sys
+import tarfile
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip('aiida')
+from aiida.transports.plugins.local import LocalTransport
+from ecint.postprocessor.parse import parse_model_devi_index
+from ecint.postprocessor.utils import BandConvergenceMonitor, \
+    get_files_in_bundle, get_last_frames_on_remote, get_neb_progress, \
+    screen_model_devi_on_remote, write_file_from_node
+
+
+class CountingTransport(LocalTransport):
+    """LocalTransport counting operations which need a remote round trip"""
+
+    def __init__(self, *args, **kwargs):
+        super(CountingTransport, self).__init__(*args, **kwargs)
+        self.round_trips = 0
+
+    def getfile(self, *args, **kwargs):
+        self.round_trips += 1
+        return super(CountingTransport, self).getfile(*args, **kwargs)
+
+    def exec_command_wait(self, *args, **kwargs):
+        self.round_trips += 1
+        return super(CountingTransport, self).exec_command_wait(*args,
+                                                                **kwargs)
+
+
+@pytest.fixture
+def remote_path(tmp_path):
+    remote = tmp_path / 'remote'
+    for i in range(100):
+        (remote / str(i)).mkdir(parents=True)
+        with open(remote / str(i) / 'model_devi.out', 'w') as f:
+            f.write(f'#  step  max_devi_e\n{i}  0.1\n')
+        # files not matching pattern should not be retrieved
+        with open(remote / str(i) / 'log.lammps', 'w') as f:
+            f.write('log\n')
+    return str(remote)
+
+
+def test_get_files_in_bundle(remote_path, tmp_path):
+    localpath = str(tmp_path / 'bundle')
+    with CountingTransport() as transport:
+        names = get_files_in_bundle(transport, remote_path,
+                                    ['*/model_devi.out'], localpath)
+        # pack, transfer and remove, instead of one transfer for each file
+        assert transport.round_trips == 3
+    assert len(names) == 100
+    with open(os.path.join(localpath, '42', 'model_devi.out')) as f:
+        assert f.read().splitlines()[1] == '42  0.1'
+    assert not os.path.exists(os.path.join(localpath, '42', 'log.lammps'))
+    # archive is removed on remote
+    assert not [name for name in os.listdir(remote_path)
+                if name.endswith('.tar.gz')]
+
+
+class TruncatingTransport(LocalTransport):
+    """LocalTransport which truncates transferred archive"""
+
+    def getfile(self, remotepath, localpath, *args, **kwargs):
+        with open(remotepath, 'rb') as f:
+            content = f.read()
+        with open(localpath, 'wb') as f:
+            f.write(content[:len(content) // 2])
+
+
+def test_get_files_in_bundle_truncated(remote_path, tmp_path):
+    with TruncatingTransport() as transport:
+        # callers fall back to one by one transfer on TarError
+        with pytest.raises(tarfile.TarError):
+            get_files_in_bundle(transport, remote_path,
+                                ['*/model_devi.out'], str(tmp_path / 'b'))
+    assert not [name for name in os.listdir(remote_path)
+                if name.endswith('.tar.gz')]
+
+
+def test_get_last_frames_on_remote(tmp_path):
+    remote = tmp_path / 'neb'
+    remote.mkdir()
+    for replica in range(1, 13):
+        with open(remote / f'aiida-pos-Replica_nr_{replica}-1.xyz', 'w') as f:
+            for step in range(3):
+                f.write(f'2\n i = {step}, E = {-replica - step}\n'
+                        f'H 0 0 0\nH 0 0 {replica}\n')
+    with CountingTransport() as transport:
+        frames = get_last_frames_on_remote(transport, str(remote),
+                                           '*-pos-Replica_nr_*-1.xyz')
+        assert transport.round_trips == 1
+    assert len(frames) == 12
+    assert frames['aiida-pos-Replica_nr_11-1.xyz'] == \
+        '2\n i = 2, E = -13\nH 0 0 0\nH 0 0 11\n'
+
+
+class ChunkNode(object):
+    """Node like object with repository in a local directory"""
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+
+    def open(self, filename, mode='r'):
+        return open(os.path.join(self.dirname, filename), mode=mode)
+
+
+def test_write_file_from_node(tmp_path):
+    content = os.urandom(10 * 1024 + 7)
+    (tmp_path / 'model.pb').write_bytes(content)
+    output_file = tmp_path / 'models' / '0' / 'model.pb'
+    write_file_from_node(ChunkNode(str(tmp_path)), str(output_file),
+                         filename='model.pb', chunk_size=1024)
+    assert output_file.read_bytes() == content
+
+
+BAND_ITERATION = """ ***  MAX DISPLACEMENT =  0.01000  [  0.00200 ]  NO  ***
+ ***  RMS DISPLACEMENT =  0.00100  [  0.00500 ] YES  ***
+ ***  MAX FORCE        =  {max_f:.5f}  [  0.00300 ]  NO  ***
+ ***  RMS FORCE        =  0.00100  [  0.00500 ] YES  ***
+"""
+
+
+def test_band_convergence_monitor(aiida_profile_clean, aiida_localhost,
+                                  tmp_path):
+    from aiida.orm import RemoteData
+
+    band_file = tmp_path / 'aiida-BAND.out'
+    band_file.write_text(BAND_ITERATION.format(max_f=0.03) * 2)
+    remote_folder = RemoteData(computer=aiida_localhost,
+                               remote_path=str(tmp_path))
+    monitor = BandConvergenceMonitor(remote_folder, 'aiida-BAND.out')
+    fed = []
+    feed = monitor.parser.feed
+    monitor.parser.feed = lambda text: fed.append(text) or feed(text)
+    assert monitor.update()['iterations'] == 2
+
+    # append one iteration and an incomplete line
+    new_content = BAND_ITERATION.format(max_f=0.02) + ' ***  MAX DISP'
+    with open(band_file, 'a') as f:
+        f.write(new_content)
+    progress = monitor.update()
+    assert progress['iterations'] == 3
+    assert progress['ratio_to_criteria']['max_force'] == \
+        pytest.approx(0.02 / 0.003)
+    # only new content is transferred and parsed
+    assert fed[1] == new_content
+    assert monitor.offset == band_file.stat().st_size
+    assert monitor.update()['iterations'] == 3
+    assert fed[2] == ''
+
+    # rewritten by a restarted calculation
+    band_file.write_text(BAND_ITERATION.format(max_f=0.01))
+    assert monitor.update()['iterations'] == 1
+
+
+def test_get_neb_progress(aiida_profile_clean, aiida_localhost, tmp_path):
+    from aiida.common.links import LinkType
+    from aiida.orm import CalcJobNode, RemoteData
+
+    band_file = tmp_path / 'aiida-BAND.out'
+    band_file.write_text(BAND_ITERATION.format(max_f=0.03))
+    calculation = CalcJobNode(computer=aiida_localhost)
+    calculation.store()
+    remote_folder = RemoteData(computer=aiida_localhost,
+                               remote_path=str(tmp_path))
+    remote_folder.add_incoming(calculation, LinkType.CREATE, 'remote_folder')
+    remote_folder.store()
+
+    assert get_neb_progress(calculation)['iterations'] == 1
+    with open(band_file, 'a') as f:
+        f.write(BAND_ITERATION.format(max_f=0.02))
+    # monitor is kept, iterations are not parsed twice
+    assert get_neb_progress(calculation)['iterations'] == 2
+
+
+MODEL_DEVI_LIMITS = {'skip_images': 0,
+                     'force_low_limit': 0.05, 'force_high_limit': 0.15,
+                     'energy_low_limit': 1e10, 'energy_high_limit': 1e10}
+
+
+@pytest.fixture
+def model_devi_path(tmp_path):
+    remote = tmp_path / 'batch'
+    for i in range(2):
+        (remote / str(i)).mkdir(parents=True)
+        with open(remote / str(i) / 'model_devi.out', 'w') as f:
+            f.write('#  step  max_devi_e  min_devi_e  avg_devi_e  '
+                    'max_devi_f\n')
+            for step, devi_f in enumerate([0.01, 0.08, 0.2, 0.1 + i]):
+                f.write(f'{step * 10} 0.001 0.0001 0.0005 {devi_f}\n')
+    return str(remote)
+
+
+def test_screen_model_devi_on_remote(model_devi_path):
+    filenames = ['0/model_devi.out', '1/model_devi.out']
+    with LocalTransport() as transport:
+        results = screen_model_devi_on_remote(
+            transport, model_devi_path, filenames, python=sys.executable,
+            **MODEL_DEVI_LIMITS)
+        with pytest.raises(OSError):
+            screen_model_devi_on_remote(
+                transport, model_devi_path, filenames,
+                python='no-such-python', **MODEL_DEVI_LIMITS)
+    # script is removed on remote
+    assert sorted(os.listdir(model_devi_path)) == ['0', '1']
+    for filename in filenames:
+        # same types as local screening
+        expected = parse_model_devi_index(
+            os.path.join(model_devi_path, filename), **MODEL_DEVI_LIMITS)
+        for key, value in expected.items():
+            assert results[filename][key].dtype == value.dtype
+            np.testing.assert_allclose(results[filename][key], value)
+        assert results[filename]['total'] == 4
+    assert results['1/model_devi.out']['candidate'].tolist() == [10]
+
+
+def test_screen_on_remote_fallback(aiida_profile_clean, aiida_localhost,
+                                   model_devi_path, tmp_path):
+    for plugin in ('aiida_cp2k', 'aiida_deepmd', 'aiida_lammps'):
+        pytest.importorskip(plugin)
+    from aiida.common.extendeddicts import AttributeDict
+    from aiida.orm import RemoteData
+    from ecint.workflow.units.base import QBCBatchWorkChain
+
+    remote_folder = RemoteData(computer=aiida_localhost,
+                               remote_path=model_devi_path)
+    outputs = []
+    workchain = SimpleNamespace(
+        inputs=AttributeDict({
+            'label': 'model_devi', 'variables': {'TEMP': [300]},
+            'structures': [None, None], 'screen_on_remote': True,
+            'remote_python': 'no-such-python', 'retrieve_in_bundle': True,
+            'model_devi': MODEL_DEVI_LIMITS}),
+        ctx=AttributeDict({'batch_workchain': SimpleNamespace(
+            outputs=SimpleNamespace(remote_folder=remote_folder))}),
+        reports=[],
+        out=lambda name, value: outputs.append((name, value)))
+    workchain.report = workchain.reports.append
+    workchain.get_result_path = lambda *paths: str(tmp_path.joinpath(*paths))
+    for name in ('screen_model_devi', 'retrieve_model_devi'):
+        setattr(workchain, name,
+                getattr(QBCBatchWorkChain, name).__get__(workchain))
+
+    QBCBatchWorkChain.get_model_devi(workchain)
+    assert 'Failed to screen model_devi.out on remote' in \
+        workchain.reports[0]
+    assert (tmp_path / 'model_devi' / 'condition_0' /
+            'model_devi_1.out').exists()
+    QBCBatchWorkChain.get_model_devi_index(workchain)
+    (name, model_devi_index), = outputs
+    assert name == 'model_devi_index'
+    assert [index['candidate'] for index in model_devi_index.get_list()] == \
+        [[10, 30], [10]]
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+for plugin in ('aiida_cp2k', 'aiida_deepmd', 'aiida_lammps'):
+    pytest.importorskip(plugin)
+from ecint.preprocessor import Cp2kPreprocessor, Preprocessor
+from ecint.preprocessor.input import QBCInputSets
+from ecint.preprocessor.utils import CACHE_EXTRA_KEY, \
+    CACHED_FROM_EXTRA_KEY, canonicalize_parameters, get_cached_node, \
+    link_cached_node
+
+
+def test_canonicalize_parameters():
+    parameters = {'b': (1, np.int64(2)), 'a': {'d': np.float64(0.5),
+                                               'c': np.array([[1, 2]])}}
+    canonical = canonicalize_parameters(parameters)
+    assert canonical == {'a': {'c': [[1, 2]], 'd': 0.5}, 'b': [1, 2]}
+    assert list(canonical) == ['a', 'b']
+    assert list(canonical['a']) == ['c', 'd']
+    assert type(canonical['b'][1]) is int
+    assert type(canonical['a']['d']) is float
+
+
+class InputSets(object):
+    input_sets = {'GLOBAL': {'RUN_TYPE': 'ENERGY', 'PRINT_LEVEL': 'LOW'},
+                  'CUTOFF': np.float64(400.)}
+
+
+class DummyPreprocessor(Preprocessor):
+    @property
+    def builder(self):
+        return None
+
+
+def test_preprocessor_keeps_parameters(aiida_profile):
+    parameters = DummyPreprocessor(InputSets()).parameters.get_dict()
+    # order of keys is kept, e.g. of `variables` of QBC
+    assert list(parameters) == ['GLOBAL', 'CUTOFF']
+    assert list(parameters['GLOBAL']) == ['RUN_TYPE', 'PRINT_LEVEL']
+
+
+def test_cache_key_ignores_key_order(aiida_profile, aiida_localhost):
+    from aiida.common.extendeddicts import AttributeDict
+    from aiida.orm import Dict, InstalledCode, StructureData
+
+    code = InstalledCode(computer=aiida_localhost,
+                         filepath_executable='/bin/cp2k').store()
+    structure = StructureData(cell=[[5, 0, 0], [0, 5, 0], [0, 0, 5]])
+    structure.append_atom(position=(0, 0, 0), symbols='H')
+
+    def get_cache_key(parameters):
+        builder = AttributeDict({'cp2k': AttributeDict({
+            'code': code, 'structure': structure,
+            'parameters': Dict(dict=parameters)})})
+        return Cp2kPreprocessor.get_cache_key(builder)
+
+    assert get_cache_key({'A': 1, 'B': {'C': 2, 'D': 3}}) == \
+        get_cache_key({'B': {'D': 3, 'C': 2}, 'A': 1})
+    assert get_cache_key({'A': 1}) != get_cache_key({'A': 2})
+
+
+def test_qbc_input_sets_seed():
+    variables = {'TEMP': [330, 430]}
+    inp = QBCInputSets(structures=[], kinds=['H'], init_template='default',
+                       variables=variables, graphs=[])
+    seeds = {inp.input_sets['variables']['_SEED'][0] for _ in range(5)}
+    assert seeds == {inp.seed}
+    # variables of user are not changed
+    assert variables == {'TEMP': [330, 430]}
+    inp = QBCInputSets(structures=[], kinds=['H'], init_template='default',
+                       variables=variables, graphs=[], seed=42)
+    assert inp.input_sets['variables']['_SEED'] == [42]
+
+
+def get_finished_workchain(cache_key):
+    from aiida.common.links import LinkType
+    from aiida.orm import CalcJobNode, Float, WorkChainNode
+
+    workchain = WorkChainNode()
+    workchain.set_process_state('finished')
+    workchain.set_exit_status(0)
+    workchain.store()
+    calc = CalcJobNode()
+    calc.set_process_state('finished')
+    calc.set_exit_status(0)
+    calc.add_incoming(workchain, LinkType.CALL_CALC, 'CALL')
+    calc.store()
+    energy = Float(-1.)
+    energy.add_incoming(calc, LinkType.CREATE, 'energy')
+    energy.store()
+    energy.add_incoming(workchain, LinkType.RETURN, 'energy')
+    for node in (calc, workchain):
+        node.seal()
+    workchain.set_extra(CACHE_EXTRA_KEY, cache_key)
+    return workchain, energy
+
+
+def test_link_cached_node(aiida_profile_clean):
+    from aiida.engine import run_get_node, WorkChain
+
+    cached, energy = get_finished_workchain('key')
+    assert get_cached_node('key').pk == cached.pk
+    assert get_cached_node('other') is None
+
+    class ReuseWorkChain(WorkChain):
+        @classmethod
+        def define(cls, spec):
+            super(ReuseWorkChain, cls).define(spec)
+            spec.outline(cls.reuse)
+
+        def reuse(self):
+            link_cached_node(get_cached_node('key'))
+
+    _, node = run_get_node(ReuseWorkChain)
+    reuse_node, = node.called
+    assert reuse_node.get_extra(CACHED_FROM_EXTRA_KEY) == cached.uuid
+    assert reuse_node.inputs.energy.pk == energy.pk
+    assert reuse_node.outputs.energy.pk == energy.pk
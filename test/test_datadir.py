@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('aiida')
+from ecint.postprocessor.utils import DP_SET_SIZE, write_datadir
+
+
+def get_data(n_frames, n_atoms=3):
+    rng = np.random.RandomState(0)
+    return {'box': rng.rand(n_frames, 9),
+            'coord': rng.rand(n_frames, n_atoms * 3),
+            'energy': rng.rand(n_frames, 1),
+            'force': rng.rand(n_frames, n_atoms * 3)}
+
+
+def test_write_datadir_sets(tmp_path):
+    dirname = str(tmp_path / 'system')
+    data = get_data(7)
+    set_paths = write_datadir(dirname, [0, 1, 1], data, set_size=3)
+    assert [os.path.basename(path) for path in set_paths] == \
+        ['set.000', 'set.001', 'set.002']
+    assert [len(np.load(os.path.join(path, 'energy.npy')))
+            for path in set_paths] == [3, 3, 1]
+    coord = np.concatenate([np.load(os.path.join(path, 'coord.npy'))
+                            for path in set_paths])
+    np.testing.assert_array_equal(coord, data['coord'])
+    with open(os.path.join(dirname, 'type.raw')) as f:
+        assert f.read().split() == ['0', '1', '1']
+    # default set size
+    set_paths = write_datadir(str(tmp_path / 'default'), [0, 1, 1],
+                              get_data(DP_SET_SIZE + 1))
+    assert len(set_paths) == 2
+
+
+def test_write_datadir_append(tmp_path):
+    dirname = str(tmp_path / 'system')
+    write_datadir(dirname, [0, 1, 1], get_data(4), set_size=3)
+    set_paths = write_datadir(dirname, [0, 1, 1], get_data(2), set_size=3,
+                              append=True)
+    assert [os.path.basename(path) for path in set_paths] == ['set.002']
+    assert sorted(os.listdir(dirname)) == \
+        ['set.000', 'set.001', 'set.002', 'type.raw']
+    with pytest.raises(ValueError):
+        write_datadir(dirname, [1, 0, 0], get_data(1), append=True)
+    # without append, sets start from set.000 again
+    with pytest.raises(FileExistsError):
+        write_datadir(dirname, [0, 1, 1], get_data(1))
+
+
+def test_write_datadir_dtype(tmp_path):
+    data = get_data(2)
+    set_path, = write_datadir(str(tmp_path / 'float32'), [0, 1, 1], data,
+                              dtype=np.float32)
+    force = np.load(os.path.join(set_path, 'force.npy'))
+    assert force.dtype == np.float32
+    np.testing.assert_allclose(force, data['force'], rtol=1e-6)
+    set_path, = write_datadir(str(tmp_path / 'keep'), [0, 1, 1], data)
+    assert np.load(os.path.join(set_path, 'force.npy')).dtype == np.float64
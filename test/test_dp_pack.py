@@ -0,0 +1,167 @@
+from copy import deepcopy
+
+import pytest
+
+pytest.importorskip('aiida')
+from ecint.calculations.dpmd import get_pack_train_script
+
+FAKE_DP = """#!/bin/bash
+echo "$CUDA_VISIBLE_DEVICES $*"
+if [ "$1" = freeze ]; then touch model.pb; fi
+if [ "$(basename "$PWD")" = {fail} ] && [ "$1" = train ]; then exit 1; fi
+"""
+
+
+def run_pack(run_pack_script, members, ngpu, fail='', env=None,
+             init_members=()):
+    return run_pack_script(
+        lambda dp: get_pack_train_script(members, ngpu, dp, init_members),
+        FAKE_DP.replace('{fail}', fail or 'none'), members, env)
+
+
+def test_pack_train_script(tmp_path, run_pack_script):
+    members = ['member_0', 'member_1', 'member_2']
+    assert run_pack(run_pack_script, members, ngpu=2).returncode == 0
+    for member, gpu in zip(members, ['0', '1', '0']):
+        log = (tmp_path / member / 'train.log').read_text().splitlines()
+        assert log == [f'{gpu} train input.json', f'{gpu} freeze -o model.pb']
+        assert (tmp_path / member / 'model.pb').exists()
+
+
+def test_pack_train_script_visible_devices(tmp_path, run_pack_script):
+    members = ['member_0', 'member_1']
+    run_pack(run_pack_script, members, ngpu=1,
+             env={'CUDA_VISIBLE_DEVICES': '5,7'})
+    for member, gpu in zip(members, ['5', '7']):
+        log = (tmp_path / member / 'train.log').read_text()
+        assert log.startswith(f'{gpu} train')
+
+
+def test_pack_train_script_failed_member(tmp_path, run_pack_script):
+    members = ['member_0', 'member_1']
+    result = run_pack(run_pack_script, members, ngpu=2, fail='member_1')
+    assert result.returncode == 1
+    assert result.stdout == 'exit status: 1\n'
+    assert (tmp_path / 'member_0' / 'model.pb').exists()
+    assert not (tmp_path / 'member_1' / 'model.pb').exists()
+
+
+def test_pack_train_script_init_model(tmp_path, run_pack_script):
+    members = ['member_0', 'member_1']
+    run_pack(run_pack_script, members, ngpu=2, init_members=['member_1'])
+    logs = [(tmp_path / member / 'train.log').read_text().splitlines()[0]
+            for member in members]
+    assert logs == ['0 train input.json',
+                    '1 train --init-frz-model init_model.pb input.json']
+
+
+def test_dp_input_sets_init_steps():
+    for plugin in ('aiida_cp2k', 'aiida_deepmd', 'aiida_lammps'):
+        pytest.importorskip(plugin)
+    from ecint.preprocessor.input import DPInputSets
+
+    config = {'model': {'descriptor': {}}, 'loss': {},
+              'learning_rate': {'decay_steps': 5000},
+              'training': {'numb_steps': 400000}}
+
+    def get_input_sets(init_model, ratio=0.2):
+        return DPInputSets(['data_0'], ['H'], [4], config=deepcopy(config),
+                           init_model=init_model,
+                           init_steps_ratio=ratio).input_sets
+
+    input_sets = get_input_sets(None)
+    assert input_sets['training']['numb_steps'] == 400000
+    assert input_sets['learning_rate']['decay_steps'] == 5000
+    assert input_sets['training']['systems'] == ['data_0']
+    # any model, or models of pack
+    input_sets = get_input_sets([object()])
+    assert input_sets['training']['numb_steps'] == 80000
+    assert input_sets['learning_rate']['decay_steps'] == 1000
+    # at least 1 step
+    input_sets = get_input_sets([object()], ratio=1e-6)
+    assert input_sets['training']['numb_steps'] == 1
+    assert input_sets['learning_rate']['decay_steps'] == 1
+    # deepmd v1
+    config['training'] = {'stop_batch': 1000}
+    assert get_input_sets([object()])['training']['stop_batch'] == 200
+
+
+def get_pack_calculation(members, trained):
+    """Node of finished DPPackCalculation, only `trained` have outputs"""
+    import io
+    from aiida.common.links import LinkType
+    from aiida.orm import CalcJobNode, Dict, FolderData
+
+    node = CalcJobNode()
+    node.set_process_type('ecint.calculations.dpmd.DPPackCalculation')
+    for member in members:
+        node.add_incoming(Dict(dict={}).store(), LinkType.INPUT_CALC,
+                          f'parameters__{member}')
+    node.store()
+    retrieved = FolderData()
+    for member in members:
+        retrieved.put_object_from_filelike(io.BytesIO(b''),
+                                           f'{member}/train.log')
+        if member in trained:
+            for filename in ('model.pb', 'lcurve.out'):
+                retrieved.put_object_from_filelike(io.BytesIO(b''),
+                                                   f'{member}/{filename}')
+    retrieved.add_incoming(node, LinkType.CREATE, 'retrieved')
+    retrieved.store()
+    return node
+
+
+def test_pack_parser(aiida_profile_clean):
+    from ecint.parsers.dpmd import DPPackParser
+
+    members = ['member_0', 'member_1']
+    node = get_pack_calculation(members, trained=members)
+    assert DPPackParser(node).parse() is None
+    node = get_pack_calculation(members, trained=['member_0'])
+    assert DPPackParser(node).parse().status == 300
+
+
+def test_prepare_for_submission(aiida_profile_clean, aiida_localhost,
+                                tmp_path, monkeypatch):
+    import io
+    import json
+    from aiida.common.folders import Folder
+    from aiida.engine.utils import instantiate_process
+    from aiida.manage import get_manager
+    from aiida.orm import Dict, InstalledCode, Int, SinglefileData
+    from ecint.calculations.dpmd import DPPackCalculation
+
+    # entry point of parser is only registered if ecint is installed
+    monkeypatch.setattr(DPPackCalculation.spec().inputs['metadata'][
+        'options']['parser_name'], 'validator', None)
+    datadir = tmp_path / 'data_0'
+    datadir.mkdir()
+    (datadir / 'type.raw').write_text('0\n')
+    workdir = tmp_path / 'workdir'
+    workdir.mkdir()
+    code = InstalledCode(computer=aiida_localhost,
+                         filepath_executable='/bin/bash').store()
+    model = SinglefileData(io.BytesIO(b'model'), filename='model.pb')
+    parameters = {'training': {'systems': ['data_0']}}
+    inputs = {'code': code, 'datadirs': [str(datadir)],
+              'parameters': {'member_0': Dict(dict=parameters),
+                             'member_1': Dict(dict=parameters)},
+              'init_models': {'member_1': model}, 'ngpu': Int(2),
+              'metadata': {'options': {'resources': {
+                  'num_machines': 1, 'num_mpiprocs_per_machine': 1}}}}
+    process = instantiate_process(get_manager().get_runner(),
+                                  DPPackCalculation, **inputs)
+    calcinfo = process.prepare_for_submission(Folder(str(workdir)))
+
+    assert (workdir / 'data_0' / 'type.raw').exists()
+    with open(workdir / 'member_0' / 'input.json') as f:
+        assert json.load(f)['training']['systems'] == ['../data_0']
+    script = (workdir / 'pack_train.sh').read_text()
+    assert script.count('--init-frz-model') == 1
+    assert calcinfo.codes_info[0].cmdline_params == ['pack_train.sh']
+    assert calcinfo.local_copy_list == [(model.uuid, 'model.pb',
+                                         'member_1/init_model.pb')]
+    assert calcinfo.retrieve_list == ['pack_train.log',
+                                      ('*/model.pb', '.', 2),
+                                      ('*/lcurve.out', '.', 2),
+                                      ('*/train.log', '.', 2)]
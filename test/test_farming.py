@@ -0,0 +1,92 @@
+import pytest
+
+pytest.importorskip('aiida')
+from ecint.postprocessor.utils import _query_frames
+
+
+def store_workchain(inputs, outputs):
+    """WorkChainNode with {label: node} of inputs and returned outputs"""
+    from aiida.common.links import LinkType
+    from aiida.orm import WorkChainNode
+
+    workchain = WorkChainNode()
+    for label, node in inputs.items():
+        workchain.add_incoming(node.store(), LinkType.INPUT_WORK, label)
+    workchain.store()
+    for label, node in outputs.items():
+        node.store().add_incoming(workchain, LinkType.RETURN, label)
+    workchain.seal()
+    return workchain
+
+
+def get_structure(z):
+    from aiida.orm import StructureData
+
+    structure = StructureData(cell=[[5, 0, 0], [0, 5, 0], [0, 0, 5]])
+    structure.append_atom(position=(0, 0, z), symbols='H')
+    return structure
+
+
+def test_query_frames(aiida_profile_clean):
+    from aiida.orm import Float, List
+
+    single = store_workchain(
+        {'structure': get_structure(0.)},
+        {'energy': Float(-1.), 'forces': List(list=[[0., 0., 1.]])})
+    # `_` in keys is a wildcard of `like`, keys are checked after query
+    farming = store_workchain(
+        {'structures__a_0': get_structure(1.),
+         'structures__a_1': get_structure(2.),
+         'structuresXa_2': get_structure(3.)},
+        {'energy__a_0': Float(-2.), 'forces__a_0': List(list=[[0., 0., 2.]]),
+         'energy__a_1': Float(-3.), 'converged__a_1': Float(1.)})
+
+    frames = _query_frames([single.pk, farming.pk])
+    assert list(frames) == [single.pk]
+    cell, sites, energy, forces = frames[single.pk]['']
+    assert cell == [[5, 0, 0], [0, 5, 0], [0, 0, 5]]
+    assert sites[0]['position'] == [0, 0, 0]
+    assert (energy, forces) == (-1., [[0., 0., 1.]])
+
+    frames = _query_frames([single.pk, farming.pk], namespace=True)
+    assert list(frames) == [farming.pk]
+    assert sorted(frames[farming.pk]) == ['a_0', 'a_1']
+    _, sites, energy, forces = frames[farming.pk]['a_0']
+    assert sites[0]['position'] == [0, 0, 1.]
+    assert (energy, forces) == (-2., [[0., 0., 2.]])
+    # no forces of a_1
+    assert frames[farming.pk]['a_1'][2:] == [-3., None]
+
+
+def test_energy_farming_input_sets(aiida_profile):
+    for plugin in ('aiida_cp2k', 'aiida_deepmd', 'aiida_lammps'):
+        pytest.importorskip(plugin)
+    from ecint.preprocessor.input import EnergyFarmingInputSets
+
+    structures = {'b': get_structure(1.), 'a': get_structure(0.),
+                  'c': get_structure(2.)}
+    inp = EnergyFarmingInputSets(structures, config='metal', ngroups=4)
+    assert inp.job_names == {'a': 'job_0', 'b': 'job_1', 'c': 'job_2'}
+
+    input_sets = inp.input_sets
+    assert input_sets['GLOBAL']['PROGRAM_NAME'] == 'FARMING'
+    # groups are not more than jobs
+    assert input_sets['FARMING']['NGROUPS'] == 3
+    assert [job['INPUT_FILE_NAME'] for job in
+            input_sets['FARMING']['JOB']] == ['job_0.inp', 'job_1.inp',
+                                              'job_2.inp']
+    assert [job['JOB_ID'] for job in input_sets['FARMING']['JOB']] == \
+        [1, 2, 3]
+
+    job_input_sets = inp.get_job_input_sets('b')
+    assert job_input_sets['GLOBAL']['PROJECT'] == 'job_1'
+    assert job_input_sets['GLOBAL']['RUN_TYPE'] == 'ENERGY_FORCE'
+    assert job_input_sets['FORCE_EVAL']['SUBSYS']['TOPOLOGY'] == \
+        {'COORD_FILE_NAME': 'job_1.xyz', 'COORD_FILE_FORMAT': 'XYZ'}
+
+    files = inp.files
+    assert sorted(files) == ['job_0_inp', 'job_0_xyz', 'job_1_inp',
+                             'job_1_xyz', 'job_2_inp', 'job_2_xyz']
+    assert files['job_1_xyz'].filename == 'job_1.xyz'
+    assert files['job_1_xyz'].get_content().splitlines()[2].split() == \
+        ['H', '0.0000000000', '0.0000000000', '1.0000000000']
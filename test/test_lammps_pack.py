@@ -0,0 +1,144 @@
+import io
+
+import pytest
+
+pytest.importorskip('aiida')
+from ecint.calculations.lammps import get_conditions, \
+    get_pack_lammps_script, render_lammps_input
+
+# record running tasks, fail the task named `fail`
+FAKE_LMP = """#!/bin/bash
+task=$(basename "$PWD")
+echo "$CUDA_VISIBLE_DEVICES" > gpu
+touch ../running_$task
+sleep 0.2
+ls .. | grep -c running_ > concurrency
+rm ../running_$task
+[ "$task" != fail ]
+"""
+
+
+def run_pack(run_pack_script, tasks, ngpu, parallelism):
+    return run_pack_script(
+        lambda lmp: get_pack_lammps_script(tasks, ngpu, parallelism, lmp),
+        FAKE_LMP, tasks)
+
+
+def test_pack_lammps_script(tmp_path, run_pack_script):
+    tasks = [str(i) for i in range(8)]
+    result = run_pack(run_pack_script, tasks, ngpu=2, parallelism=2)
+    assert result.returncode == 0
+    gpus = [(tmp_path / task / 'gpu').read_text().strip() for task in tasks]
+    # worker i runs tasks i, i + 4 on GPU i % 2
+    assert gpus == ['0', '1', '0', '1', '0', '1', '0', '1']
+    concurrency = [int((tmp_path / task / 'concurrency').read_text())
+                   for task in tasks]
+    assert max(concurrency) <= 4
+
+
+def test_pack_lammps_script_failed_task(tmp_path, run_pack_script):
+    tasks = ['0', 'fail', '2']
+    result = run_pack(run_pack_script, tasks, ngpu=1, parallelism=2)
+    assert result.returncode == 1
+    assert (tmp_path / '2' / 'gpu').exists()
+    assert result.stdout.splitlines() == ['failed task: fail',
+                                          'exit status: 1']
+
+
+def test_render_lammps_input():
+    content = render_lammps_input('run ${NSTEPS}',
+                                  {'NSTEPS': 10,
+                                   '_GRAPHS': '../graph_0.pb ../graph_1.pb'})
+    assert content.splitlines() == [
+        'variable        NSTEPS string 10',
+        'variable        _GRAPHS string "../graph_0.pb ../graph_1.pb"',
+        'run ${NSTEPS}']
+
+
+def test_get_conditions():
+    # order of user, not sorted
+    conditions = get_conditions({'TEMP': [100, 200], 'PRES': [1, 2]})
+    assert conditions == [{'TEMP': 100, 'PRES': 1}, {'TEMP': 100, 'PRES': 2},
+                          {'TEMP': 200, 'PRES': 1}, {'TEMP': 200, 'PRES': 2}]
+    assert get_conditions({}) == [{}]
+
+
+def test_prepare_for_submission(aiida_profile_clean, aiida_localhost,
+                                tmp_path, monkeypatch):
+    from aiida.common.folders import Folder
+    from aiida.engine.utils import instantiate_process
+    from aiida.manage import get_manager
+    from aiida.orm import Dict, InstalledCode, Int, SinglefileData, Str
+    from ase import Atoms
+    from ecint.calculations.lammps import LammpsPackCalculation
+
+    # entry point of parser is only registered if ecint is installed
+    monkeypatch.setattr(LammpsPackCalculation.spec().inputs['metadata'][
+        'options']['parser_name'], 'validator', None)
+    code = InstalledCode(computer=aiida_localhost,
+                         filepath_executable='/bin/bash').store()
+    graph = SinglefileData(io.BytesIO(b'graph'), filename='graph.pb')
+    atoms = Atoms('OH', positions=[[0, 0, 0], [0, 0, 1]], cell=[5, 5, 5],
+                  pbc=True)
+    # not in alphabetical order
+    variables = {'TEMP': [100, 200], 'PRES': [1, 2]}
+    inputs = {'code': code, 'structures': [atoms, atoms], 'kinds': ['H', 'O'],
+              'template': Str('run'),
+              'variables': Dict(dict=variables),
+              'file': {'graph_0': graph},
+              'settings': Dict(dict={
+                  'additional_retrieve_list': ['*/model_devi.out']}),
+              'parallelism': Int(2),
+              'metadata': {'options': {'resources': {
+                  'num_machines': 1, 'num_mpiprocs_per_machine': 1}}}}
+    process = instantiate_process(get_manager().get_runner(),
+                                  LammpsPackCalculation, **inputs)
+    calcinfo = process.prepare_for_submission(Folder(str(tmp_path)))
+
+    # task `c + s * n_c` under condition `c` as in QBCBatchWorkChain
+    conditions = get_conditions(variables)
+    assert sorted(int(p.name) for p in tmp_path.iterdir() if p.is_dir()) == \
+        list(range(2 * len(conditions)))
+    for s in range(2):
+        for c, condition in enumerate(conditions):
+            task = tmp_path / str(c + s * len(conditions))
+            assert (task / 'input.in').read_text() == \
+                render_lammps_input('run', condition)
+    data = (tmp_path / '0' / 'input.data').read_text()
+    masses = data.split('Masses')[1].split('Atoms')[0].split()
+    assert masses[0::4] == ['1', '2'] and masses[3::4] == ['H', 'O']
+    assert data.split('Atoms # atomic')[1].split()[1::5] == ['2', '1']
+    assert (tmp_path / 'pack_lammps.sh').exists()
+    assert calcinfo.local_copy_list == [(graph.uuid, 'graph.pb',
+                                         'graph_0.pb')]
+    assert calcinfo.retrieve_list == ['pack_lammps.log',
+                                      ('*/model_devi.out', '.', 2)]
+
+
+def get_pack_calculation(stdout):
+    from aiida.common.links import LinkType
+    from aiida.orm import CalcJobNode, FolderData
+
+    node = CalcJobNode()
+    node.set_process_type('ecint.calculations.lammps.LammpsPackCalculation')
+    node.store()
+    retrieved = FolderData()
+    if stdout is not None:
+        retrieved.put_object_from_filelike(io.BytesIO(stdout.encode()),
+                                           'pack_lammps.log')
+    retrieved.add_incoming(node, LinkType.CREATE, 'retrieved')
+    retrieved.store()
+    return node
+
+
+def test_pack_parser(aiida_profile_clean):
+    from ecint.parsers.lammps import LammpsPackParser
+
+    node = get_pack_calculation('exit status: 0\n')
+    assert LammpsPackParser(node).parse() is None
+    node = get_pack_calculation('failed task: 1\nexit status: 1\n')
+    assert LammpsPackParser(node).parse().status == 300
+    # killed by scheduler
+    for stdout in ('', None):
+        node = get_pack_calculation(stdout)
+        assert LammpsPackParser(node).parse().status == 310
@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from ecint.postprocessor.notify import DingtalkNotifier, \
+    validate_notification
+
+
+class DingtalkStandIn(BaseHTTPRequestHandler):
+    # status codes returned in order, then always 200
+    statuses = []
+    received = []
+
+    def do_POST(self):
+        content = self.rfile.read(int(self.headers['Content-Length']))
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status == 200:
+            self.received.append(json.loads(content))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({'errcode': 0}).encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def webhook():
+    DingtalkStandIn.statuses = []
+    DingtalkStandIn.received = []
+    server = HTTPServer(('127.0.0.1', 0), DingtalkStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/robot/send'
+    server.shutdown()
+    server.server_close()
+
+
+class TestDingtalkNotifier:
+    def test_notify(self, webhook):
+        notifier = DingtalkNotifier(webhook)
+        notifier.notify('Job Info', 'job 1')
+        notifier.notify('Job Info', 'job 2')
+        assert notifier.flush(timeout=10)
+        texts = [data['markdown']['text']
+                 for data in DingtalkStandIn.received]
+        assert texts == ['job 1', 'job 2']
+
+    def test_digest(self, webhook):
+        notifier = DingtalkNotifier(webhook, digest_size=3)
+        for i in range(5):
+            notifier.notify('Job Info', f'job {i}')
+        assert notifier.flush(timeout=10)
+        assert len(DingtalkStandIn.received) == 2
+        assert DingtalkStandIn.received[0]['markdown']['title'] == \
+            '3 Jobs Info'
+        assert 'job 4' in DingtalkStandIn.received[1]['markdown']['text']
+
+    def test_digest_interval(self, webhook):
+        notifier = DingtalkNotifier(webhook, digest_size=10,
+                                    digest_interval=0.2)
+        notifier.notify('Job Info', 'job 0')
+        notifier.notify('Job Info', 'job 1')
+        # partial digest is sent without flush
+        for _ in range(100):
+            if DingtalkStandIn.received:
+                break
+            time.sleep(0.05)
+        assert len(DingtalkStandIn.received) == 1
+        assert DingtalkStandIn.received[0]['markdown']['title'] == \
+            '2 Jobs Info'
+        assert notifier.flush(timeout=10)
+        with pytest.raises(ValueError):
+            DingtalkNotifier(webhook, digest_size=10, digest_interval=None)
+
+    def test_retry(self, webhook):
+        DingtalkStandIn.statuses = [500, 503]
+        notifier = DingtalkNotifier(webhook, backoff=0.01)
+        notifier.notify('Job Info', 'job 0')
+        assert notifier.flush(timeout=10)
+        assert len(DingtalkStandIn.received) == 1
+
+
+def test_validate_notification():
+    assert validate_notification(None) is None
+    assert validate_notification({}) is None
+    assert validate_notification({'digest_size': 10,
+                                  'digest_interval': 600}) is None
+    # typo of key
+    assert 'digest_sise' in validate_notification({'digest_sise': 10})
+    assert 'digest_interval' in validate_notification(
+        {'digest_size': 10, 'digest_interval': None})
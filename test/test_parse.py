@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+from ase.io import read
+from ecint.postprocessor.parse import BandConvergenceParser, \
+    load_model_devi, MODEL_DEVI_CACHE_SUFFIX, parse_model_devi_index, \
+    read_lammps_dump_text
+from ecint.postprocessor.screen_model_devi import screen_model_devi
+
+model_devi_content = """#       step         max_devi_e         min_devi_e         avg_devi_e         max_devi_f         min_devi_f         avg_devi_f
+           0       1.000000e-03       1.000000e-04       5.000000e-04       1.000000e-02       1.000000e-03       5.000000e-03
+          10       2.000000e-03       1.000000e-04       5.000000e-04       8.000000e-02       1.000000e-03       5.000000e-03
+          20       3.000000e-03       1.000000e-04       5.000000e-04       2.000000e-01       1.000000e-03       5.000000e-03
+          30       4.000000e-03       1.000000e-04       5.000000e-04       1.000000e-01       1.000000e-03       5.000000e-03
+"""
+
+
+def write_model_devi(tmp_path):
+    filename = str(tmp_path / 'model_devi.out')
+    with open(filename, 'w') as f:
+        f.write(model_devi_content)
+    return filename
+
+
+class TestModelDevi:
+    def test_load_model_devi(self, tmp_path):
+        filename = write_model_devi(tmp_path)
+        model_devi = load_model_devi(filename)
+        expected = np.loadtxt(filename, usecols=[0, 1, 4])
+        np.testing.assert_allclose(model_devi, expected)
+        assert os.path.exists(filename + MODEL_DEVI_CACHE_SUFFIX)
+        # second load reuses the sidecar
+        cached_model_devi = load_model_devi(filename)
+        assert isinstance(cached_model_devi, np.memmap)
+        np.testing.assert_allclose(cached_model_devi, expected)
+
+    def test_parse_model_devi_index(self, tmp_path):
+        filename = write_model_devi(tmp_path)
+        model_devi_index = parse_model_devi_index(
+            filename, skip_images=10,
+            force_low_limit=0.05, force_high_limit=0.15,
+            energy_low_limit=1e10, energy_high_limit=1e10)
+        assert model_devi_index['candidate'].tolist() == [10, 30]
+        np.testing.assert_allclose(model_devi_index['candidate_devi_f'],
+                                   [0.08, 0.1])
+        assert model_devi_index['failed'].tolist() == [20]
+        assert model_devi_index['accurate'].tolist() == []
+
+    def test_screen_model_devi(self, tmp_path):
+        filename = write_model_devi(tmp_path)
+        limits = dict(skip_images=10,
+                      force_low_limit=0.05, force_high_limit=0.15,
+                      energy_low_limit=1e10, energy_high_limit=1e10)
+        screened = screen_model_devi(filename, **limits)
+        model_devi_index = parse_model_devi_index(filename, **limits)
+        for key in ('candidate', 'failed', 'accurate'):
+            assert screened[key] == model_devi_index[key].tolist()
+        np.testing.assert_allclose(screened['candidate_devi_f'],
+                                   model_devi_index['candidate_devi_f'])
+        force_devi = load_model_devi(filename)[1:, 2]
+        counts, _ = np.histogram(force_devi, bins=500, range=(0, 5))
+        assert screened['counts'] == counts.tolist()
+        assert screened['total'] == 3
+
+    def test_screen_model_devi_unordered(self, tmp_path):
+        # restarted run appends steps again, rows are out of order
+        filename = str(tmp_path / 'model_devi.out')
+        lines = model_devi_content.splitlines()
+        with open(filename, 'w') as f:
+            f.write('\n'.join(lines + lines[3:0:-1] +
+                              [lines[2].replace('8.000000e-02',
+                                                '9.000000e-02')]) + '\n')
+        limits = dict(skip_images=0,
+                      force_low_limit=0.05, force_high_limit=0.15,
+                      energy_low_limit=1e10, energy_high_limit=1e10)
+        screened = screen_model_devi(filename, **limits)
+        model_devi_index = parse_model_devi_index(filename, **limits)
+        assert screened['candidate'] == [10, 30]
+        assert screened['failed'] == [20]
+        assert screened['accurate'] == [0]
+        for key in ('candidate', 'failed', 'accurate'):
+            assert screened[key] == model_devi_index[key].tolist()
+        # first row of step 10 is kept
+        np.testing.assert_allclose(screened['candidate_devi_f'], [0.08, 0.1])
+        np.testing.assert_allclose(model_devi_index['candidate_devi_f'],
+                                   [0.08, 0.1])
+
+
+band_iteration = """ ***  MAX DISPLACEMENT =      {max_dr:.5f}  [    0.00200 ]  {conv}  ***
+ ***  RMS DISPLACEMENT =      0.00100  [    0.00500 ] YES  ***
+ ***  MAX FORCE        =      {max_f:.5f}  [    0.00300 ]  {conv}  ***
+ ***  RMS FORCE        =      0.00100  [    0.00500 ] YES  ***
+"""
+
+
+class TestBandConvergenceParser:
+    def test_feed_incrementally(self):
+        band_content = ''.join(band_iteration.format(max_dr=0.01, max_f=0.02,
+                                                     conv='NO')
+                               for _ in range(30))
+        parser = BandConvergenceParser()
+        # split inside a line
+        n_first = parser.feed(band_content[:1000])
+        n_second = parser.feed(band_content[1000:])
+        assert n_first + n_second == 30
+        info = parser.get_convergence_info()
+        assert info['max_force'][-1]['step_value'] == 0.02
+        assert info['max_force'][-1]['convergence_criteria'] == 0.003
+        progress = parser.get_progress(window=20)
+        assert not progress['is_converged']
+        assert progress['is_stalled']
+
+    def test_converged(self):
+        parser = BandConvergenceParser()
+        parser.feed(band_iteration.format(max_dr=0.01, max_f=0.02, conv='NO'))
+        parser.feed(band_iteration.format(max_dr=0.001, max_f=0.001,
+                                          conv='YES'))
+        assert parser.is_converged
+        assert not parser.is_stalled()
+
+
+def test_read_lammps_dump_text(tmp_path):
+    rng = np.random.default_rng(0)
+    natoms, xy, xz, yz = 30, 1.5, -0.7, 0.9
+    lo = np.array([-1., 0.5, 2.])
+    cell = np.array([[10., 0., 0.], [xy, 11., 0.], [xz, yz, 12.]])
+    positions = rng.random((natoms, 3)) @ cell + lo
+    ids = rng.permutation(natoms) + 1
+    types = rng.integers(1, 3, natoms)
+    lines = ['ITEM: TIMESTEP', '100', 'ITEM: NUMBER OF ATOMS', str(natoms),
+             'ITEM: BOX BOUNDS xy xz yz pp pp pp',
+             f'{lo[0] + min(0, xy, xz, xy + xz)} '
+             f'{lo[0] + 10 + max(0, xy, xz, xy + xz)} {xy}',
+             f'{lo[1] + min(0, yz)} {lo[1] + 11 + max(0, yz)} {xz}',
+             f'{lo[2]} {lo[2] + 12} {yz}',
+             'ITEM: ATOMS id type x y z']
+    lines += [f'{i} {t} {x} {y} {z}'
+              for i, t, (x, y, z) in zip(ids, types, positions)]
+    dump_file = tmp_path / '100.lammpstrj'
+    dump_file.write_text('\n'.join(lines) + '\n')
+
+    atoms = read_lammps_dump_text(str(dump_file), ['H', 'O'])
+    ref_atoms = read(str(dump_file), format='lammps-dump-text',
+                     specorder=['H', 'O'])
+    assert atoms.get_chemical_symbols() == ref_atoms.get_chemical_symbols()
+    assert np.allclose(atoms.positions, ref_atoms.positions)
+    assert np.allclose(atoms.cell, ref_atoms.cell)
+    assert list(atoms.pbc) == list(ref_atoms.pbc)
@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip('aiida')
+from ecint.postprocessor.render import FigureRenderer, render_in_background
+from ecint.postprocessor.visualization import plot_energy_path
+
+
+def test_render_in_background(tmp_path):
+    output_file = str(tmp_path / 'potential_energy_path.png')
+    future = render_in_background(plot_energy_path, ['H', 'H', 'O'],
+                                  [0., 0.5, 0.2], output_file=output_file)
+    assert future is not None
+    # figure is written by a spawned process
+    assert future.result(timeout=120) is None
+    assert (tmp_path / 'potential_energy_path.png').exists()
+
+
+def test_render_failure_is_not_raised(tmp_path, caplog):
+    renderer = FigureRenderer()
+    try:
+        # missing directory, savefig fails in worker
+        future = renderer.submit(plot_energy_path, ['H'], [0.],
+                                 output_file=str(tmp_path / 'no' / 'a.png'))
+        assert isinstance(future.exception(timeout=120), OSError)
+    finally:
+        renderer.shutdown()
+    assert 'Failed to render figure' in caplog.text
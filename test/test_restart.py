@@ -0,0 +1,183 @@
+import io
+from types import SimpleNamespace
+
+import pytest
+
+for plugin in ('aiida_cp2k', 'aiida_deepmd', 'aiida_lammps'):
+    pytest.importorskip(plugin)
+from ecint.preprocessor.utils import get_last_calculation, \
+    is_out_of_walltime, set_wfn_restart, WFN_RESTART_FILE_NAME
+from ecint.workflow.units.base import BaseSingleWorkChain, \
+    GeooptSingleWorkChain
+
+TRAJECTORY = """1
+i = 0
+H 0.0 0.0 0.0
+1
+i = 1
+H 0.5 0.0 0.0
+"""
+
+
+def get_failed_geoopt(computer, remote_path, exit_status,
+                      workchain_exit_status=401, outputs=None):
+    """Failed node of Cp2kBaseWorkChain, only with returned `outputs`
+
+    Only its calculation has `remote_folder`
+    """
+    from aiida.common.links import LinkType
+    from aiida.orm import CalcJobNode, RemoteData, WorkChainNode
+
+    workchain = WorkChainNode()
+    workchain.set_process_state('finished')
+    workchain.set_exit_status(workchain_exit_status)
+    workchain.store()
+    calc = CalcJobNode(computer=computer)
+    calc.set_process_state('finished')
+    calc.set_exit_status(exit_status)
+    calc.add_incoming(workchain, LinkType.CALL_CALC, 'iteration_01')
+    calc.store()
+    remote_folder = RemoteData(computer=computer, remote_path=remote_path)
+    remote_folder.add_incoming(calc, LinkType.CREATE, 'remote_folder')
+    remote_folder.store()
+    for label, node in (outputs or {}).items():
+        node.store().add_incoming(workchain, LinkType.RETURN, label)
+    for node in (calc, workchain):
+        node.seal()
+    return workchain, remote_folder
+
+
+def get_finished_geoopt(computer, remote_path, output):
+    """Node of Cp2kBaseWorkChain finished ok, with `output` as aiida.out"""
+    from aiida.orm import FolderData
+
+    retrieved = FolderData()
+    retrieved.put_object_from_filelike(io.BytesIO(output.encode()),
+                                       'aiida.out')
+    return get_failed_geoopt(computer, remote_path, 0, 0,
+                             {'retrieved': retrieved})
+
+
+def get_geoopt_workchain(node, restarts=0, restart_not_converged=False):
+    from aiida.orm import StructureData
+
+    structure = StructureData(cell=[[5, 0, 0], [0, 5, 0], [0, 0, 5]])
+    structure.append_atom(position=(0, 0, 0), symbols='H')
+    workchain = SimpleNamespace(
+        GEOOPT_COMPLETED=GeooptSingleWorkChain.GEOOPT_COMPLETED,
+        exit_codes=GeooptSingleWorkChain.exit_codes,
+        inputs=SimpleNamespace(max_restarts=1,
+                               restart_not_converged=restart_not_converged),
+        ctx=SimpleNamespace(geoopt_workchain=node, structure=structure,
+                            parent_calc_folder=None, restarts=restarts,
+                            geoopt_finished=False),
+        reports=[])
+    workchain.report = workchain.reports.append
+    workchain.restart_geoopt = \
+        lambda *args: GeooptSingleWorkChain.restart_geoopt(workchain, *args)
+    return workchain
+
+
+@pytest.mark.parametrize('exit_status', [120, 400])
+def test_restart_failed_geoopt(aiida_profile_clean, aiida_localhost,
+                               tmp_path, exit_status):
+    (tmp_path / 'aiida-pos-1.xyz').write_text(TRAJECTORY)
+    node, remote_folder = get_failed_geoopt(aiida_localhost, str(tmp_path),
+                                            exit_status)
+    assert 'remote_folder' not in node.outputs
+    assert get_last_calculation(node).outputs.remote_folder.pk == \
+        remote_folder.pk
+    assert is_out_of_walltime(node)
+
+    workchain = get_geoopt_workchain(node)
+    assert GeooptSingleWorkChain.inspect_geoopt(workchain) is None
+    assert workchain.ctx.restarts == 1
+    assert workchain.ctx.parent_calc_folder.pk == remote_folder.pk
+    assert workchain.ctx.structure.get_ase().positions.tolist() == \
+        [[0.5, 0., 0.]]
+    assert 'out of walltime' in workchain.reports[0]
+
+    # no more restart
+    workchain = get_geoopt_workchain(node, restarts=1)
+    exit_code = GeooptSingleWorkChain.inspect_geoopt(workchain)
+    assert exit_code.status == 401
+
+
+def test_not_restart_failed_geoopt(aiida_profile_clean, aiida_localhost,
+                                   tmp_path):
+    # not by walltime
+    node, _ = get_failed_geoopt(aiida_localhost, str(tmp_path), 300)
+    workchain = get_geoopt_workchain(node)
+    exit_code = GeooptSingleWorkChain.inspect_geoopt(workchain)
+    assert exit_code.status == 400
+    assert workchain.ctx.restarts == 0
+
+
+def test_restart_not_converged_geoopt(aiida_profile_clean, aiida_localhost,
+                                      tmp_path):
+    (tmp_path / 'aiida-pos-1.xyz').write_text(TRAJECTORY)
+    node, _ = get_finished_geoopt(aiida_localhost, str(tmp_path),
+                                  'MAXIMUM NUMBER OF OPTIMIZATION STEPS')
+    # last geometry is the result by default
+    workchain = get_geoopt_workchain(node)
+    assert GeooptSingleWorkChain.inspect_geoopt(workchain) is None
+    assert workchain.ctx.geoopt_finished
+    assert workchain.ctx.restarts == 0
+
+    workchain = get_geoopt_workchain(node, restart_not_converged=True)
+    assert GeooptSingleWorkChain.inspect_geoopt(workchain) is None
+    assert not workchain.ctx.geoopt_finished
+    assert workchain.ctx.restarts == 1
+    assert 'stopped before converged' in workchain.reports[0]
+
+    node, _ = get_finished_geoopt(aiida_localhost, str(tmp_path),
+                                  GeooptSingleWorkChain.GEOOPT_COMPLETED)
+    workchain = get_geoopt_workchain(node, restart_not_converged=True)
+    assert GeooptSingleWorkChain.inspect_geoopt(workchain) is None
+    assert workchain.ctx.geoopt_finished
+    assert workchain.ctx.restarts == 0
+
+
+def test_walltime_not_in_cache_key(aiida_profile_clean):
+    from aiida.orm import Dict, WorkChainNode
+
+    builder = SimpleNamespace(cp2k=SimpleNamespace(
+        parameters=Dict(dict={'GLOBAL': {'RUN_TYPE': 'GEO_OPT'}})))
+    cache_keys = []
+    pre = SimpleNamespace(get_cache_key=lambda x: cache_keys.append(
+        x.cp2k.parameters.get_dict()) or 'key')
+    submitted = []
+
+    def submit(x):
+        submitted.append(x.cp2k.parameters.get_dict())
+        return WorkChainNode().store()
+
+    workchain = SimpleNamespace(inputs={'use_cache': True}, submit=submit)
+    BaseSingleWorkChain.submit_or_reuse(
+        workchain, pre, builder, {'GLOBAL': {'WALLTIME': 95}})
+    assert cache_keys == [{'GLOBAL': {'RUN_TYPE': 'GEO_OPT'}}]
+    assert submitted == [{'GLOBAL': {'RUN_TYPE': 'GEO_OPT', 'WALLTIME': 95}}]
+
+
+def test_set_wfn_restart(aiida_profile_clean, aiida_localhost):
+    from aiida.orm import Dict, RemoteData
+
+    parameters = {'FORCE_EVAL': {'DFT': {'SCF': {'EPS_SCF': 1e-6}}}}
+    builder = SimpleNamespace(cp2k=SimpleNamespace(
+        parameters=Dict(dict=parameters)))
+    parent_calc_folder = RemoteData(computer=aiida_localhost,
+                                    remote_path='/tmp')
+    set_wfn_restart(builder, parent_calc_folder)
+    assert builder.cp2k.parameters.get_dict() == {'FORCE_EVAL': {'DFT': {
+        'WFN_RESTART_FILE_NAME': WFN_RESTART_FILE_NAME,
+        'SCF': {'EPS_SCF': 1e-6, 'SCF_GUESS': 'RESTART'}}}}
+    assert builder.cp2k.parent_calc_folder is parent_calc_folder
+
+    # not for multiple FORCE_EVAL, only parent folder is set
+    parameters = {'FORCE_EVAL': [{'METHOD': 'QS'}, {'METHOD': 'QS'}]}
+    builder = SimpleNamespace(cp2k=SimpleNamespace(
+        parameters=Dict(dict=parameters)))
+    with pytest.warns(Warning, match='multiple FORCE_EVAL'):
+        set_wfn_restart(builder, parent_calc_folder)
+    assert builder.cp2k.parameters.get_dict() == parameters
+    assert builder.cp2k.parent_calc_folder is parent_calc_folder
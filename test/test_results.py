@@ -0,0 +1,52 @@
+import json
+from multiprocessing import Pool
+
+import numpy as np
+from click.testing import CliRunner
+from ecint.config import RESULT_INDEX_NAME
+from ecint.postprocessor.results import get_result_values, load_results, \
+    query_results, record_result
+
+
+def _record(args):
+    resdir, i = args
+    record_result(resdir, 'Energy', label=f'coords_{i}',
+                  energy=np.float64(-i), structure_file=f'coords_{i}.xyz')
+
+
+class TestResults:
+    def test_concurrent_record(self, tmp_path):
+        with Pool(4) as pool:
+            pool.map(_record, [(str(tmp_path), i) for i in range(200)])
+        records = load_results(str(tmp_path))
+        assert len(records) == 200
+        assert sorted(get_result_values(records, 'energy')) == \
+            sorted(-i for i in range(200))
+
+    def test_load_results(self, tmp_path):
+        for i in range(3):
+            resdir = tmp_path / str(i)
+            resdir.mkdir()
+            record_result(str(resdir), 'Energy', label='coords', energy=-i)
+            record_result(str(resdir), 'Geoopt', label='structure')
+        # truncated line is skipped
+        with open(tmp_path / '0' / RESULT_INDEX_NAME, 'a') as f:
+            f.write('{"workflow": "Ene')
+        records = load_results(str(tmp_path), workflow='Energy')
+        assert [r['energy'] for r in records] == [0, -1, -2]
+        assert records[1]['resdir'] == str(tmp_path / '1')
+        assert load_results(str(tmp_path), recursive=False) == []
+
+    def test_query_results(self, tmp_path):
+        record_result(str(tmp_path), 'Energy', label='coords', energy=-1.5)
+        record_result(str(tmp_path), 'Geoopt', label='structure')
+        runner = CliRunner()
+        result = runner.invoke(query_results,
+                               [str(tmp_path), '-w', 'Energy',
+                                '-k', 'label,energy'])
+        assert result.exit_code == 0
+        assert result.output == 'label\tenergy\ncoords\t-1.5\n'
+        result = runner.invoke(query_results,
+                               [str(tmp_path), '-f', 'jsonl', '-k', 'workflow'])
+        assert [json.loads(line) for line in result.output.splitlines()] == \
+            [{'workflow': 'Energy'}, {'workflow': 'Geoopt'}]
@@ -0,0 +1,49 @@
+import numpy as np
+from ase.build import bulk
+from ecint.postprocessor.selection import farthest_point_sampling, \
+    get_fingerprints, select_diverse_structures
+
+
+def get_clusters(n_per_cluster=10):
+    """Frames of Cu bulk in 3 clusters, which differ in lattice constant"""
+    atoms_list, labels = [], []
+    rng = np.random.RandomState(0)
+    for label, a in enumerate([3.4, 3.6, 3.9]):
+        for _ in range(n_per_cluster):
+            atoms = bulk('Cu', 'fcc', a=a, cubic=True).repeat(2)
+            atoms.positions += rng.normal(scale=0.01,
+                                          size=atoms.positions.shape)
+            atoms_list.append(atoms)
+            labels.append(label)
+    return atoms_list, np.array(labels)
+
+
+def test_get_fingerprints():
+    atoms = bulk('NaCl', 'rocksalt', a=5.64)
+    fingerprints = get_fingerprints([atoms, atoms.repeat(2)], ['Na', 'Cl'],
+                                    rcut=4.5, nbins=45)
+    assert fingerprints.shape == (2, 4 * 45)
+    # normalized by number of atoms, independent of supercell
+    np.testing.assert_allclose(fingerprints[0], fingerprints[1])
+    na_cl = fingerprints[0].reshape(4, 45)[1]
+    # 6 Cl at 2.82 A around each Na, counted for each of 1 Na in 2 atoms
+    assert na_cl[28] == 3
+
+
+def test_farthest_point_sampling():
+    points = np.array([[0.], [0.1], [1.], [1.1], [5.]])
+    assert farthest_point_sampling(points, 3) == [4, 0, 3]
+    assert farthest_point_sampling(points, 10) == [0, 1, 2, 3, 4]
+    weights = np.array([0.1, 1., 0.1, 0.1, 0.1])
+    assert farthest_point_sampling(points, 2, weights)[0] == 1
+
+
+def test_select_diverse_structures():
+    atoms_list, labels = get_clusters()
+    selected = select_diverse_structures(atoms_list, 3, ['Cu'])
+    assert sorted(labels[selected]) == [0, 1, 2]
+    # the most deviated frame of each cluster is preferred
+    model_devi = np.full(len(atoms_list), 0.1)
+    model_devi[[3, 15, 27]] = 0.12
+    selected = select_diverse_structures(atoms_list, 3, ['Cu'], model_devi)
+    assert selected == [3, 15, 27]
@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+from ase.build import molecule
+from ase.calculators.emt import EMT
+from ase.optimize import BFGS
+from ase.vibrations import Vibrations
+from ecint.postprocessor.vibration import count_imaginary, \
+    get_active_atoms, get_displaced_atoms, get_displacements, \
+    get_frequencies, get_hessian
+
+
+def get_emt_hessian(atoms):
+    displacements = get_displacements(len(atoms))
+    forces = []
+    for displaced in get_displaced_atoms(atoms, displacements):
+        displaced.calc = EMT()
+        forces.append(displaced.get_forces())
+    return get_hessian(displacements, forces)
+
+
+def test_frequencies(tmp_path, monkeypatch):
+    atoms = molecule('N2')
+    atoms.calc = EMT()
+    BFGS(atoms, logfile=None).run(fmax=1e-5)
+    displacements = get_displacements(len(atoms), delta=0.01)
+    assert len(displacements) == 6 * len(atoms)
+    forces = []
+    for displaced in get_displaced_atoms(atoms, displacements):
+        displaced.calc = EMT()
+        forces.append(displaced.get_forces())
+    hessian = get_hessian(displacements, forces)
+    np.testing.assert_allclose(hessian, hessian.T)
+    frequencies = get_frequencies(hessian, atoms.get_masses())
+    # reference from ase, which writes cache files in current directory
+    monkeypatch.chdir(tmp_path)
+    vib = Vibrations(atoms, delta=0.01, nfree=2)
+    vib.run()
+    np.testing.assert_allclose(frequencies[-1], vib.get_frequencies()[-1].real)
+
+
+def test_partial_hessian():
+    atoms = molecule('CH4')
+    atoms.calc = EMT()
+    displacements = get_displacements(len(atoms))
+    forces = []
+    for displaced in get_displaced_atoms(atoms, displacements):
+        displaced.calc = EMT()
+        forces.append(displaced.get_forces())
+    full_hessian = get_hessian(displacements, forces)
+    active = [0, 2]
+    partial = [(d, f) for d, f in zip(displacements, forces) if d[0] in active]
+    partial_hessian = get_hessian(*zip(*partial))
+    dof = [atom * 3 + axis for atom in active for axis in range(3)]
+    np.testing.assert_allclose(partial_hessian,
+                               full_hessian[np.ix_(dof, dof)])
+
+
+def test_get_active_atoms():
+    atoms = molecule('CH4')
+    atoms.set_tags([0, 1, 0, 0, 0])
+    assert get_active_atoms(atoms) == [0, 1, 2, 3, 4]
+    assert get_active_atoms(atoms, indices=[3], tags=[1]) == [1, 3]
+    # C-H is about 1.09 Å, H-H is about 1.78 Å
+    assert get_active_atoms(atoms, indices=[1], cutoff=1.2) == [0, 1]
+    moved = atoms.copy()
+    moved.positions[2] += [0.5, 0, 0]
+    assert get_active_atoms(moved, reference=atoms, n_moving=1) == [2]
+
+
+def test_count_imaginary():
+    atoms = molecule('H2O')
+    atoms.calc = EMT()
+    BFGS(atoms, logfile=None).run(fmax=1e-4)
+    hessian = get_emt_hessian(atoms)
+    # translations and rotations are not exactly zero in finite difference
+    frequencies = get_frequencies(hessian, atoms.get_masses())
+    assert np.sum(frequencies < 0) > 0
+    assert count_imaginary(frequencies) == 0
+    frequencies = get_frequencies(hessian, atoms.get_masses(),
+                                  positions=atoms.get_positions())
+    np.testing.assert_allclose(frequencies[:6], 0, atol=1e-3)
+    assert count_imaginary(frequencies, tolerance=1) == 0
+    assert count_imaginary([-300., -40., 100.]) == 1
+
+
+def test_linear_rigid_modes():
+    atoms = molecule('N2')
+    atoms.calc = EMT()
+    BFGS(atoms, logfile=None).run(fmax=1e-5)
+    frequencies = get_frequencies(get_emt_hessian(atoms), atoms.get_masses(),
+                                  positions=atoms.get_positions())
+    # 3 translations and 2 rotations
+    np.testing.assert_allclose(frequencies[:5], 0, atol=1e-3)
+    assert frequencies[5] > 1000
+
+
+def test_missing_forces(aiida_profile_clean):
+    for plugin in ('aiida_cp2k', 'aiida_deepmd', 'aiida_lammps'):
+        pytest.importorskip(plugin)
+    from types import SimpleNamespace
+
+    from aiida.common.extendeddicts import AttributeDict
+    from aiida.common.links import LinkType
+    from aiida.orm import List, WorkChainNode
+    from ecint.workflow.frequency import FiniteDifferenceFrequencyWorkChain
+
+    # farming finished ok, but without forces of disp_1 and disp_3
+    farming = WorkChainNode()
+    farming.set_process_state('finished')
+    farming.set_exit_status(0)
+    farming.store()
+    for key in ('disp_0', 'disp_2'):
+        List(list=[[0., 0., 1.]]).store().add_incoming(
+            farming, LinkType.RETURN, f'forces__{key}')
+    farming.seal()
+    workchain = SimpleNamespace(
+        ctx=AttributeDict({
+            'farming_0': farming,
+            'disp_nodes': {f'disp_{i}': 'farming_0' for i in range(4)}}),
+        exit_codes=FiniteDifferenceFrequencyWorkChain.exit_codes)
+    workchain.get_disp_forces = lambda key: \
+        FiniteDifferenceFrequencyWorkChain.get_disp_forces(workchain, key)
+
+    exit_code = FiniteDifferenceFrequencyWorkChain.inspect_displacements(
+        workchain)
+    assert exit_code.status == 400
+    assert exit_code.message == 'No forces of displacements: disp_1, disp_3'
+    assert workchain.get_disp_forces('disp_2') == [[0., 0., 1.]]
@@ -0,0 +1,162 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('aiida')
+from ecint.postprocessor.visualization import FixedBinHistogram, \
+    get_model_devi_distribution
+
+
+def test_fixed_bin_histogram():
+    histogram = FixedBinHistogram(bins=5, value_range=(0, 5))
+    histogram.update([0.5, 1.5, 1.6, 4.9, 5.0, 7.0])
+    # right edge is in the last bin, values out of range only in total
+    assert histogram.counts.tolist() == [1, 2, 0, 0, 2]
+    assert histogram.total == 6
+    histogram.update(np.array([3.2]))
+    assert histogram.counts.tolist() == [1, 2, 0, 1, 2]
+    np.testing.assert_allclose(histogram.frequency,
+                               np.array([1, 2, 0, 1, 2]) / 7)
+
+
+def test_fixed_bin_histogram_update_counts():
+    values = np.random.RandomState(0).rand(100) * 5
+    whole = FixedBinHistogram(bins=10, value_range=(0, 5))
+    whole.update(values)
+    merged = FixedBinHistogram(bins=10, value_range=(0, 5))
+    for chunk in np.split(values, 4):
+        part = FixedBinHistogram(bins=10, value_range=(0, 5))
+        part.update(chunk)
+        merged.update_counts(part.counts.tolist(), part.total)
+    assert merged.counts.tolist() == whole.counts.tolist()
+    assert merged.total == whole.total == 100
+    assert FixedBinHistogram().frequency.sum() == 0
+
+
+def test_get_model_devi_distribution(tmp_path):
+    filename = str(tmp_path / 'model_devi.out')
+    model_devi = np.zeros((4, 7))
+    model_devi[:, 0] = [0, 10, 20, 30]
+    model_devi[:, 4] = [0.01, 0.08, 0.2, 0.1]
+    np.savetxt(filename, model_devi)
+    frequency, edges = get_model_devi_distribution(
+        [filename], 0.05, 0.15, skip_images=10,
+        filename=str(tmp_path / 'distribution.jpg'), bins=50, xmax=0.5)
+    assert len(edges) == 51
+    assert frequency.sum() == pytest.approx(1)
+    assert frequency[[8, 10, 20]].tolist() == pytest.approx([1 / 3] * 3)
+    assert (tmp_path / 'distribution.jpg').exists()
+
+
+def build_workchain_tree(n_calcs=1):
+    """Ecint -> single workchain -> base workchain -> `n_calcs` calcjobs"""
+    from aiida.common.links import LinkType
+    from aiida.orm import CalcJobNode, InstalledCode, Int, WorkChainNode, \
+        load_computer
+
+    computer = load_computer('localhost')
+    code = InstalledCode(computer=computer,
+                         filepath_executable='/bin/bash').store()
+
+    def add_process(node_class, parent=None, link_type=None):
+        structure = Int(1).store()
+        node = node_class()
+        if parent is not None:
+            node.base.links.add_incoming(parent, link_type, 'CALL')
+        node.base.links.add_incoming(structure, LinkType.INPUT_WORK
+                                     if node_class is WorkChainNode
+                                     else LinkType.INPUT_CALC, 'structure')
+        if node_class is CalcJobNode:
+            node.computer = computer
+            node.base.links.add_incoming(code, LinkType.INPUT_CALC, 'code')
+        node.store()
+        return node
+
+    root = add_process(WorkChainNode)
+    single = add_process(WorkChainNode, root, LinkType.CALL_WORK)
+    base = add_process(WorkChainNode, single, LinkType.CALL_WORK)
+    calcs = [add_process(CalcJobNode, base, LinkType.CALL_CALC)
+             for _ in range(n_calcs)]
+    # energy created by the first calcjob is returned by all workchains
+    energy = Int(2)
+    energy.base.links.add_incoming(calcs[0], LinkType.CREATE, 'energy')
+    energy.store()
+    for workchain in (base, single, root):
+        energy.base.links.add_incoming(workchain, LinkType.RETURN, 'energy')
+    for node in [root, single, base] + calcs:
+        node.seal()
+    return root, calcs
+
+
+def build_provenance_graph_by_loading(pk, level):
+    """Provenance graph built by loading nodes one by one,
+    only the first called process of each level is followed in 'medium'"""
+    from aiida.orm import load_node
+    from aiida.tools.visualization import Graph
+
+    graph = Graph(graph_attr={'rankdir': 'TR'})
+    if level in ('minimal', 'low'):
+        annotate_links = 'label' if level == 'low' else None
+        graph.add_incoming(pk, annotate_links=annotate_links)
+        graph.add_outgoing(pk, annotate_links=annotate_links)
+        for called in load_node(pk).called:
+            graph.add_incoming(called.pk, annotate_links=annotate_links)
+            graph.add_outgoing(called.pk, annotate_links=annotate_links,
+                               link_types='return')
+    elif level == 'medium':
+        singles = [node.pk for node in load_node(pk).called]
+        bases = [load_node(i).called[0].pk for i in singles]
+        calcs = [load_node(i).called[0].pk for i in bases]
+        code_pk = load_node(calcs[0]).base.links.get_incoming() \
+            .get_node_by_label('code').pk
+        graph.add_incoming(pk, annotate_links='label')
+        graph.add_outgoing(pk, annotate_links='label')
+        for i in singles:
+            graph.add_incoming(i, annotate_links='label')
+            graph.add_outgoing(i, annotate_links='label')
+        for i in bases:
+            graph.add_incoming(i, annotate_links='label',
+                               link_types='call_work')
+            graph.add_outgoing(i, annotate_links='label',
+                               link_types='call_calc')
+        for i in calcs:
+            graph.add_incoming(i, annotate_links='label',
+                               link_types='call_calc')
+            graph.add_outgoing(i, annotate_links='label',
+                               link_types='return')
+        graph.add_node(code_pk)
+        for i in calcs:
+            graph.add_edge(code_pk, i)
+    return graph
+
+
+@pytest.mark.parametrize('level', ['minimal', 'low', 'medium'])
+def test_build_provenance_graph(aiida_profile_clean, aiida_localhost, level):
+    from ecint.postprocessor.visualization import build_provenance_graph
+
+    root, _ = build_workchain_tree()
+    graph = build_provenance_graph(root.pk, level)
+    expected = build_provenance_graph_by_loading(root.pk, level)
+    assert graph.nodes == expected.nodes
+    assert graph.edges == expected.edges
+
+
+def test_build_provenance_graph_all_called(aiida_profile_clean,
+                                           aiida_localhost):
+    from ecint.postprocessor.visualization import build_provenance_graph
+
+    # e.g. base workchain restarted once
+    root, calcs = build_workchain_tree(n_calcs=2)
+    graph = build_provenance_graph(root.pk, 'medium')
+    expected = build_provenance_graph_by_loading(root.pk, 'medium')
+    # calcjobs called by base workchain were already in graph
+    assert {calc.pk for calc in calcs} <= expected.nodes
+    assert expected.nodes == graph.nodes
+    # but only the first one was linked to its code
+    added = graph.edges - expected.edges
+    code_pk = calcs[0].base.links.get_incoming() \
+        .get_node_by_label('code').pk
+    assert len(added) == 1
+    source, target, _ = added.pop()
+    assert source == code_pk
+    assert target in {calc.pk for calc in calcs}
+    assert expected.edges < graph.edges
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('aiida')
+from ase.build import molecule
+from ase.io import read
+from ecint.postprocessor.utils import write_xyz_from_trajectory
+
+
+def get_trajectory():
+    from aiida.orm import StructureData, TrajectoryData
+
+    images = []
+    for i in range(3):
+        atoms = molecule('H2O', vacuum=5.0)
+        atoms.pbc = [True, True, False]
+        atoms.positions += 0.1 * i
+        images.append(atoms)
+    trajectory = TrajectoryData(
+        structurelist=[StructureData(ase=atoms) for atoms in images])
+    trajectory.set_array('energy', np.array([-1., -0.5, -0.8]))
+    return images, trajectory
+
+
+def test_write_xyz_from_trajectory(aiida_profile, tmp_path):
+    images, trajectory = get_trajectory()
+    output_file = str(tmp_path / 'images_traj.xyz')
+    write_xyz_from_trajectory(trajectory, output_file, pbc=images[0].pbc)
+    frames = read(output_file, index=':')
+    assert len(frames) == 3
+    for i, (atoms, frame) in enumerate(zip(images, frames)):
+        assert frame.get_chemical_symbols() == atoms.get_chemical_symbols()
+        np.testing.assert_allclose(frame.positions, atoms.positions,
+                                   atol=1e-8)
+        np.testing.assert_allclose(frame.cell, atoms.cell, atol=1e-8)
+        assert frame.pbc.tolist() == [True, True, False]
+        assert frame.info['i'] == i
+    assert frames[1].info['E'] == '-0.5 eV'
+    # periodic in all directions by default
+    write_xyz_from_trajectory(trajectory, output_file)
+    assert read(output_file).pbc.tolist() == [True, True, True]